@@ -0,0 +1,146 @@
+"""
+Purpose
+
+Corpus analytics over the columnar transcripts written by columnar_store. The items of
+all transcripts of a run are concatenated into flat NumPy arrays, and every metric is
+computed for all transcripts at once with bincount and cumulative operations instead of
+a Python loop per item:
+
+    Words, TalkTime, TalkShare    per speaker of each transcript
+    WordsPerMinute                words per minute of the speaker's talk time
+    MeanConfidence, Conf_xx_yy    mean and histogram of the word confidences
+    Duration, SilenceRatio        per transcript, the share of time without speech
+
+The result is one table with a row per speaker of each transcript, written as CSV and as
+a columnar NumPy .npz archive.
+"""
+
+import csv
+import logging
+import numpy as np
+import columnar_store
+
+logger = logging.getLogger(__name__)
+
+# Number of equal width bins of the confidence histogram, over [0, 1].
+CONFIDENCE_BINS = 10
+
+# Label of the words whose speaker is unknown.
+UNKNOWN_SPEAKER = ''
+
+
+def histogram_columns(bins=CONFIDENCE_BINS):
+    """
+    Returns the names of the confidence histogram columns, for example 'Conf_00_10'. The
+    names are the bin edges in percent, rounded, so bins must be between 1 and 100.
+    """
+    if not 1 <= bins <= 100:
+        raise ValueError(f"The number of confidence bins must be between 1 and 100, not {bins}.")
+    edges = np.rint(np.linspace(0, 100, bins + 1)).astype(int)
+    return [f'Conf_{low:02d}_{high:02d}' for low, high in zip(edges[:-1], edges[1:])]
+
+
+def corpus_metrics(transcripts, bins=CONFIDENCE_BINS):
+    """
+    Computes the metrics of a corpus of columnar transcripts.
+
+    :param transcripts: An iterable of columnar_store.TranscriptColumns.
+    :param bins: The number of bins of the confidence histograms.
+    :return: A dict of column name to array, with one row per speaker of each transcript.
+    """
+    histogram_names = histogram_columns(bins)
+    transcripts = list(transcripts)
+    job_names = [columns.job_name for columns in transcripts]
+    speaker_tables = [list(columns.speakers) + [UNKNOWN_SPEAKER] for columns in transcripts]
+    # Every transcript gets the same number of speaker slots, the last one for unknown speakers.
+    slots = max((len(table) for table in speaker_tables), default=1)
+
+    starts, ends, confidences, speakers, jobs = [], [], [], [], []
+    for job, columns in enumerate(transcripts):
+        words = np.asarray(columns.type) == columnar_store.ITEM_PRONUNCIATION
+        speaker = np.asarray(columns.speaker)[words].astype(np.int64)
+        starts.append(np.asarray(columns.start)[words].astype(np.float64))
+        ends.append(np.asarray(columns.end)[words].astype(np.float64))
+        confidences.append(np.asarray(columns.confidence)[words])
+        speakers.append(np.where(speaker < 0, len(speaker_tables[job]) - 1, speaker))
+        jobs.append(np.full(len(speaker), job, dtype=np.int64))
+    empty = np.zeros(0)
+    start = np.concatenate(starts) if starts else empty
+    end = np.concatenate(ends) if ends else empty
+    confidence = np.concatenate(confidences) if confidences else empty
+    speaker = np.concatenate(speakers) if speakers else empty.astype(np.int64)
+    job = np.concatenate(jobs) if jobs else empty.astype(np.int64)
+    job_count = len(transcripts)
+
+    # Per transcript: the duration up to the last word, and the time covered by speech.
+    duration = np.zeros(job_count)
+    np.maximum.at(duration, job, end)
+    # Each transcript is shifted past the end of the previous one, so one running maximum
+    # over the whole corpus never carries speech from one transcript into the next.
+    base = np.concatenate(([0.0], np.cumsum(duration + 1.0)[:-1]))
+    shifted_start = start + base[job]
+    shifted_end = end + base[job]
+    covered_until = np.maximum.accumulate(shifted_end) if len(shifted_end) else shifted_end
+    previous = np.concatenate((base[job[:1]], covered_until[:-1]))
+    speech = np.bincount(job, weights=np.clip(shifted_end - np.maximum(shifted_start, previous), 0, None),
+                         minlength=job_count)
+    silence_ratio = np.divide(duration - speech, duration, out=np.zeros(job_count), where=duration > 0)
+
+    # Per speaker of each transcript.
+    key = job * slots + speaker
+    size = job_count * slots
+    words = np.bincount(key, minlength=size)
+    talk_time = np.bincount(key, weights=end - start, minlength=size)
+    job_talk_time = talk_time.reshape(job_count, slots).sum(axis=1)
+    talk_share = np.divide(talk_time, np.repeat(job_talk_time, slots), out=np.zeros(size),
+                           where=np.repeat(job_talk_time, slots) > 0)
+    words_per_minute = np.divide(words * 60.0, talk_time, out=np.zeros(size), where=talk_time > 0)
+    scored = ~np.isnan(confidence)
+    confidence_sum = np.bincount(key[scored], weights=confidence[scored], minlength=size)
+    confidence_count = np.bincount(key[scored], minlength=size)
+    mean_confidence = np.divide(confidence_sum, confidence_count, out=np.full(size, np.nan),
+                                where=confidence_count > 0)
+    confidence_bin = np.clip((confidence[scored] * bins).astype(np.int64), 0, bins - 1)
+    histogram = np.bincount(key[scored] * bins + confidence_bin, minlength=size * bins).reshape(size, bins)
+
+    # Only the speaker slots that have words become rows.
+    rows = np.flatnonzero(words)
+    row_jobs = rows // slots
+    row_speakers = rows % slots
+    metrics = {
+        'JobName': np.array([job_names[index] for index in row_jobs], dtype=str),
+        'Speaker': np.array([speaker_tables[job_index][speaker_index]
+                             for job_index, speaker_index in zip(row_jobs, row_speakers)], dtype=str),
+        'Words': words[rows],
+        'TalkTime': talk_time[rows],
+        'TalkShare': talk_share[rows],
+        'WordsPerMinute': words_per_minute[rows],
+        'MeanConfidence': mean_confidence[rows],
+        'Duration': duration[row_jobs],
+        'SilenceRatio': silence_ratio[row_jobs],
+    }
+    for index, name in enumerate(histogram_names):
+        metrics[name] = histogram[rows, index]
+    logger.info("Computed metrics of %s words in %s transcripts.", len(key), job_count)
+    return metrics
+
+
+def write_report(metrics, save_as_base):
+    """
+    Writes a metrics table as CSV and as a columnar .npz archive, loadable with numpy.load.
+
+    :param metrics: A dict of column name to array, see corpus_metrics.
+    :param save_as_base: The output path without extension.
+    :return: The paths of the CSV and .npz files.
+    """
+    csv_path = save_as_base + '.csv'
+    npz_path = save_as_base + '.npz'
+    names = list(metrics)
+    with open(csv_path, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(names)
+        writer.writerows(zip(*(
+            np.round(metrics[name], 4).tolist() if metrics[name].dtype.kind == 'f' else metrics[name].tolist()
+            for name in names)))
+    np.savez(npz_path, **metrics)
+    return csv_path, npz_path
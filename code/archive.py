@@ -0,0 +1,103 @@
+"""
+Purpose
+
+Bulk archive engine for S3 objects. Objects are moved by running server-side copies
+concurrently and then removing the sources with batched DeleteObjects calls, up to 1000
+keys per request, instead of one copy and one delete round trip per object.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+# The maximum number of keys accepted by a single DeleteObjects request.
+MAX_DELETE_BATCH = 1000
+
+
+class ArchiveError(Exception):
+    """
+    Raised, or returned as a per-object result, when objects could not be archived.
+    """
+
+
+def _describe_error(code, message):
+    return f'{code}: {message}' if message else f'{code}'
+
+
+class BulkArchiver:
+    """
+    Moves many S3 objects to new keys and reports the result of each move.
+    """
+    def __init__(self, s3_client, max_workers=16, delete_batch_size=MAX_DELETE_BATCH):
+        """
+        :param s3_client: The Boto3 S3 client.
+        :param max_workers: The number of server-side copies run at the same time.
+        :param delete_batch_size: The number of keys removed per DeleteObjects request.
+        """
+        self.s3_client = s3_client
+        self.max_workers = max_workers
+        self.delete_batch_size = min(delete_batch_size, MAX_DELETE_BATCH)
+
+    def _copy(self, bucket_name, source_key, dest_key):
+        try:
+            self.s3_client.copy_object(
+                Bucket=bucket_name, Key=dest_key,
+                CopySource={'Bucket': bucket_name, 'Key': source_key})
+        except ClientError as err:
+            return _describe_error(err.response['Error']['Code'], err.response['Error'].get('Message'))
+        return None
+
+    def _delete(self, bucket_name, keys):
+        """
+        Deletes keys in batches and returns a dict of key to error for the keys that
+        could not be deleted.
+        """
+        errors = {}
+        for start in range(0, len(keys), self.delete_batch_size):
+            batch = keys[start:start + self.delete_batch_size]
+            try:
+                response = self.s3_client.delete_objects(
+                    Bucket=bucket_name,
+                    Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True})
+            except ClientError as err:
+                for key in batch:
+                    errors[key] = _describe_error(err.response['Error']['Code'], err.response['Error'].get('Message'))
+                continue
+            for error in response.get('Errors', []):
+                errors[error['Key']] = _describe_error(error.get('Code'), error.get('Message'))
+        return errors
+
+    def move(self, moves):
+        """
+        Moves objects within their buckets. Sources are only deleted after their copy
+        succeeded, so a failed copy never loses an object.
+
+        :param moves: An iterable of (bucket name, source key, destination key).
+        :return: A dict of (bucket name, source key) to None when the move succeeded, or
+                 to a description of the error when it failed.
+        """
+        moves = list(moves)
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            copies = [(bucket_name, source_key, executor.submit(self._copy, bucket_name, source_key, dest_key))
+                      for bucket_name, source_key, dest_key in moves]
+            for bucket_name, source_key, future in copies:
+                results[(bucket_name, source_key)] = future.result()
+
+        copied = {}
+        for (bucket_name, source_key), error in results.items():
+            if error is None:
+                copied.setdefault(bucket_name, []).append(source_key)
+        for bucket_name, keys in copied.items():
+            for key, error in self._delete(bucket_name, keys).items():
+                results[(bucket_name, key)] = f'copied but not deleted, {error}'
+
+        for (bucket_name, source_key), error in results.items():
+            if error is not None:
+                logger.warning("Couldn't archive %s/%s: %s", bucket_name, source_key, error)
+        logger.info(
+            "Archived %s of %s objects.",
+            sum(1 for error in results.values() if error is None), len(results))
+        return results
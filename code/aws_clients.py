@@ -0,0 +1,134 @@
+"""
+Purpose
+
+Shared Boto3 session and client factory. Every module gets its clients from here, so a run
+uses one session, one client per service and one connection pool per service, instead of
+one per caller. Each pool is sized to the number of calls the configured workers can have
+in flight at once, so parallel work never queues behind the default pool of 10
+connections, and TLS connections are reused across stages.
+
+Every client also gets the process-wide adaptive concurrency limiter of its service (see
+rate_limiter.AdaptiveConcurrencyLimiter), so all threads together keep the calls in flight
+just under the rate the service accepts, and throttled calls are retried instead of
+failing.
+
+Boto3 clients are thread safe once created, and creating them is serialized here, so the
+factory can be called from any thread. Boto3 itself is only imported when the first client
+is created, so commands that never call AWS don't pay for importing it.
+"""
+
+import logging
+import threading
+from parameters import config
+from rate_limiter import AdaptiveConcurrencyLimiter
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_session = None
+_clients = {}
+_resources = {}
+_limiters = {}
+
+
+def pool_size(service_name):
+    """
+    Returns the number of connections a service needs for the configured concurrency,
+    unless 'client_config' sets it explicitly.
+
+    :param service_name: 's3' or 'transcribe'.
+    :return: The max_pool_connections of the client.
+    """
+    client_config = config['client_config']
+    if client_config['max_pool_connections']:
+        return client_config['max_pool_connections']
+    if service_name == 's3':
+        # Parallel multipart uploads, transcript downloads in batch and streaming mode, and archive copies.
+        return (config['upload_config']['max_workers'] * config['upload_config']['max_concurrency']
+                + config['export_config']['download_workers']
+                + config['pipeline_config']['export_workers']
+                + config['archive_config']['copy_workers'])
+    # Job submissions, the bulk get and delete helpers (10 workers each by default) and the status sweeps.
+    return config['submit_config']['max_workers'] + 10 + 1
+
+
+def client_settings(service_name):
+    """
+    Returns the botocore Config of a service: its pool size and the configured retry mode.
+    """
+    from botocore.config import Config
+    client_config = config['client_config']
+    return Config(
+        max_pool_connections=pool_size(service_name),
+        retries={'mode': client_config['retry_mode'], 'max_attempts': client_config['max_attempts']})
+
+
+def get_limiter(service_name):
+    """
+    Returns the adaptive concurrency limiter shared by every client of a service, or None
+    when 'concurrency_config' turns it off.
+    """
+    concurrency_config = config['concurrency_config']
+    if not concurrency_config['enabled']:
+        return None
+    with _lock:
+        if service_name not in _limiters:
+            _limiters[service_name] = AdaptiveConcurrencyLimiter(
+                service_name, pool_size(service_name),
+                min_limit=concurrency_config['min_limit'],
+                initial_limit=concurrency_config['initial_limit'],
+                increase=concurrency_config['increase'],
+                decrease_factor=concurrency_config['decrease_factor'],
+                max_attempts=config['client_config']['max_attempts'] + concurrency_config['max_throttle_retries'],
+                max_backoff=concurrency_config['max_backoff_seconds'])
+        return _limiters[service_name]
+
+
+def get_session():
+    """
+    Returns the shared Boto3 session, created from the configured credentials.
+    """
+    global _session
+    with _lock:
+        if _session is None:
+            import boto3
+            _session = boto3.session.Session(
+                aws_access_key_id=config['aws_auth_cred']['aws_access_key_id'],
+                aws_secret_access_key=config['aws_auth_cred']['aws_secret_access_key'],
+                region_name=config['aws_auth_cred']['region'])
+        return _session
+
+
+def get_resource(service_name):
+    """
+    Returns the shared Boto3 resource of a service. Its meta.client is the shared client
+    returned by get_client, so both use the same connection pool. Unlike clients,
+    resource objects should not be shared across threads, use the client there.
+    """
+    session = get_session()
+    limiter = get_limiter(service_name)
+    with _lock:
+        if service_name not in _resources:
+            _resources[service_name] = session.resource(service_name, config=client_settings(service_name))
+            _clients[service_name] = _resources[service_name].meta.client
+            if limiter is not None:
+                limiter.attach(_clients[service_name])
+            logger.info("Created %s resource with %s pooled connections.", service_name, pool_size(service_name))
+        return _resources[service_name]
+
+
+def get_client(service_name):
+    """
+    Returns the shared Boto3 client of a service.
+    """
+    if service_name == 's3':
+        return get_resource('s3').meta.client
+    session = get_session()
+    limiter = get_limiter(service_name)
+    with _lock:
+        if service_name not in _clients:
+            _clients[service_name] = session.client(service_name, config=client_settings(service_name))
+            if limiter is not None:
+                limiter.attach(_clients[service_name])
+            logger.info("Created %s client with %s pooled connections.", service_name, pool_size(service_name))
+        return _clients[service_name]
@@ -0,0 +1,102 @@
+"""
+Purpose
+
+Benchmarks the native transcript renderer against Tscribe. A batch of synthetic
+transcripts in the shape Amazon Transcribe writes, with speaker labels and alternatives,
+is rendered as docx by both renderers, and the time per file and per batch is printed.
+Tscribe is skipped when it is not installed.
+
+Usage: python benchmark_render.py [number of files] [words per file]
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import transcript_render
+
+
+def make_transcript(job_name, words, speakers=4, alternatives=4, seed=0):
+    """
+    Builds a synthetic transcript dict with the given number of words.
+    """
+    rng = random.Random(seed)
+    vocabulary = ['the', 'quick', 'brown', 'fox', 'jumps', 'over', 'lazy', 'dog', 'transcribe',
+                  'amazon', 'meeting', 'project', 'budget', 'review', 'customer', 'support']
+    items = []
+    segments = []
+    time_now = 0.0
+    speaker = 'spk_0'
+    segment_items = []
+    for index in range(words):
+        if index % 40 == 0 and segment_items:
+            segments.append({'speaker_label': speaker, 'start_time': segment_items[0]['start_time'],
+                             'end_time': segment_items[-1]['end_time'], 'items': segment_items})
+            segment_items = []
+            speaker = f'spk_{rng.randrange(speakers)}'
+        start, end = time_now, time_now + rng.uniform(0.15, 0.6)
+        time_now = end + rng.uniform(0.0, 0.3)
+        item = {'start_time': f'{start:.3f}', 'end_time': f'{end:.3f}', 'type': 'pronunciation',
+                'alternatives': [{'confidence': f'{rng.random():.4f}', 'content': rng.choice(vocabulary)}
+                                 for _ in range(alternatives)]}
+        items.append(item)
+        segment_items.append({'start_time': item['start_time'], 'end_time': item['end_time'],
+                              'speaker_label': speaker})
+        if index % 12 == 11:
+            items.append({'type': 'punctuation', 'alternatives': [{'confidence': '0.0', 'content': '.'}]})
+    if segment_items:
+        segments.append({'speaker_label': speaker, 'start_time': segment_items[0]['start_time'],
+                         'end_time': segment_items[-1]['end_time'], 'items': segment_items})
+    text = ' '.join(item['alternatives'][0]['content'] for item in items)
+    return {'jobName': job_name, 'accountId': '000000000000', 'status': 'COMPLETED',
+            'results': {'transcripts': [{'transcript': text}], 'items': items,
+                        'speaker_labels': {'speakers': speakers, 'segments': segments}}}
+
+
+def time_batch(render, json_paths, out_path):
+    """
+    Renders every transcript with render(json_path, docx_path) and returns the elapsed seconds.
+    """
+    start = time.perf_counter()
+    for json_path in json_paths:
+        docx_path = os.path.join(out_path, os.path.splitext(os.path.basename(json_path))[0] + '.docx')
+        render(json_path, docx_path)
+    return time.perf_counter() - start
+
+
+def main():
+    files = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    words = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    renderers = [('native', lambda json_path, docx_path: transcript_render.render(
+        json_path, os.path.splitext(docx_path)[0], ['docx']))]
+    try:
+        import tscribe
+        renderers.append(('tscribe', lambda json_path, docx_path: tscribe.write(
+            json_path, format='docx', save_as=docx_path)))
+    except ImportError:
+        print("Tscribe is not installed, benchmarking the native renderer only.")
+
+    with tempfile.TemporaryDirectory() as work_path:
+        json_paths = []
+        for index in range(files):
+            json_path = os.path.join(work_path, f'bench-{index:03d}.json')
+            with open(json_path, 'w') as json_file:
+                json.dump(make_transcript(f'bench-{index:03d}', words, seed=index), json_file)
+            json_paths.append(json_path)
+
+        print(f"Rendering {files} transcript(s) of {words} words as docx.")
+        timings = {}
+        for name, render in renderers:
+            out_path = os.path.join(work_path, name)
+            os.makedirs(out_path)
+            timings[name] = elapsed = time_batch(render, json_paths, out_path)
+            print(f"{name:>8}: {elapsed:8.3f} s per batch, {elapsed / files * 1000:8.1f} ms per file")
+        if 'tscribe' in timings:
+            print(f"Native renderer speedup: {timings['tscribe'] / timings['native']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
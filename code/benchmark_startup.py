@@ -0,0 +1,120 @@
+"""
+Purpose
+
+Benchmarks the startup cost of the entry points. Each module is imported in a fresh
+interpreter with 'python -X importtime', and the cumulative import time of the module,
+its slowest direct imports and the heavy dependencies it loaded are printed. Heavy
+dependencies are imported lazily, on first use, so none of them should show up here.
+
+The results can be saved as JSON and compared with a previous run, to catch a change
+that makes startup slower again.
+
+Usage: python benchmark_startup.py [--runs N] [--save results.json] [--compare results.json]
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+# Modules run from the command line.
+ENTRY_POINTS = ('transcribe_script', 'transcribe_basics', 'transcribe_async', 'benchmark_render')
+
+# Dependencies that should only be imported when first used.
+HEAVY_MODULES = ('boto3', 'botocore.client', 'requests', 'numpy', 'tscribe', 'pandas', 'aiobotocore')
+
+# Number of direct imports listed per entry point.
+TOP_IMPORTS = 5
+
+_IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def import_times(module):
+    """
+    Imports a module in a fresh interpreter with -X importtime.
+
+    :param module: The name of the module.
+    :return: A list of (module, self microseconds, cumulative microseconds, depth), in the
+             order the imports finished, and the names of the modules loaded. The module
+             itself has depth 0. Failed imports are timed too, but are not loaded.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}, sys; print(*sys.modules)'],
+        cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Couldn't import {module}: {result.stderr.strip().splitlines()[-1]}")
+    times = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match is None:
+            continue
+        name = match.group(4)
+        if name == 'site':
+            # The imports before this line belong to interpreter startup, not to the module.
+            times = []
+            continue
+        depth = (len(match.group(3)) - 1) // 2
+        times.append((name, int(match.group(1)), int(match.group(2)), depth))
+    return times, set(result.stdout.split())
+
+
+def measure(module, runs):
+    """
+    Measures the startup cost of a module, keeping the fastest of several runs.
+
+    :return: A dict with the cumulative milliseconds, the slowest direct imports and the
+             heavy dependencies that were loaded.
+    """
+    best = None
+    for _ in range(runs):
+        times, loaded = import_times(module)
+        total = next(cumulative for name, _, cumulative, depth in times if name == module and depth == 0)
+        if best is None or total < best[0]:
+            best = total, times, loaded
+    total, times, loaded = best
+    direct = sorted(((cumulative, name) for name, _, cumulative, depth in times if depth == 1), reverse=True)
+    return {
+        'milliseconds': round(total / 1000, 1),
+        'slowest_imports': [[name, round(cumulative / 1000, 1)] for cumulative, name in direct[:TOP_IMPORTS]],
+        'heavy_modules': [name for name in HEAVY_MODULES if name in loaded],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks the import time of the entry points.')
+    parser.add_argument('--runs', type=int, default=5, help='Runs per entry point, the fastest one is kept.')
+    parser.add_argument('--save', help='Writes the results into this JSON file.')
+    parser.add_argument('--compare', help='Compares the results with a JSON file written by --save.')
+    args = parser.parse_args()
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as compare_file:
+            previous = json.load(compare_file)
+
+    results = {}
+    for module in ENTRY_POINTS:
+        try:
+            results[module] = result = measure(module, args.runs)
+        except RuntimeError as err:
+            print(f"{module:>18}: skipped, {err}")
+            continue
+        change = ''
+        if module in previous:
+            change = f" ({result['milliseconds'] - previous[module]['milliseconds']:+.1f} ms)"
+        print(f"{module:>18}: {result['milliseconds']:8.1f} ms{change}")
+        for name, milliseconds in result['slowest_imports']:
+            print(f"{'':>20}{name:<28}{milliseconds:8.1f} ms")
+        if result['heavy_modules']:
+            print(f"{'':>20}heavy modules loaded at startup: {', '.join(result['heavy_modules'])}")
+
+    if args.save:
+        with open(args.save, 'w') as save_file:
+            json.dump(results, save_file, indent=2)
+        print(f"Saved the results to {args.save}.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Purpose
+
+Split-and-stitch support for very long recordings. A long WAV/PCM recording is split
+into overlapping segments with the standard library wave module, so each segment can be
+transcribed by its own job in parallel. The segment transcripts are then merged back into
+one transcript in the shape Amazon Transcribe writes (results.transcripts, results.items
+and results.speaker_labels), with timestamps shifted by each segment's offset and the
+items of each overlap kept from one segment only.
+
+Speaker labels are assigned by each segment job on its own, so spk_0 of one segment is
+not guaranteed to be the same speaker as spk_0 of the next.
+"""
+
+import logging
+import os
+import wave
+
+logger = logging.getLogger(__name__)
+
+# Number of frames copied at a time, so a segment is never held in memory at once.
+COPY_FRAMES = 1024 * 64
+
+
+def get_wav_duration(file_path):
+    """
+    Gets the duration of a WAV/PCM file from its header.
+
+    :param file_path: The path of the WAV file.
+    :return: The duration in seconds.
+    """
+    with wave.open(file_path, 'rb') as wav_file:
+        return wav_file.getnframes() / float(wav_file.getframerate())
+
+
+def segment_name(file_name, index):
+    """
+    Returns the file name of a segment of a recording.
+    """
+    stem, extn = os.path.splitext(file_name)
+    return f'{stem}-part{index:03d}{extn}'
+
+
+def split_wav(file_path, out_path, segment_seconds, overlap_seconds):
+    """
+    Splits a WAV/PCM file into overlapping segments. Segment i starts at
+    i * (segment_seconds - overlap_seconds) and lasts segment_seconds, except the last one.
+
+    :param file_path: The path of the WAV file to split.
+    :param out_path: The folder the segments are written into.
+    :param segment_seconds: The length of each segment.
+    :param overlap_seconds: The length of audio shared by two consecutive segments.
+    :return: A list of (segment file name, offset in seconds) tuples.
+    """
+    if overlap_seconds >= segment_seconds:
+        raise ValueError("overlap_seconds must be shorter than segment_seconds.")
+    segments = []
+    with wave.open(file_path, 'rb') as source:
+        params = source.getparams()
+        framerate = source.getframerate()
+        total_frames = source.getnframes()
+        segment_frames = int(segment_seconds * framerate)
+        step_frames = int((segment_seconds - overlap_seconds) * framerate)
+        start = 0
+        while start < total_frames:
+            name = segment_name(os.path.basename(file_path), len(segments))
+            end = min(start + segment_frames, total_frames)
+            source.setpos(start)
+            with wave.open(os.path.join(out_path, name), 'wb') as target:
+                target.setparams(params)
+                remaining = end - start
+                while remaining > 0:
+                    frames = source.readframes(min(COPY_FRAMES, remaining))
+                    if not frames:
+                        break
+                    target.writeframes(frames)
+                    remaining -= min(COPY_FRAMES, remaining)
+            segments.append((name, start / float(framerate)))
+            if end >= total_frames:
+                break
+            start += step_frames
+    logger.info("Split %s into %s segments.", file_path, len(segments))
+    return segments
+
+
+def _shift(value, offset):
+    return f'{float(value) + offset:.3f}'
+
+
+def _keep(start_time, lower, upper):
+    return lower <= start_time < upper
+
+
+def merge_transcripts(job_name, segments, overlap_seconds):
+    """
+    Merges the transcripts of the segments of a recording into one transcript.
+
+    :param job_name: The job name recorded in the merged transcript.
+    :param segments: A list of (offset in seconds, transcript dict) tuples, in order.
+    :param overlap_seconds: The overlap used when splitting. Each overlap is cut in its
+                            middle, and only the items that start on the owning side of
+                            the cut are kept.
+    :return: The merged transcript dict.
+    """
+    items = []
+    speaker_segments = []
+    speakers = 0
+    account_id = None
+    for index, (offset, transcript) in enumerate(segments):
+        account_id = account_id or transcript.get('accountId')
+        lower = offset + overlap_seconds / 2.0 if index > 0 else float('-inf')
+        upper = (segments[index + 1][0] + overlap_seconds / 2.0
+                 if index + 1 < len(segments) else float('inf'))
+        results = transcript['results']
+
+        keep_previous = False
+        for item in results.get('items', []):
+            if 'start_time' in item:
+                keep_previous = _keep(float(item['start_time']) + offset, lower, upper)
+            # Punctuation has no timestamps and follows the word before it.
+            if not keep_previous:
+                continue
+            merged = dict(item)
+            for field in ('start_time', 'end_time'):
+                if field in merged:
+                    merged[field] = _shift(merged[field], offset)
+            if 'id' in merged:
+                merged['id'] = len(items)
+            items.append(merged)
+
+        speaker_labels = results.get('speaker_labels')
+        if speaker_labels:
+            speakers = max(speakers, speaker_labels.get('speakers', 0))
+            for segment in speaker_labels.get('segments', []):
+                kept = [dict(item, start_time=_shift(item['start_time'], offset),
+                             end_time=_shift(item['end_time'], offset))
+                        for item in segment.get('items', [])
+                        if _keep(float(item['start_time']) + offset, lower, upper)]
+                if not kept and segment.get('items'):
+                    continue
+                if not segment.get('items') and not _keep(float(segment['start_time']) + offset, lower, upper):
+                    continue
+                speaker_segments.append(dict(
+                    segment,
+                    start_time=kept[0]['start_time'] if kept else _shift(segment['start_time'], offset),
+                    end_time=kept[-1]['end_time'] if kept else _shift(segment['end_time'], offset),
+                    items=kept))
+
+    text = ''
+    for item in items:
+        content = item['alternatives'][0]['content'] if item.get('alternatives') else ''
+        if item.get('type') == 'punctuation' or not text:
+            text += content
+        else:
+            text += ' ' + content
+
+    merged_results = {'transcripts': [{'transcript': text}], 'items': items}
+    if speaker_segments or speakers:
+        merged_results['speaker_labels'] = {'speakers': speakers, 'segments': speaker_segments}
+    merged_transcript = {'jobName': job_name, 'results': merged_results, 'status': 'COMPLETED'}
+    if account_id is not None:
+        merged_transcript['accountId'] = account_id
+    logger.info("Merged %s segments into %s items for %s.", len(segments), len(items), job_name)
+    return merged_transcript
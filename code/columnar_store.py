@@ -0,0 +1,166 @@
+"""
+Purpose
+
+Columnar transcript store for analytics. Each transcript is written once as a folder of
+NumPy arrays, one element per item of results.items:
+
+    start, end     float32 seconds, NaN for punctuation
+    confidence     float32, NaN for punctuation
+    speaker        int8 index into the speaker table, -1 when the speaker is unknown
+    type           int8, ITEM_PRONUNCIATION or ITEM_PUNCTUATION
+    word           int32 index into the string table
+
+The string table holds each distinct word once, as UTF-8 bytes with their offsets. The
+arrays are saved as .npy files and loaded memory-mapped, so scans over thousands of
+transcripts read only the columns they use and never parse JSON.
+"""
+
+from array import array
+from collections import namedtuple
+import json
+import logging
+import os
+import numpy as np
+import transcript_stream
+
+logger = logging.getLogger(__name__)
+
+COLUMNS_EXTENSION = '.columns'
+FORMAT_VERSION = 1
+
+ITEM_PRONUNCIATION = 0
+ITEM_PUNCTUATION = 1
+
+TranscriptColumns = namedtuple(
+    'TranscriptColumns',
+    ['job_name', 'speakers', 'start', 'end', 'confidence', 'speaker', 'type', 'word', 'strings'])
+TranscriptColumns.__doc__ = """
+The columns of a transcript.
+
+:param job_name: The name of the transcription job.
+:param speakers: The speaker table, speaker ids index into it.
+:param start: The start times as a float32 array.
+:param end: The end times as a float32 array.
+:param confidence: The confidences as a float32 array.
+:param speaker: The speaker ids as an int8 array.
+:param type: The item types as an int8 array.
+:param word: The word ids as an int32 array.
+:param strings: The StringTable of the words.
+"""
+
+
+class StringTable:
+    """
+    A table of UTF-8 strings stored as one byte buffer and an array of offsets. Strings are
+    only decoded when they are looked up.
+    """
+    def __init__(self, data, offsets):
+        """
+        :param data: The concatenated UTF-8 bytes, as a uint8 array.
+        :param offsets: The start offset of each string plus the end offset of the last
+                        one, as a uint32 array.
+        """
+        self.data = data
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return bytes(self.data[self.offsets[index]:self.offsets[index + 1]]).decode('utf-8')
+
+    def lookup(self, word_ids):
+        """
+        Decodes the strings of an array of word ids.
+        """
+        return [self[index] for index in word_ids]
+
+
+def write_columns(json_file_path, save_as_path):
+    """
+    Writes a transcript JSON file as a columnar transcript folder. The transcript is read
+    with transcript_stream, so memory use is a few bytes per item.
+
+    :param json_file_path: The path of the transcript JSON written by Amazon Transcribe.
+    :param save_as_path: The path of the folder to write, usually ending in '.columns'.
+    :return: The path of the folder.
+    """
+    starts = array('f')
+    ends = array('f')
+    confidences = array('f')
+    speaker_ids = array('b')
+    types = array('b')
+    word_ids = array('i')
+    speakers = {}
+    words = {}
+    nan = float('nan')
+    for speaker, start, end, content, is_punctuation, confidence in transcript_stream.iter_words(json_file_path):
+        if speaker and speaker not in speakers:
+            speakers[speaker] = len(speakers)
+        if content not in words:
+            words[content] = len(words)
+        starts.append(nan if start is None else start)
+        ends.append(nan if end is None else end)
+        confidences.append(nan if confidence is None or is_punctuation else confidence)
+        speaker_ids.append(speakers.get(speaker, -1))
+        types.append(ITEM_PUNCTUATION if is_punctuation else ITEM_PRONUNCIATION)
+        word_ids.append(words[content])
+
+    encoded = [word.encode('utf-8') for word in words]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+    np.cumsum([len(word) for word in encoded], out=offsets[1:])
+
+    os.makedirs(save_as_path, exist_ok=True)
+    columns = {
+        'start': np.frombuffer(starts, dtype=np.float32),
+        'end': np.frombuffer(ends, dtype=np.float32),
+        'confidence': np.frombuffer(confidences, dtype=np.float32),
+        'speaker': np.frombuffer(speaker_ids, dtype=np.int8),
+        'type': np.frombuffer(types, dtype=np.int8),
+        'word': np.frombuffer(word_ids, dtype=np.int32),
+        'string_data': np.frombuffer(b''.join(encoded), dtype=np.uint8),
+        'string_offsets': offsets,
+    }
+    for name, values in columns.items():
+        np.save(os.path.join(save_as_path, name + '.npy'), values)
+    job_name = next(transcript_stream.iter_path(json_file_path, ('jobName',)), None)
+    with open(os.path.join(save_as_path, 'meta.json'), 'w') as meta_file:
+        json.dump({'version': FORMAT_VERSION, 'job_name': job_name, 'speakers': list(speakers),
+                   'items': len(types)}, meta_file)
+    logger.info("Wrote %s items of %s as columns.", len(types), json_file_path)
+    return save_as_path
+
+
+def load_columns(path, mmap=True):
+    """
+    Loads a columnar transcript folder.
+
+    :param path: The path of the folder.
+    :param mmap: When True, the arrays are memory-mapped instead of read into memory.
+    :return: A TranscriptColumns.
+    """
+    with open(os.path.join(path, 'meta.json')) as meta_file:
+        meta = json.load(meta_file)
+    if meta['version'] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported columnar transcript version {meta['version']} in {path}.")
+    mmap_mode = 'r' if mmap else None
+
+    def load(name):
+        return np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+
+    return TranscriptColumns(
+        meta['job_name'], meta['speakers'], load('start'), load('end'), load('confidence'),
+        load('speaker'), load('type'), load('word'), StringTable(load('string_data'), load('string_offsets')))
+
+
+def iter_corpus(path, mmap=True):
+    """
+    Loads every columnar transcript folder found in a folder.
+
+    :param path: The folder to scan, for example the output path.
+    :param mmap: When True, the arrays are memory-mapped.
+    :return: An iterator of TranscriptColumns.
+    """
+    for name in sorted(os.listdir(path)):
+        if name.endswith(COLUMNS_EXTENSION) and os.path.isdir(os.path.join(path, name)):
+            yield load_columns(os.path.join(path, name), mmap)
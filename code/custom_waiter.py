@@ -8,7 +8,6 @@ prebuilt waiters. This class leverages botocore waiter code.
 
 from enum import Enum
 import logging
-import botocore.waiter
 
 logger = logging.getLogger(__name__)
 
@@ -67,35 +66,71 @@ class CustomWaiter:
         self.name = name
         self.operation = operation
         self.argument = argument
+        self.acceptors = acceptors
         self.client = client
+        self._delay = delay
+        self._max_tries = max_tries
+        self._build_waiter()
+
+    def _build_waiter(self):
+        """
+        Builds the botocore waiter model. The delay and maximum attempts are part of the
+        model, so it is rebuilt whenever either of them changes.
+        """
+        # Imported here, botocore.waiter is slow to import and only needed once a waiter is built.
+        import botocore.waiter
         self.waiter_model = botocore.waiter.WaiterModel({
             'version': 2,
             'waiters': {
-                name: {
-                    "delay": delay,
-                    "operation": operation,
-                    "maxAttempts": max_tries,
+                self.name: {
+                    "delay": self._delay,
+                    "operation": self.operation,
+                    "maxAttempts": self._max_tries,
                     "acceptors": [{
                         "state": state.value,
                         "matcher": "path",
-                        "argument": argument,
+                        "argument": self.argument,
                         "expected": expected
-                    } for expected, state in acceptors.items()]
+                    } for expected, state in self.acceptors.items()]
                 }}})
         self.waiter = botocore.waiter.create_waiter_with_client(
             self.name, self.waiter_model, self.client)
 
+    @property
+    def delay(self):
+        """The number of seconds to wait between each call to the operation."""
+        return self._delay
+
+    @delay.setter
+    def delay(self, value):
+        self._delay = value
+        self._build_waiter()
+
+    @property
+    def max_tries(self):
+        """The maximum number of tries before exiting."""
+        return self._max_tries
+
+    @max_tries.setter
+    def max_tries(self, value):
+        self._max_tries = value
+        self._build_waiter()
+
     def __call__(self, parsed, **kwargs):
         """
         Handles the after-call event by logging information about the operation and its
         result.
 
         :param parsed: The parsed response from polling the operation.
-        :param kwargs: Not used, but expected by the caller.
+        :param kwargs: The remaining event arguments. The operation model is used to
+                       ignore calls to other operations made on the same client.
         """
+        model = kwargs.get('model')
+        if model is not None and model.name != self.operation:
+            return
         status = parsed
         for key in self.argument.split('.'):
-            status = status.get(key)
+            status = status.get(key) if isinstance(status, dict) else None
         logger.info(
             "Waiter %s called %s, got %s.", self.name, self.operation, status)
 
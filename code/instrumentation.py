@@ -0,0 +1,275 @@
+"""
+Purpose
+
+Run instrumentation. Every API call made by an instrumented Boto3 client is counted and
+timed by operation through the same botocore event hooks the custom waiters use:
+
+    before-call   starts the clock of a call
+    needs-retry   counts each HTTP attempt, and the attempts that were throttled
+    after-call    stops the clock and counts the call, and whether it failed
+
+Stages of a run are recorded as spans, and finished transcription jobs add their queue
+time (StartTime - CreationTime) and processing time (CompletionTime - StartTime). The
+run is written as an OpenMetrics text file and as a JSON report.
+"""
+
+from contextlib import contextmanager
+import json
+import logging
+import threading
+import time
+from rate_limiter import THROTTLING_ERROR_CODES
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the buckets of the API call duration histograms.
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_START_KEY = 'instrumentation_start'
+
+
+class _CallStats:
+    """
+    The counters of one API operation.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.attempts = 0
+        self.throttles = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def observe(self, seconds):
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[index] += 1
+
+    def as_dict(self):
+        return {'calls': self.calls, 'errors': self.errors, 'attempts': self.attempts,
+                'retries': max(self.attempts - self.calls, 0), 'throttles': self.throttles,
+                'seconds': round(self.seconds, 6), 'max_seconds': round(self.max_seconds, 6)}
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Instrumentation:
+    """
+    Collects API call, stage and job metrics for a run. All methods are thread safe, and
+    do nothing when the instrumentation is disabled.
+    """
+    def __init__(self, enabled=True, profiler=None):
+        """
+        :param enabled: When False, nothing is recorded.
+        :param profiler: An optional profiling.StageProfiler that also profiles each stage.
+        """
+        self.enabled = enabled
+        self.profiler = profiler
+        self.calls = {}
+        self.stages = {}
+        self.spans = []
+        self.jobs = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def _stats(self, service, operation):
+        key = (service, operation)
+        if key not in self.calls:
+            self.calls[key] = _CallStats()
+        return self.calls[key]
+
+    def attach(self, client):
+        """
+        Registers the call hooks on a Boto3 client. Every client of the run is attached
+        once, including the client of a Boto3 resource (resource.meta.client).
+        """
+        if not self.enabled:
+            return client
+        events = client.meta.events
+        events.register('before-call', self._before_call)
+        events.register('after-call', self._after_call)
+        events.register('after-call-error', self._after_call_error)
+        events.register('needs-retry', self._needs_retry)
+        return client
+
+    @staticmethod
+    def _operation(event_name):
+        """
+        Splits an event name like 'after-call.transcribe.StartTranscriptionJob' into its
+        service and operation.
+        """
+        parts = event_name.split('.')
+        return (parts[1] if len(parts) > 1 else ''), parts[-1]
+
+    def _before_call(self, context, **kwargs):
+        context[_START_KEY] = time.perf_counter()
+
+    def _finish_call(self, event_name, context, failed):
+        start = context.pop(_START_KEY, None)
+        with self._lock:
+            stats = self._stats(*self._operation(event_name))
+            stats.calls += 1
+            stats.errors += int(failed)
+            if start is not None:
+                stats.observe(time.perf_counter() - start)
+
+    def _after_call(self, event_name, http_response, context, **kwargs):
+        self._finish_call(event_name, context, http_response.status_code >= 300)
+
+    def _after_call_error(self, event_name, context, **kwargs):
+        self._finish_call(event_name, context, True)
+
+    def _needs_retry(self, event_name, response, **kwargs):
+        # This hook only observes, it returns None so the retry handler still decides.
+        throttled = False
+        if response is not None:
+            code = response[1].get('Error', {}).get('Code')
+            throttled = code in THROTTLING_ERROR_CODES
+        with self._lock:
+            stats = self._stats(*self._operation(event_name))
+            stats.attempts += 1
+            stats.throttles += int(throttled)
+        return None
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Records the time spent in a stage of the run. Stages with the same name add up,
+        and each span is also kept with its start and end offsets. With a profiler, the
+        stage is also profiled.
+        """
+        if not self.enabled and self.profiler is None:
+            yield
+            return
+        start = time.time()
+        try:
+            if self.profiler is not None:
+                with self.profiler.stage(name):
+                    yield
+            else:
+                yield
+        finally:
+            end = time.time()
+            if not self.enabled:
+                return
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + end - start
+                self.spans.append({'stage': name, 'start': round(start - self.started, 6),
+                                   'end': round(end - self.started, 6)})
+
+    def observe(self, stage, seconds):
+        """
+        Adds time spent in a stage that was measured elsewhere, for example in a worker process.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def record_job(self, job):
+        """
+        Records the queue and processing time of a finished job from its CreationTime,
+        StartTime and CompletionTime.
+        """
+        if not self.enabled:
+            return
+        created, started, completed = job.get('CreationTime'), job.get('StartTime'), job.get('CompletionTime')
+        entry = {'status': job.get('TranscriptionJobStatus')}
+        if created is not None and started is not None:
+            entry['queue_seconds'] = (started - created).total_seconds()
+        if started is not None and completed is not None:
+            entry['processing_seconds'] = (completed - started).total_seconds()
+        with self._lock:
+            self.jobs[job['TranscriptionJobName']] = entry
+
+    def report(self):
+        """
+        Returns the metrics of the run as a dict.
+        """
+        with self._lock:
+            queue_times = [job['queue_seconds'] for job in self.jobs.values() if 'queue_seconds' in job]
+            processing_times = [job['processing_seconds'] for job in self.jobs.values() if 'processing_seconds' in job]
+            return {
+                'started': self.started,
+                'elapsed_seconds': round(time.time() - self.started, 6),
+                'api_calls': [dict(service=service, operation=operation, **stats.as_dict())
+                              for (service, operation), stats in sorted(self.calls.items())],
+                'stages': {name: round(seconds, 6) for name, seconds in self.stages.items()},
+                'spans': list(self.spans),
+                'jobs': dict(self.jobs),
+                'job_totals': {
+                    'jobs': len(self.jobs),
+                    'queue_seconds': round(sum(queue_times), 3),
+                    'processing_seconds': round(sum(processing_times), 3),
+                    'max_queue_seconds': round(max(queue_times, default=0.0), 3),
+                    'max_processing_seconds': round(max(processing_times, default=0.0), 3),
+                },
+            }
+
+    def openmetrics(self):
+        """
+        Returns the metrics of the run in the OpenMetrics text format.
+        """
+        lines = []
+
+        def family(name, metric_type, help_text):
+            lines.append(f'# TYPE {name} {metric_type}')
+            lines.append(f'# HELP {name} {help_text}')
+
+        with self._lock:
+            calls = sorted(self.calls.items())
+            family('transcribe_api_calls', 'counter', 'API calls by operation.')
+            for (service, operation), stats in calls:
+                labels = f'service="{_escape_label(service)}",operation="{_escape_label(operation)}"'
+                lines.append(f'transcribe_api_calls_total{{{labels}}} {stats.calls}')
+            for name, attribute, help_text in (
+                    ('transcribe_api_errors', 'errors', 'API calls that failed.'),
+                    ('transcribe_api_attempts', 'attempts', 'HTTP attempts, including retries.'),
+                    ('transcribe_api_throttles', 'throttles', 'HTTP attempts rejected by throttling.')):
+                family(name, 'counter', help_text)
+                for (service, operation), stats in calls:
+                    labels = f'service="{_escape_label(service)}",operation="{_escape_label(operation)}"'
+                    lines.append(f'{name}_total{{{labels}}} {getattr(stats, attribute)}')
+            family('transcribe_api_call_seconds', 'histogram', 'Duration of API calls, including retries.')
+            for (service, operation), stats in calls:
+                labels = f'service="{_escape_label(service)}",operation="{_escape_label(operation)}"'
+                for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                    lines.append(f'transcribe_api_call_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'transcribe_api_call_seconds_bucket{{{labels},le="+Inf"}} {stats.calls}')
+                lines.append(f'transcribe_api_call_seconds_count{{{labels}}} {stats.calls}')
+                lines.append(f'transcribe_api_call_seconds_sum{{{labels}}} {stats.seconds:.6f}')
+            family('transcribe_stage_seconds', 'gauge', 'Time spent in each stage of the run.')
+            for name, seconds in sorted(self.stages.items()):
+                lines.append(f'transcribe_stage_seconds{{stage="{_escape_label(name)}"}} {seconds:.6f}')
+            for name, key, help_text in (
+                    ('transcribe_job_queue_seconds', 'queue_seconds', 'Time from job creation to start.'),
+                    ('transcribe_job_processing_seconds', 'processing_seconds', 'Time from job start to completion.')):
+                family(name, 'gauge', help_text)
+                for job_name, job in sorted(self.jobs.items()):
+                    if key in job:
+                        lines.append(f'{name}{{job="{_escape_label(job_name)}"}} {job[key]:.3f}')
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, save_as_base):
+        """
+        Writes the OpenMetrics text file and the JSON report of the run.
+
+        :param save_as_base: The output path without extension.
+        :return: The paths of the OpenMetrics and JSON files, or None when disabled.
+        """
+        if not self.enabled:
+            return None
+        metrics_path = save_as_base + '.prom'
+        report_path = save_as_base + '.json'
+        with open(metrics_path, 'w') as metrics_file:
+            metrics_file.write(self.openmetrics())
+        with open(report_path, 'w') as report_file:
+            json.dump(self.report(), report_file, indent=2, default=str)
+        logger.info("Wrote run metrics to %s and %s.", metrics_path, report_path)
+        return metrics_path, report_path
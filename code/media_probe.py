@@ -0,0 +1,303 @@
+"""
+Purpose
+
+Local media header sniffing for pre-flight validation. Only the container headers of an
+input file are read (plus the last page of Ogg files) to detect its format, duration,
+sample rate and channel count, so the MediaFormat of each job can be set per file and
+unsupported or corrupt inputs are rejected before they are uploaded.
+
+Detected formats use the MediaFormat values of Amazon Transcribe:
+mp3 | mp4 | m4a | wav | flac | ogg | webm | amr
+"""
+
+from collections import namedtuple
+import logging
+import os
+import struct
+
+logger = logging.getLogger(__name__)
+
+MediaInfo = namedtuple('MediaInfo', ['format', 'duration', 'sample_rate', 'channels', 'size'])
+MediaInfo.__doc__ = """
+Information read from the header of a media file. Fields that the container does not
+carry in its header are None.
+
+:param format: The Amazon Transcribe MediaFormat value.
+:param duration: The duration in seconds.
+:param sample_rate: The sample rate in Hz.
+:param channels: The number of channels.
+:param size: The file size in bytes.
+"""
+
+
+class MediaProbeError(Exception):
+    """
+    Raised when a file is not a supported media file or its header is corrupt.
+    """
+
+
+def _read_exact(media_file, size):
+    data = media_file.read(size)
+    if len(data) != size:
+        raise MediaProbeError("Unexpected end of file while reading the header.")
+    return data
+
+
+def _probe_wav(media_file, size):
+    riff = _read_exact(media_file, 12)
+    if riff[8:12] != b'WAVE':
+        raise MediaProbeError("RIFF file is not WAVE.")
+    channels = sample_rate = byte_rate = None
+    while True:
+        header = media_file.read(8)
+        if len(header) < 8:
+            break
+        chunk_id, chunk_size = struct.unpack('<4sI', header)
+        if chunk_id == b'fmt ':
+            fmt = _read_exact(media_file, 16)
+            audio_format, channels, sample_rate, byte_rate = struct.unpack('<HHII', fmt[:12])
+            media_file.seek(chunk_size - 16 + (chunk_size & 1), os.SEEK_CUR)
+        elif chunk_id == b'data':
+            if byte_rate is None:
+                raise MediaProbeError("WAVE data chunk found before the fmt chunk.")
+            # Streamed files may carry a placeholder size, so clamp it to the file.
+            data_size = min(chunk_size, size - media_file.tell())
+            duration = data_size / float(byte_rate) if byte_rate else None
+            return MediaInfo('wav', duration, sample_rate, channels, size)
+        else:
+            media_file.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+    raise MediaProbeError("WAVE file has no data chunk.")
+
+
+def _probe_flac(media_file, size):
+    _read_exact(media_file, 4)
+    block_header = _read_exact(media_file, 4)
+    if block_header[0] & 0x7F != 0:
+        raise MediaProbeError("FLAC file does not start with STREAMINFO.")
+    info = _read_exact(media_file, 34)
+    packed = int.from_bytes(info[10:18], 'big')
+    sample_rate = packed >> 44
+    channels = ((packed >> 41) & 0x7) + 1
+    total_samples = packed & 0xFFFFFFFFF
+    if sample_rate == 0:
+        raise MediaProbeError("FLAC STREAMINFO has no sample rate.")
+    duration = total_samples / float(sample_rate) if total_samples else None
+    return MediaInfo('flac', duration, sample_rate, channels, size)
+
+
+_MP3_BITRATES = {
+    # (MPEG version 1, layer III) and (MPEG version 2/2.5, layer III), in kbit/s.
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 0],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160, 0],
+}
+_MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def _probe_mp3(media_file, size):
+    head = media_file.read(10)
+    audio_start = 0
+    if head[:3] == b'ID3' and len(head) == 10:
+        tag_size = 0
+        for byte in head[6:10]:
+            tag_size = (tag_size << 7) | (byte & 0x7F)
+        audio_start = 10 + tag_size
+    media_file.seek(audio_start)
+    window = media_file.read(64 * 1024)
+    for pos in range(len(window) - 4):
+        if window[pos] != 0xFF or window[pos + 1] & 0xE0 != 0xE0:
+            continue
+        header = int.from_bytes(window[pos:pos + 4], 'big')
+        version = (header >> 19) & 0x3
+        layer = (header >> 17) & 0x3
+        bitrate_index = (header >> 12) & 0xF
+        rate_index = (header >> 10) & 0x3
+        if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+            continue
+        bitrate = _MP3_BITRATES[1 if version == 3 else 2][bitrate_index] * 1000
+        sample_rate = _MP3_SAMPLE_RATES[version][rate_index]
+        channels = 1 if (header >> 6) & 0x3 == 3 else 2
+        samples_per_frame = 1152 if version == 3 else 576
+
+        # A Xing/Info or VBRI header holds the frame count of variable bitrate files.
+        frames = None
+        for tag in (b'Xing', b'Info'):
+            tag_pos = window.find(tag, pos, pos + 200)
+            if tag_pos != -1 and tag_pos + 12 <= len(window):
+                flags = int.from_bytes(window[tag_pos + 4:tag_pos + 8], 'big')
+                if flags & 0x1:
+                    frames = int.from_bytes(window[tag_pos + 8:tag_pos + 12], 'big')
+        vbri_pos = window.find(b'VBRI', pos, pos + 200)
+        if frames is None and vbri_pos != -1 and vbri_pos + 18 <= len(window):
+            frames = int.from_bytes(window[vbri_pos + 14:vbri_pos + 18], 'big')
+        if frames:
+            duration = frames * samples_per_frame / float(sample_rate)
+        else:
+            duration = (size - audio_start - pos) * 8 / float(bitrate)
+        return MediaInfo('mp3', duration, sample_rate, channels, size)
+    raise MediaProbeError("No MPEG audio frame found.")
+
+
+def _iter_boxes(media_file, start, end):
+    """
+    Yields (box type, payload start, payload end) for the ISO BMFF boxes in a range,
+    reading only the box headers.
+    """
+    pos = start
+    while pos + 8 <= end:
+        media_file.seek(pos)
+        box_size, box_type = struct.unpack('>I4s', _read_exact(media_file, 8))
+        header_size = 8
+        if box_size == 1:
+            box_size = struct.unpack('>Q', _read_exact(media_file, 8))[0]
+            header_size = 16
+        elif box_size == 0:
+            box_size = end - pos
+        if box_size < header_size:
+            raise MediaProbeError("Corrupt MP4 box size.")
+        yield box_type, pos + header_size, min(pos + box_size, end)
+        pos += box_size
+
+
+def _find_box(media_file, start, end, path):
+    for box_type, payload_start, payload_end in _iter_boxes(media_file, start, end):
+        if box_type == path[0]:
+            if len(path) == 1:
+                return payload_start, payload_end
+            return _find_box(media_file, payload_start, payload_end, path[1:])
+    return None
+
+
+def _probe_mp4(media_file, size):
+    media_file.seek(8)
+    brand = _read_exact(media_file, 4)
+    media_format = 'm4a' if brand in (b'M4A ', b'M4B ') else 'mp4'
+    moov = _find_box(media_file, 0, size, [b'moov'])
+    if moov is None:
+        raise MediaProbeError("MP4 file has no moov box.")
+
+    duration = None
+    mvhd = _find_box(media_file, moov[0], moov[1], [b'mvhd'])
+    if mvhd is not None:
+        media_file.seek(mvhd[0])
+        version = _read_exact(media_file, 4)[0]
+        if version == 1:
+            timescale, movie_duration = struct.unpack('>16xIQ', _read_exact(media_file, 28))
+        else:
+            timescale, movie_duration = struct.unpack('>8xII', _read_exact(media_file, 16))
+        if timescale:
+            duration = movie_duration / float(timescale)
+
+    sample_rate = channels = None
+    has_audio = False
+    for box_type, trak_start, trak_end in _iter_boxes(media_file, moov[0], moov[1]):
+        if box_type != b'trak':
+            continue
+        hdlr = _find_box(media_file, trak_start, trak_end, [b'mdia', b'hdlr'])
+        if hdlr is None:
+            continue
+        media_file.seek(hdlr[0] + 8)
+        if _read_exact(media_file, 4) != b'soun':
+            continue
+        has_audio = True
+        stsd = _find_box(media_file, trak_start, trak_end, [b'mdia', b'minf', b'stbl', b'stsd'])
+        if stsd is not None:
+            # Skip the full box header and entry count, then the sample entry header.
+            media_file.seek(stsd[0] + 8 + 8 + 16)
+            channels, sample_size, rate_fixed = struct.unpack('>HH4xI', _read_exact(media_file, 12))
+            sample_rate = rate_fixed >> 16
+        break
+    if not has_audio:
+        raise MediaProbeError("MP4 file has no audio track.")
+    return MediaInfo(media_format, duration, sample_rate, channels, size)
+
+
+def _probe_ogg(media_file, size):
+    page = media_file.read(27 + 255 + 64)
+    segments = page[26]
+    packet = page[27 + segments:]
+    if packet.startswith(b'OpusHead'):
+        channels = packet[9]
+        pre_skip = struct.unpack('<H', packet[10:12])[0]
+        sample_rate = struct.unpack('<I', packet[12:16])[0] or 48000
+        granule_rate = 48000
+    elif packet.startswith(b'\x01vorbis'):
+        channels = packet[11]
+        sample_rate = struct.unpack('<I', packet[12:16])[0]
+        granule_rate = sample_rate
+        pre_skip = 0
+    else:
+        raise MediaProbeError("Ogg stream is neither Opus nor Vorbis.")
+
+    # The granule position of the last page is the total number of samples.
+    tail_size = min(size, 64 * 1024)
+    media_file.seek(size - tail_size)
+    tail = media_file.read(tail_size)
+    last_page = tail.rfind(b'OggS')
+    duration = None
+    if last_page != -1 and last_page + 14 <= len(tail):
+        granule = struct.unpack('<q', tail[last_page + 6:last_page + 14])[0]
+        if granule > 0 and granule_rate:
+            duration = max(granule - pre_skip, 0) / float(granule_rate)
+    return MediaInfo('ogg', duration, sample_rate, channels, size)
+
+
+def _probe_amr(media_file, size):
+    magic = media_file.read(9)
+    sample_rate = 16000 if magic.startswith(b'#!AMR-WB\n') else 8000
+    return MediaInfo('amr', None, sample_rate, 1, size)
+
+
+def probe(file_path):
+    """
+    Detects the format of a media file from its header and reads its duration, sample
+    rate and channel count where the container header carries them.
+
+    :param file_path: The path of the media file.
+    :return: A MediaInfo.
+    """
+    size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as media_file:
+        magic = media_file.read(12)
+        media_file.seek(0)
+        try:
+            if magic[:4] == b'RIFF':
+                return _probe_wav(media_file, size)
+            if magic[:4] == b'fLaC':
+                return _probe_flac(media_file, size)
+            if magic[4:8] == b'ftyp':
+                return _probe_mp4(media_file, size)
+            if magic[:4] == b'OggS':
+                return _probe_ogg(media_file, size)
+            if magic[:4] == b'\x1a\x45\xdf\xa3':
+                return MediaInfo('webm', None, None, None, size)
+            if magic.startswith(b'#!AMR'):
+                return _probe_amr(media_file, size)
+            if magic[:3] == b'ID3' or (len(magic) > 1 and magic[0] == 0xFF and magic[1] & 0xE0 == 0xE0):
+                return _probe_mp3(media_file, size)
+        except (struct.error, IndexError) as err:
+            raise MediaProbeError(f"Corrupt header: {err}") from err
+    raise MediaProbeError("Unrecognized or unsupported media format.")
+
+
+def validate(media_info, max_duration=None, max_size=None, min_sample_rate=None):
+    """
+    Checks media information against the limits of the service.
+
+    :param media_info: The MediaInfo of the file.
+    :param max_duration: The longest accepted duration in seconds.
+    :param max_size: The largest accepted file size in bytes.
+    :param min_sample_rate: The lowest accepted sample rate in Hz.
+    :return: A description of the first problem found, or None when the file is valid.
+    """
+    if media_info.duration is not None and media_info.duration <= 0:
+        return "the media has no audio"
+    if max_duration is not None and media_info.duration is not None and media_info.duration > max_duration:
+        return f"duration {media_info.duration:.0f}s exceeds {max_duration}s"
+    if max_size is not None and media_info.size > max_size:
+        return f"size {media_info.size} bytes exceeds {max_size} bytes"
+    if (min_sample_rate is not None and media_info.sample_rate is not None
+            and media_info.sample_rate < min_sample_rate):
+        return f"sample rate {media_info.sample_rate} Hz is below {min_sample_rate} Hz"
+    if media_info.channels is not None and media_info.channels < 1:
+        return "the media has no channels"
+    return None
@@ -20,13 +20,101 @@ config = {
 		'bucket_name': 'input.mytestbucket.com',
 		'out_bucket_name': 'output.mytestbucket.com'
 	},
+	'client_config': {
+		'max_pool_connections': None,      # Connections per service shared by all modules. None sizes each pool to the configured workers.
+		'retry_mode': 'standard',          # 'standard' | 'adaptive' (adds client-side rate limiting) | 'legacy'.
+		'max_attempts': 10,                # Attempts per API call, including the first one.
+	},
+	'concurrency_config': {
+		'enabled': True,                   # Adapts the calls in flight to each service to throttling (AIMD), see rate_limiter.py.
+		'initial_limit': None,             # Calls in flight per service at start. None starts at the connection pool size.
+		'min_limit': 1,                    # The limit is never cut below this.
+		'increase': 1.0,                   # Added to the limit per round of successful calls.
+		'decrease_factor': 0.5,            # Multiplies the limit when a round of calls is throttled.
+		'max_throttle_retries': 20,        # Retries of a throttled call once the client's own retries are used up.
+		'max_backoff_seconds': 20,         # Longest wait before retrying a throttled call.
+	},
+	'upload_config': {
+		'max_workers': 4,                  # Number of files uploaded in parallel.
+		'multipart_threshold_mb': 16,      # Files larger than this are uploaded in multiple parts.
+		'multipart_chunksize_mb': 16,      # Size of each part of a multipart upload.
+		'max_concurrency': 10,             # Number of parts uploaded in parallel for each file.
+	},
+	'submit_config': {
+		'max_workers': 10,                 # Number of StartTranscriptionJob calls in flight.
+		'rate_per_second': 10,             # Sustained calls per second, match this to your StartTranscriptionJob TPS quota.
+		'burst': 10,                       # Maximum number of calls allowed in a single burst.
+	},
+	'wait_config': {
+		'delay': 15,                       # Seconds between each status sweep of the submitted jobs.
+		'max_tries': 960,                  # Maximum number of sweeps before giving up on pending jobs.
+	},
+	'preflight_config': {
+		'enabled': True,                   # True | False. Reads each input header to set the media format per job and reject files that would fail.
+		'max_duration_seconds': 14400,     # Longest media accepted by Amazon Transcribe (4 hours).
+		'max_size_bytes': 2 * 1024 ** 3,   # Largest media file accepted by Amazon Transcribe (2 GB).
+		'min_sample_rate': 8000,           # Lowest sample rate accepted by Amazon Transcribe.
+	},
+	'scheduler_config': {
+		'enabled': False,                  # True | False. Submits jobs from the client, keeping 'slots' jobs in flight, instead of queuing them all with the service.
+		'slots': 90,                       # Number of jobs in flight. Match this to your concurrent job quota.
+		'policy': 'longest_first',         # 'longest_first' minimizes the makespan | 'shortest_first' minimizes the mean latency | 'fifo' keeps the listing order.
+	},
+	'chunking_config': {
+		'enabled': False,                  # True | False. Splits long WAV/PCM recordings into segments transcribed in parallel (batch mode only).
+		'min_duration_seconds': 3600,      # Recordings at least this long are split.
+		'segment_seconds': 1800,           # Length of each segment.
+		'overlap_seconds': 15,             # Audio shared by consecutive segments, so no word is cut in half.
+		'originals_path': '../input_originals/',   # Split recordings and their segment manifests are moved here.
+	},
+	'pipeline_config': {
+		'mode': 'batch',                   # 'batch' runs each step for all files in turn | 'streaming' moves each file through all steps on its own.
+		'queue_size': 100,                 # Maximum number of files waiting between two streaming stages.
+		'export_workers': 4,               # Number of transcripts downloaded and exported in parallel in streaming mode.
+	},
+	'watch_config': {
+		'backend': 'auto',                 # 'auto' uses inotify on Linux and polls elsewhere | 'inotify' | 'polling'. Used with --watch.
+		'poll_interval_seconds': 5,        # Seconds between two listings of the input path when polling. A file must stay unchanged this long.
+		'batch_size': 20,                  # A micro-batch is started once this many new files arrived...
+		'batch_window_seconds': 60,        # ...or once this many seconds passed since the first file of the micro-batch arrived.
+	},
+	'export_config': {
+		'download_workers': 8,             # Number of threads downloading and archiving transcripts.
+		'render_workers': None,            # Number of processes rendering docx files. None uses one per CPU.
+		'renderer': 'tscribe',             # 'tscribe' renders with Tscribe (docx only) | 'native' opts in to transcript_render.py, which is faster and writes more formats.
+		'formats': ['docx'],               # Native renderer only, any of 'docx', 'txt', 'csv', 'srt', 'vtt'. A docx is always written.
+		'columnar': True,                  # True | False. Also writes each transcript as memory-mapped NumPy arrays ('<name>.columns' folder) for analytics.
+	},
+	'analytics_config': {
+		'enabled': True,                   # True | False. Writes per-speaker talk time, words per minute, silence ratio and confidence histograms of the exported transcripts.
+		'confidence_bins': 10,             # Number of bins of the confidence histograms, between 1 and 100.
+	},
+	'instrumentation_config': {
+		'enabled': True,                   # True | False. Counts and times every API call, stage and job, written as 'run_metrics_xxxxxx.prom' (OpenMetrics) and '.json' into the output path.
+	},
+	'profiling_config': {
+		'enabled': False,                  # True | False. Profiles each stage with cProfile and tracemalloc, same as running with --profile.
+		'profiles_path': '../output/profiles/',   # Per-stage .prof dumps, their top functions and profile_summary.json.
+	},
+	'run_state_config': {
+		'enabled': True,                   # True | False. Records progress so an interrupted run resumes where it stopped.
+		'db_path': '../output/run_state.db',   # SQLite manifest of uploads, jobs, exports and archives.
+	},
+	'cache_config': {
+		'enabled': True,                   # True | False. Reuses the transcript of identical audio instead of starting a new job.
+		'prefix': 'archive/by-hash',       # Output bucket prefix the transcripts are cached under, keyed by audio hash.
+		'hash_workers': 4,                 # Number of input files hashed in parallel.
+	},
+	'archive_config': {
+		'copy_workers': 16,                # Number of server-side copies run in parallel while archiving. Sources are deleted in batches of up to 1000 keys.
+	},
 	'aws_transcribe_config': {
 		'job_prefix': 'shufyan',             # You must add a Job Prefix to list all jobs with specific prefix
 		'vocabulary_name': 'test1-vocab',
 		'phrases': ['brillig', 'slithy', 'borogoves', 'mome', 'raths', 'Jub-Jub', 'frumious',
             'manxome', 'Tumtum', 'uffish', 'whiffling', 'tulgey', 'thou', 'frabjous',
             'callooh', 'callay', 'chortled'],
-		'media_format': 'mp4',         # Keep blank '' if you want aws to detect automatically.
+		'media_format': 'mp4',         # Keep blank '' if you want aws to detect automatically. Overridden per file when the pre-flight checks detect the format.
 		'Settings': {
 			'ShowSpeakerLabels': True,         # True | False
 			'MaxSpeakerLabels': 6,             # Value must be between (1-10). Note: If you specify the 'max_speaker_labels' field, you must set the 'show_speaker_labels' field to True.
@@ -0,0 +1,246 @@
+"""
+Purpose
+
+Streaming pipeline mode for the transcription workflow. Instead of running each step
+for the whole batch before the next one starts, every input file moves through the
+following stages on its own, connected by bounded queues:
+
+    upload -> submit -> completion -> download & docx export -> archive
+
+The first docx is produced as soon as the first job finishes, and short recordings are
+never held up behind long ones.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from botocore.exceptions import BotoCoreError, ClientError
+import transcribe_basics as tb
+from archive import ArchiveError
+from parameters import config
+from rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of the items of a queue.
+_DONE = object()
+
+
+class StreamingPipeline:
+    """
+    Runs the upload, submit, completion and export stages concurrently for the files of
+    the input path, using the methods of a TranscribeAndExport instance for each file.
+    """
+    def __init__(self, transcribe_and_export):
+        """
+        :param transcribe_and_export: The TranscribeAndExport instance that does the work.
+        """
+        self.ts = transcribe_and_export
+        queue_size = config['pipeline_config']['queue_size']
+        self.upload_queue = queue.Queue(maxsize=queue_size)
+        self.submit_queue = queue.Queue(maxsize=queue_size)
+        self.export_queue = queue.Queue(maxsize=queue_size)
+        self.completed_jobs = []
+        self.failed_jobs = []
+        self.exported = []
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._submit_done = threading.Event()
+        self._results_lock = threading.Lock()
+
+    def _run_workers(self, name, target, count, in_queue, out_queue):
+        """
+        Starts worker threads for a stage. When every worker has seen the end of its input
+        queue, the end marker is passed on to the output queue. The time spent on each item
+        is added to the stage in the instrumentation. An item that raises is marked failed,
+        so a worker never dies and its queue keeps draining.
+        """
+        def worker():
+            while True:
+                item = in_queue.get()
+                if item is _DONE:
+                    in_queue.put(_DONE)
+                    break
+                start = time.perf_counter()
+                try:
+                    target(item)
+                except Exception as err:
+                    logger.exception("Failed to %s %s.", name, item)
+                    self._fail(name, item, err)
+                self.ts.instrumentation.observe(name, time.perf_counter() - start)
+
+        def closer(threads):
+            for thread in threads:
+                thread.join()
+            if out_queue is not None:
+                out_queue.put(_DONE)
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        closer_thread = threading.Thread(target=closer, args=(threads,), daemon=True)
+        closer_thread.start()
+        return closer_thread
+
+    def _fail(self, stage, item, err):
+        """
+        Records an input file, or a transcript for the export stage, that failed in a stage.
+        """
+        self.ts.failed_files[item] = f'{stage.capitalize()} failed: {err}'
+
+    def _upload(self, file):
+        try:
+            if config['preflight_config']['enabled'] and not self.ts.preflight_file(file):
+                return
+            if self.ts.is_uploaded(file):
+                self.submit_queue.put(file)
+                return
+            file, file_bytes, elapsed = self.ts.upload_file(file, self.transfer_config)
+            print(f"Uploaded {file}: {file_bytes} bytes in {elapsed:.2f}s "
+                  f"({self.ts.throughput(file_bytes, elapsed):.2f} MB/s).")
+            self.submit_queue.put(file)
+        except (ClientError, OSError) as err:
+            logger.exception("Failed to upload %s.", file)
+            self._fail('upload', file, err)
+
+    def _submit(self, object_key):
+        job_name = self.ts.get_job_name(object_key)
+        if self.ts.run_state.get_job_status(job_name) is not None:
+            print(f"Skipping transcription job {job_name}, already started.")
+            return
+        try:
+            self.ts.hash_input_files([object_key])
+            job = self.ts.submit_file(object_key, self.vocabulary_name, self.rate_limiter)
+        except ClientError as err:
+            logger.info(f'Something went wrong with job: {job_name}', exc_info=True)
+            self._fail('submit', object_key, err)
+            return
+        if job is None:
+            if self.ts.run_state.get_job_status(job_name) == 'CACHED':
+                self.export_queue.put(job_name + '.json')
+            return
+        with self._pending_lock:
+            self._pending.add(job_name)
+
+    def _watch_completion(self):
+        """
+        Sweeps the status of the submitted jobs until every job has finished and no more
+        jobs can be submitted. Completed jobs are queued for export as soon as they are seen.
+        After 'max_tries' sweeps without progress, the jobs still pending are reported as
+        failed and no longer waited for.
+        """
+        waiter = tb.TranscribeJobsCompleteWaiter(self.ts.transcribe_client)
+        job_filter = config['aws_transcribe_config']['job_prefix']
+        since = self.ts.get_job_listing_cursor()
+        idle_sweeps = 0
+        try:
+            while True:
+                submit_done = self._submit_done.is_set()
+                with self._pending_lock:
+                    pending = set(self._pending)
+                if pending:
+                    try:
+                        finished = waiter.poll(pending, job_filter, since)
+                    except (ClientError, BotoCoreError):
+                        logger.exception("Couldn't sweep the status of the submitted jobs.")
+                        finished = []
+                    with self._pending_lock:
+                        for job in finished:
+                            self._pending.discard(job['TranscriptionJobName'])
+                    for job in finished:
+                        self._finish_job(job)
+                    idle_sweeps = 0 if finished else idle_sweeps + 1
+                    if idle_sweeps >= config['wait_config']['max_tries']:
+                        self._abandon_pending(idle_sweeps)
+                        idle_sweeps = 0
+                elif submit_done:
+                    break
+                time.sleep(config['wait_config']['delay'] if pending else 1)
+        finally:
+            self.export_queue.put(_DONE)
+
+    def _finish_job(self, job):
+        """
+        Records a finished job and queues the transcripts of a completed one for export.
+        """
+        try:
+            # Cached before the export archives the transcript away.
+            duplicates = self.ts.record_finished_job(job)
+        except Exception:
+            logger.exception("Couldn't record the finished job %s.", job['TranscriptionJobName'])
+            duplicates = []
+        if job['TranscriptionJobStatus'] == 'COMPLETED':
+            self.completed_jobs.append(job)
+            for job_name in [job['TranscriptionJobName']] + duplicates:
+                self.export_queue.put(job_name + '.json')
+        else:
+            self.failed_jobs.append(job)
+
+    def _abandon_pending(self, idle_sweeps):
+        """
+        Stops waiting for the pending jobs, for example jobs of an interrupted run that were
+        deleted or expired since, and reports their files as failed.
+        """
+        with self._pending_lock:
+            abandoned = sorted(self._pending)
+            self._pending.clear()
+        logger.error("Stopped waiting for %s job(s) after %s sweeps without progress.", len(abandoned), idle_sweeps)
+        for job_name in abandoned:
+            self.ts.failed_files[self.ts.get_object_key(job_name)] = (
+                f'Job {job_name} did not finish after {idle_sweeps} status sweeps')
+
+    def _export(self, object_key):
+        try:
+            if self.ts.export_object(object_key, config['file_paths']['archive_path']):
+                with self._results_lock:
+                    self.exported.append(object_key)
+                print(f"Exported {object_key}.")
+        except (ClientError, OSError, ValueError, KeyError, ArchiveError) as err:
+            logger.exception("Failed to export %s.", object_key)
+            self._fail('export', object_key, err)
+
+    def run(self, files=None):
+        """
+        Runs every file through the pipeline and waits until all of them are exported.
+
+        :param files: The names of the files in the input path. Defaults to all of them.
+        :return: The lists of COMPLETED and FAILED job summaries.
+        """
+        if files is None:
+            files = os.listdir(self.ts.input_path)
+        self.ts.create_buckets()
+        self.transfer_config = self.ts.get_transfer_config()
+        self.vocabulary_name = self.ts.get_vocabulary_name()
+        self.rate_limiter = TokenBucket(config['submit_config']['rate_per_second'],
+                                        config['submit_config']['burst'])
+        # Resuming the jobs an interrupted run was still waiting for
+        self._pending.update(self.ts.run_state.in_flight_jobs())
+
+        upload_stage = self._run_workers(
+            'upload', self._upload, config['upload_config']['max_workers'],
+            self.upload_queue, self.submit_queue)
+        submit_stage = self._run_workers(
+            'submit', self._submit, config['submit_config']['max_workers'],
+            self.submit_queue, None)
+        completion_stage = threading.Thread(target=self._watch_completion, daemon=True)
+        completion_stage.start()
+        export_stage = self._run_workers(
+            'export', self._export, config['pipeline_config']['export_workers'],
+            self.export_queue, None)
+
+        start = time.perf_counter()
+        for file in files:
+            self.upload_queue.put(file)
+        self.upload_queue.put(_DONE)
+
+        upload_stage.join()
+        submit_stage.join()
+        self._submit_done.set()
+        completion_stage.join()
+        export_stage.join()
+        self.ts.advance_job_listing_cursor(self.completed_jobs + self.failed_jobs)
+        print(f"Pipeline finished {len(self.exported)} export(s) of {len(files)} file(s) in "
+              f"{time.perf_counter() - start:.2f}s, {len(self.ts.failed_files)} failed.")
+        return self.completed_jobs, self.failed_jobs
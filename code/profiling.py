@@ -0,0 +1,153 @@
+"""
+Purpose
+
+Opt-in CPU and memory profiling of the local stages of a run. When profiling is turned on,
+with config['profiling_config'] or the --profile command line flag, each stage recorded by
+the instrumentation also runs under cProfile and tracemalloc, and its profile is dumped
+into the profiles path:
+
+    <stage>.prof             cProfile stats, readable with pstats or snakeviz
+    <stage>.txt              the 30 functions with the highest cumulative time
+    profile_summary.json     seconds and peak traced memory of every profiled stage
+
+cProfile sees the thread that runs the stage, so stages that fan out to thread pools
+mostly show time spent waiting for them. Renders in worker processes are profiled in the
+worker with profile_call. Stages nested in, or concurrent with, a profiled stage are not
+profiled on their own. When profiling is off, no profiler or tracer is started.
+"""
+
+import cProfile
+from contextlib import contextmanager
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+logger = logging.getLogger(__name__)
+
+# Number of functions listed in the text summary of each profile.
+TOP_FUNCTIONS = 30
+
+
+def _write_text(profile_path):
+    import pstats
+    with open(os.path.splitext(profile_path)[0] + '.txt', 'w') as text_file:
+        stats = pstats.Stats(profile_path, stream=text_file)
+        stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+
+
+@contextmanager
+def _profiled(profile_path, result):
+    """
+    Runs the body under cProfile and tracemalloc, dumps the profile and fills result with
+    the seconds and peak traced bytes.
+    """
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    else:
+        tracemalloc.reset_peak()
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Another profiler is active in this process.
+        profile = None
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        result['seconds'] = time.perf_counter() - start
+        if profile is not None:
+            profile.disable()
+        result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        if started_tracing:
+            tracemalloc.stop()
+        if profile is not None:
+            profile.dump_stats(profile_path)
+            _write_text(profile_path)
+            result['profile'] = profile_path
+
+
+def profile_call(profile_path, func, *args):
+    """
+    Calls a function under cProfile and tracemalloc, for example in a worker process, and
+    dumps its profile.
+
+    :return: The result of the function and a dict of its seconds, peak traced bytes and
+             profile path.
+    """
+    result = {}
+    with _profiled(profile_path, result):
+        value = func(*args)
+    return value, result
+
+
+class StageProfiler:
+    """
+    Profiles the stages of a run, one at a time, into a folder.
+    """
+    def __init__(self, profiles_path):
+        """
+        :param profiles_path: The folder the profiles are written into.
+        """
+        self.profiles_path = profiles_path
+        os.makedirs(profiles_path, exist_ok=True)
+        self.results = []
+        self._counts = {}
+        self._active = False
+        self._lock = threading.Lock()
+
+    def profile_path(self, name):
+        """
+        Returns a new profile path for a stage. A stage that runs more than once gets a
+        numbered profile per run.
+        """
+        with self._lock:
+            count = self._counts.get(name, 0)
+            self._counts[name] = count + 1
+        suffix = f'-{count}' if count else ''
+        return os.path.join(self.profiles_path, f'{name}{suffix}.prof')
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Profiles a stage, unless another profiled stage is already running.
+        """
+        with self._lock:
+            busy = self._active
+            self._active = True
+        if busy:
+            yield
+            return
+        result = {'stage': name}
+        try:
+            with _profiled(self.profile_path(name), result):
+                yield
+        finally:
+            with self._lock:
+                self._active = False
+                self.results.append(result)
+            logger.info("Profiled stage %s: %.3f s, peak %s bytes.", name, result['seconds'], result['peak_bytes'])
+
+    def record(self, name, result):
+        """
+        Adds the result of a profile_call made elsewhere, for example in a worker process.
+        """
+        with self._lock:
+            self.results.append(dict(result, stage=name))
+
+    def write_summary(self):
+        """
+        Writes the seconds and peak traced memory of every profiled stage.
+
+        :return: The path of the summary.
+        """
+        summary_path = os.path.join(self.profiles_path, 'profile_summary.json')
+        with self._lock:
+            results = list(self.results)
+        with open(summary_path, 'w') as summary_file:
+            json.dump(results, summary_file, indent=2)
+        return summary_path
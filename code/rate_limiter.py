@@ -0,0 +1,215 @@
+"""
+Purpose
+
+Token bucket rate limiter used to keep concurrent API calls within the transactions per
+second (TPS) quota of an operation, for example StartTranscriptionJob, and an adaptive
+limit on the calls in flight to a service that backs off when the service throttles.
+"""
+
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Error codes returned when requests exceed the service's rate limits.
+THROTTLING_ERROR_CODES = (
+    'ThrottlingException', 'Throttling', 'TooManyRequestsException',
+    'LimitExceededException', 'RequestLimitExceeded', 'SlowDown')
+
+_STARTED_KEY = 'concurrency_started'
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket. Tokens are added at a constant rate up to a maximum
+    capacity, and each call consumes one token. Callers block until a token is available,
+    so the sustained call rate never exceeds the refill rate, while short bursts up to the
+    capacity are allowed.
+    """
+    def __init__(self, rate, capacity=None):
+        """
+        :param rate: The number of tokens added per second. This is the sustained rate limit.
+        :param capacity: The maximum number of tokens the bucket can hold. This is the largest
+                         burst allowed. Defaults to the rate.
+        """
+        if rate <= 0:
+            raise ValueError("rate must be greater than zero.")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def try_acquire(self, tokens=1):
+        """
+        Takes tokens from the bucket without blocking.
+
+        :param tokens: The number of tokens to take.
+        :return: True when the tokens were taken, otherwise False.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1):
+        """
+        Takes tokens from the bucket, blocking until enough tokens are available.
+
+        :param tokens: The number of tokens to take.
+        :return: The number of seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    A thread-safe limit on the number of calls in flight to a service, adapted with
+    additive increase and multiplicative decrease (AIMD). Each successful call raises the
+    limit by increase / limit, so by about increase per round of calls, and a round of
+    calls that is throttled cuts it by decrease_factor. Throttles of calls that started
+    before the last cut belong to the same round and don't cut it again. The limit settles
+    just under the rate the service accepts.
+
+    Once attached to a Boto3 client, every call of the client waits for a slot, and a
+    throttled call is retried with backoff after the retry handler of the client gives up,
+    until max_attempts.
+    """
+    def __init__(self, name, max_limit, min_limit=1, initial_limit=None, increase=1.0,
+                 decrease_factor=0.5, max_attempts=30, max_backoff=20.0):
+        """
+        :param name: The name of the limiter, used in log messages.
+        :param max_limit: The highest limit, for example the connection pool size.
+        :param min_limit: The lowest limit.
+        :param initial_limit: The limit at start. Defaults to max_limit.
+        :param increase: The increase of the limit per round of successful calls.
+        :param decrease_factor: The factor the limit is multiplied by when throttled.
+        :param max_attempts: The attempts of a call, including the retries of the client,
+                             after which a throttled call fails.
+        :param max_backoff: The longest backoff, in seconds, before retrying a throttled call.
+        """
+        if not 0 < decrease_factor < 1:
+            raise ValueError("decrease_factor must be between zero and one.")
+        self.name = name
+        self.max_limit = float(max_limit)
+        self.min_limit = float(min(min_limit, max_limit))
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self.throttles = 0
+        self.decreases = 0
+        self._limit = float(initial_limit if initial_limit is not None else max_limit)
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        """The number of calls allowed in flight."""
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        """The number of calls in flight."""
+        return self._in_flight
+
+    def acquire(self):
+        """
+        Takes a slot, blocking until fewer calls than the limit are in flight.
+
+        :return: The time the call started, to pass to throttled.
+        """
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+            return time.monotonic()
+
+    def release(self, succeeded):
+        """
+        Gives back a slot. A successful call raises the limit.
+
+        :param succeeded: Whether the call succeeded.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if succeeded:
+                self._limit = min(self.max_limit, self._limit + self.increase / self._limit)
+            self._condition.notify()
+
+    def throttled(self, started):
+        """
+        Cuts the limit, unless the throttled call started before the last cut.
+
+        :param started: The time the throttled call, or its last attempt, started.
+        """
+        with self._condition:
+            self.throttles += 1
+            if started < self._last_decrease:
+                return
+            self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+            self._last_decrease = time.monotonic()
+            self.decreases += 1
+        logger.info("Throttled by %s, cut the calls in flight to %s.", self.name, self.limit)
+
+    def attach(self, client):
+        """
+        Registers the limiter on a Boto3 client. It must be attached right after the
+        client is created, so the retry handler of the client runs before it.
+        """
+        events = client.meta.events
+        events.register('before-call', self._before_call)
+        events.register('after-call', self._after_call)
+        events.register('after-call-error', self._after_call_error)
+        events.register('needs-retry', self._needs_retry)
+        return client
+
+    def _before_call(self, context, **kwargs):
+        context[_STARTED_KEY] = self.acquire()
+
+    def _after_call(self, http_response, context, **kwargs):
+        if context.pop(_STARTED_KEY, None) is not None:
+            self.release(http_response.status_code < 300)
+
+    def _after_call_error(self, context, **kwargs):
+        if context.pop(_STARTED_KEY, None) is not None:
+            self.release(False)
+
+    def _needs_retry(self, response, attempts, request_dict, **kwargs):
+        """
+        Cuts the limit on every throttled attempt. The first handler that returns a delay
+        decides the retry, so the delay returned here only applies once the retry handler
+        of the client has given up.
+        """
+        if response is None or response[1].get('Error', {}).get('Code') not in THROTTLING_ERROR_CODES:
+            return None
+        context = request_dict['context']
+        started = context.get(_STARTED_KEY)
+        if started is not None:
+            self.throttled(started)
+            # The next attempt belongs to the round after the cut.
+            context[_STARTED_KEY] = time.monotonic()
+        if attempts >= self.max_attempts:
+            return None
+        delay = min(self.max_backoff, 0.5 * 2 ** min(attempts, 10)) * random.uniform(0.5, 1.0)
+        logger.info("Retrying throttled call to %s in %.2f seconds, attempt %s.", self.name, delay, attempts + 1)
+        return delay
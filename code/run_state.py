@@ -0,0 +1,179 @@
+"""
+Purpose
+
+Persistent run-state store for resumable, incremental runs. A local SQLite manifest
+records, for each input file, its upload ETag, transcription job name and status, and
+its export and archive status. A rerun after an interruption skips the work that is
+already done and resumes waiting for jobs that are still in flight.
+"""
+
+import datetime
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Job statuses of jobs that were started but have not finished yet.
+IN_FLIGHT_STATUSES = ('SUBMITTED', 'QUEUED', 'IN_PROGRESS')
+
+
+class RunState:
+    """
+    A thread-safe manifest of the files processed by the pipeline, stored in SQLite.
+    """
+    def __init__(self, db_path=None):
+        """
+        :param db_path: The path of the SQLite database file. When None, the manifest is
+                        kept in memory only and nothing is resumed between runs.
+        """
+        self.db_path = db_path or ':memory:'
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS files ('
+                ' file_name TEXT PRIMARY KEY,'
+                ' file_size INTEGER,'
+                ' file_mtime REAL,'
+                ' upload_etag TEXT,'
+                ' job_name TEXT UNIQUE,'
+                ' job_status TEXT,'
+                ' export_status TEXT,'
+                ' archive_status TEXT,'
+                ' updated_at TEXT)')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS cursors ('
+                ' name TEXT PRIMARY KEY,'
+                ' value TEXT)')
+        logger.info("Opened run state %s.", self.db_path)
+
+    def _upsert(self, file_name, **fields):
+        fields['updated_at'] = datetime.datetime.now().isoformat()
+        columns = ', '.join(fields)
+        placeholders = ', '.join('?' for _ in fields)
+        updates = ', '.join(f'{column} = excluded.{column}' for column in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f'INSERT INTO files (file_name, {columns}) VALUES (?, {placeholders}) '
+                f'ON CONFLICT(file_name) DO UPDATE SET {updates}',
+                (file_name, *fields.values()))
+
+    def _update_by_job(self, job_name, **fields):
+        fields['updated_at'] = datetime.datetime.now().isoformat()
+        assignments = ', '.join(f'{column} = ?' for column in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f'UPDATE files SET {assignments} WHERE job_name = ?',
+                (*fields.values(), job_name))
+
+    def get(self, file_name):
+        """
+        Gets the manifest entry of a file.
+
+        :param file_name: The name of the input file.
+        :return: A dict of the recorded fields, or None when the file is not recorded.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT * FROM files WHERE file_name = ?', (file_name,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def is_uploaded(self, file_name, file_size, file_mtime):
+        """
+        Checks whether a file was uploaded and has not changed since.
+
+        :param file_name: The name of the input file.
+        :param file_size: The current size of the file in bytes.
+        :param file_mtime: The current modification time of the file.
+        :return: True when the same version of the file was already uploaded.
+        """
+        entry = self.get(file_name)
+        return (entry is not None and entry['upload_etag'] is not None
+                and entry['file_size'] == file_size and entry['file_mtime'] == file_mtime)
+
+    def record_upload(self, file_name, file_size, file_mtime, etag):
+        """
+        Records a completed upload. A changed file is uploaded again, so its previous job,
+        export and archive status are cleared.
+        """
+        self._upsert(
+            file_name, file_size=file_size, file_mtime=file_mtime, upload_etag=etag,
+            job_name=None, job_status=None, export_status=None, archive_status=None)
+
+    def get_job_status(self, job_name):
+        """
+        Gets the recorded status of a job.
+
+        :param job_name: The name of the transcription job.
+        :return: The recorded status, or None when no job with this name was started.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT job_status FROM files WHERE job_name = ?', (job_name,)).fetchone()
+        return row['job_status'] if row is not None else None
+
+    def record_job(self, file_name, job_name, job_status='SUBMITTED'):
+        """
+        Records a started transcription job for a file.
+        """
+        self._upsert(file_name, job_name=job_name, job_status=job_status)
+
+    def update_job_status(self, job_name, job_status):
+        """
+        Records the latest status of a transcription job.
+        """
+        self._update_by_job(job_name, job_status=job_status)
+
+    def in_flight_jobs(self):
+        """
+        Lists the jobs that were started but were not seen finishing.
+
+        :return: The list of job names.
+        """
+        placeholders = ', '.join('?' for _ in IN_FLIGHT_STATUSES)
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT job_name FROM files WHERE job_status IN ({placeholders})',
+                IN_FLIGHT_STATUSES).fetchall()
+        return [row['job_name'] for row in rows]
+
+    def record_export(self, job_name, export_status):
+        """
+        Records the export status of the transcript of a job, for example 'exported' or 'empty'.
+        """
+        self._update_by_job(job_name, export_status=export_status)
+
+    def record_archive(self, job_name, archive_status='archived'):
+        """
+        Records that the source audio and transcript of a job were archived.
+        """
+        self._update_by_job(job_name, archive_status=archive_status)
+
+    def get_cursor(self, name):
+        """
+        Gets a persisted cursor, such as the newest job CreationTime seen by a previous run.
+
+        :param name: The name of the cursor.
+        :return: The value of the cursor, or None when it was never set.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value FROM cursors WHERE name = ?', (name,)).fetchone()
+        return row['value'] if row is not None else None
+
+    def set_cursor(self, name, value):
+        """
+        Persists a cursor.
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO cursors (name, value) VALUES (?, ?)', (name, value))
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        with self._lock:
+            self._conn.close()
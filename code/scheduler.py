@@ -0,0 +1,137 @@
+"""
+Purpose
+
+Slot-aware client-side job scheduler. Instead of queuing the whole batch with the service
+through AllowDeferredExecution, where jobs run first in, first out in S3 listing order,
+the scheduler keeps exactly N jobs in flight and decides which file is submitted next:
+
+    longest_first   Largest files first. Long jobs start early, which minimizes the makespan.
+    shortest_first  Smallest files first, which minimizes the mean time to a result.
+    fifo            The order of the input listing.
+"""
+
+from collections import deque
+import logging
+import time
+from botocore.exceptions import BotoCoreError, ClientError
+import transcribe_basics as tb
+from parameters import config
+from rate_limiter import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ('longest_first', 'shortest_first', 'fifo')
+
+
+def order_objects(objects, policy, key=None):
+    """
+    Orders input objects for submission.
+
+    :param objects: A list of (object key, size or duration) tuples in listing order.
+    :param policy: One of 'longest_first', 'shortest_first' or 'fifo'.
+    :param key: A function that returns the ordering weight of an (object key, size)
+                tuple, for example the media duration. Defaults to the object size.
+    :return: The ordered list of (object key, size) tuples.
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown scheduling policy {policy}, expected one of {POLICIES}.")
+    if policy == 'fifo':
+        return list(objects)
+    if key is None:
+        key = lambda item: item[1]
+    return sorted(objects, key=key, reverse=(policy == 'longest_first'))
+
+
+class SlotScheduler:
+    """
+    Submits the objects of the input bucket so that a fixed number of transcription jobs
+    is in flight at any time, starting the next job in policy order as soon as a slot
+    frees up.
+    """
+    def __init__(self, transcribe_and_export, slots=None, policy=None, key=None):
+        """
+        :param transcribe_and_export: The TranscribeAndExport instance that does the work.
+        :param slots: The number of jobs kept in flight. Defaults to 'scheduler_config'.
+        :param policy: The submission order policy. Defaults to 'scheduler_config'.
+        :param key: An optional ordering weight function, see order_objects.
+        """
+        self.ts = transcribe_and_export
+        self.slots = slots or config['scheduler_config']['slots']
+        self.policy = policy or config['scheduler_config']['policy']
+        self.key = key
+
+    def list_objects(self):
+        """
+        Lists the objects of the input bucket that have no job yet, with their media durations
+        when known, otherwise with their sizes.
+        """
+        bucket = self.ts.s3_resource.Bucket(self.ts.bucket_name)
+        objects = []
+        for obj in bucket.objects.filter(Delimiter='/'):
+            if self.ts.run_state.get_job_status(self.ts.get_job_name(obj.key)) is not None:
+                print(f"Skipping transcription job {self.ts.get_job_name(obj.key)}, already started.")
+                continue
+            objects.append((obj.key, obj.size))
+        # Media durations from the pre-flight checks are a better weight than sizes when every file has one.
+        if objects and all(getattr(self.ts.media_info.get(key), 'duration', None) for key, size in objects):
+            objects = [(key, self.ts.media_info[key].duration) for key, size in objects]
+        return objects
+
+    def run(self):
+        """
+        Submits every object and waits until all jobs have finished.
+
+        :return: The lists of COMPLETED and FAILED job summaries.
+        """
+        queue = deque(order_objects(self.list_objects(), self.policy, self.key))
+        self.ts.hash_input_files([object_key for object_key, size in queue])
+        vocabulary_name = self.ts.get_vocabulary_name()
+        rate_limiter = TokenBucket(config['submit_config']['rate_per_second'],
+                                   config['submit_config']['burst'])
+        waiter = tb.TranscribeJobsCompleteWaiter(self.ts.transcribe_client)
+        job_filter = config['aws_transcribe_config']['job_prefix']
+        since = self.ts.get_job_listing_cursor()
+
+        # Jobs an interrupted run was still waiting for take up slots too.
+        in_flight = set(self.ts.run_state.in_flight_jobs())
+        completed_jobs = []
+        failed_jobs = []
+        idle_sweeps = 0
+        print(f"Scheduling {len(queue)} job(s) {self.policy} with {self.slots} slot(s).")
+        while queue or in_flight:
+            while queue and len(in_flight) < self.slots:
+                object_key, size = queue.popleft()
+                try:
+                    job = self.ts.submit_file(object_key, vocabulary_name, rate_limiter)
+                except (ClientError, BotoCoreError) as err:
+                    logger.info(f'Something went wrong with job: {self.ts.get_job_name(object_key)}', exc_info=True)
+                    self.ts.failed_files[object_key] = f'Submit failed: {err}'
+                    continue
+                if job is not None:
+                    in_flight.add(job['TranscriptionJobName'])
+
+            if not in_flight:
+                continue
+            finished = waiter.poll(in_flight, job_filter, since)
+            for job in finished:
+                self.ts.record_finished_job(job)
+                if job['TranscriptionJobStatus'] == 'COMPLETED':
+                    completed_jobs.append(job)
+                else:
+                    failed_jobs.append(job)
+            if finished:
+                idle_sweeps = 0
+                continue
+            idle_sweeps += 1
+            if idle_sweeps >= config['wait_config']['max_tries']:
+                logger.error(
+                    "Stopped waiting for %s job(s) after %s sweeps without progress.",
+                    len(in_flight), idle_sweeps)
+                for job_name in in_flight:
+                    self.ts.failed_files[self.ts.get_object_key(job_name)] = (
+                        f'Job {job_name} did not finish after {idle_sweeps} status sweeps')
+                for object_key, size in queue:
+                    self.ts.failed_files[object_key] = 'Not submitted, the scheduler stopped waiting for free slots'
+                break
+            time.sleep(config['wait_config']['delay'])
+        return completed_jobs, failed_jobs
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+import analytics
+import columnar_store
+
+
+def make_columns(job_name, confidences):
+    count = len(confidences)
+    return columnar_store.TranscriptColumns(
+        job_name=job_name, speakers=['spk_0'],
+        start=np.arange(count, dtype=np.float32), end=np.arange(count, dtype=np.float32) + 0.5,
+        confidence=np.array(confidences, dtype=np.float32),
+        speaker=np.zeros(count, dtype=np.int8),
+        type=np.full(count, columnar_store.ITEM_PRONUNCIATION, dtype=np.int8),
+        word=np.zeros(count, dtype=np.int32), strings=None)
+
+
+@pytest.mark.parametrize('bins', [3, 8, 10, 100])
+def test_histogram_has_a_column_per_bin(bins):
+    confidences = [0.0, 0.2, 0.34, 0.5, 0.66, 0.9, 1.0]
+    metrics = analytics.corpus_metrics([make_columns('job', confidences)], bins)
+
+    names = analytics.histogram_columns(bins)
+    assert len(names) == len(set(names)) == bins
+    assert names[0].startswith('Conf_00_') and names[-1].endswith('_100')
+    assert sum(int(metrics[name][0]) for name in names) == len(confidences)
+
+
+def test_histogram_edges_match_the_bins():
+    assert analytics.histogram_columns(3) == ['Conf_00_33', 'Conf_33_67', 'Conf_67_100']
+    metrics = analytics.corpus_metrics([make_columns('job', [0.1, 0.5, 0.6, 0.9])], 3)
+    assert [int(metrics[name][0]) for name in analytics.histogram_columns(3)] == [1, 2, 1]
+
+
+@pytest.mark.parametrize('bins', [0, 101])
+def test_unsupported_bins_are_rejected(bins):
+    with pytest.raises(ValueError):
+        analytics.corpus_metrics([make_columns('job', [0.5])], bins)
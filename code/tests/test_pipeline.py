@@ -0,0 +1,88 @@
+import threading
+
+import boto3
+from boto3.exceptions import S3UploadFailedError
+from botocore.exceptions import EndpointConnectionError
+
+import transcribe_basics as tb
+
+from instrumentation import Instrumentation
+from parameters import config
+from pipeline import StreamingPipeline
+from run_state import RunState
+
+
+class FailingUploads:
+    """
+    Stands in for TranscribeAndExport in a pipeline whose uploads all fail with an error
+    that is not a ClientError.
+    """
+    def __init__(self):
+        self.transcribe_client = boto3.client(
+            'transcribe', region_name='us-east-1', aws_access_key_id='test', aws_secret_access_key='test')
+        self.instrumentation = Instrumentation(enabled=False)
+        self.run_state = RunState(None)
+        self.failed_files = {}
+        self.input_path = ''
+
+    def create_buckets(self):
+        pass
+
+    def get_transfer_config(self):
+        return None
+
+    def get_vocabulary_name(self):
+        return None
+
+    def get_job_listing_cursor(self):
+        return None
+
+    def advance_job_listing_cursor(self, jobs):
+        pass
+
+    def is_uploaded(self, file):
+        return False
+
+    def upload_file(self, file, transfer_config):
+        raise S3UploadFailedError(f'Failed to upload {file}')
+
+    def get_object_key(self, job_name):
+        return job_name[len('job-'):]
+
+
+def run_pipeline(ts, files):
+    result = {}
+    runner = threading.Thread(target=lambda: result.update(jobs=StreamingPipeline(ts).run(files)), daemon=True)
+    runner.start()
+    runner.join(timeout=30)
+    assert not runner.is_alive(), "The pipeline hung."
+    return result['jobs']
+
+
+def test_failed_uploads_do_not_stop_the_pipeline(monkeypatch):
+    monkeypatch.setitem(config['preflight_config'], 'enabled', False)
+    monkeypatch.setitem(config['pipeline_config'], 'queue_size', 3)
+    monkeypatch.setitem(config['upload_config'], 'max_workers', 2)
+    ts = FailingUploads()
+    files = [f'file-{index}.wav' for index in range(10)]
+
+    assert run_pipeline(ts, files) == ([], [])
+    assert sorted(ts.failed_files) == sorted(files)
+    assert all(reason.startswith('Upload failed') for reason in ts.failed_files.values())
+
+
+def test_unreachable_endpoint_does_not_hang_the_pipeline(monkeypatch):
+    monkeypatch.setitem(config['wait_config'], 'delay', 0.01)
+    monkeypatch.setitem(config['wait_config'], 'max_tries', 3)
+
+    def poll(self, pending, job_filter=None, since=None):
+        raise EndpointConnectionError(endpoint_url='https://transcribe.us-east-1.amazonaws.com')
+
+    monkeypatch.setattr(tb.TranscribeJobsCompleteWaiter, 'poll', poll)
+    ts = FailingUploads()
+    # A job an interrupted run was still waiting for
+    ts.run_state.record_job('resumed.wav', 'job-resumed.wav')
+
+    assert run_pipeline(ts, []) == ([], [])
+    assert list(ts.failed_files) == ['resumed.wav']
+    assert 'did not finish' in ts.failed_files['resumed.wav']
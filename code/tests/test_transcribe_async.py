@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+from botocore.exceptions import ClientError
+
+import transcribe_async
+import transcribe_basics as tb
+
+
+class FakeTranscribe:
+    """
+    Stands in for an aiobotocore Transcribe client. Every job is throttled on its first
+    start, and finishes after it has been looked at a few times.
+    """
+    def __init__(self, page_size=2, sweeps_to_finish=2):
+        self.page_size = page_size
+        self.sweeps_to_finish = sweeps_to_finish
+        self.requests = {}
+        self.jobs = {}
+        self._throttled = set()
+
+    async def start_transcription_job(self, **kwargs):
+        await asyncio.sleep(0)
+        job_name = kwargs['TranscriptionJobName']
+        if job_name not in self._throttled:
+            self._throttled.add(job_name)
+            raise ClientError({'Error': {'Code': 'ThrottlingException'}}, 'StartTranscriptionJob')
+        if job_name in self.jobs:
+            raise ClientError({'Error': {'Code': 'ConflictException'}}, 'StartTranscriptionJob')
+        self.requests[job_name] = kwargs
+        self.jobs[job_name] = {'TranscriptionJobName': job_name, 'TranscriptionJobStatus': 'IN_PROGRESS',
+                               'CreationTime': len(self.jobs), 'Looks': 0}
+        return {'TranscriptionJob': dict(self.jobs[job_name])}
+
+    def _look(self, job):
+        job['Looks'] += 1
+        if job['Looks'] > self.sweeps_to_finish:
+            job['TranscriptionJobStatus'] = 'FAILED' if 'bad' in job['TranscriptionJobName'] else 'COMPLETED'
+        return dict(job)
+
+    async def get_transcription_job(self, TranscriptionJobName):
+        await asyncio.sleep(0)
+        return {'TranscriptionJob': self._look(self.jobs[TranscriptionJobName])}
+
+    async def list_transcription_jobs(self, Status=None, JobNameContains='', MaxResults=None, NextToken=None):
+        await asyncio.sleep(0)
+        jobs = sorted((job for job in self.jobs.values() if JobNameContains in job['TranscriptionJobName']),
+                      key=lambda job: job['CreationTime'], reverse=True)
+        jobs = [job for job in (self._look(job) for job in jobs) if Status in (None, job['TranscriptionJobStatus'])]
+        start = int(NextToken or 0)
+        response = {'TranscriptionJobSummaries': jobs[start:start + self.page_size]}
+        if start + self.page_size < len(jobs):
+            response['NextToken'] = str(start + self.page_size)
+        return response
+
+
+def job_spec(job_name):
+    return {'job_name': job_name, 'media_uri': f's3://input/{job_name}.wav',
+            'media_format': 'wav', 'language_code': 'en-US'}
+
+
+def test_start_jobs_retries_throttled_calls_and_sends_the_sync_arguments():
+    client = FakeTranscribe()
+    names = [f'job-{index}' for index in range(5)]
+
+    started = asyncio.run(transcribe_async.start_jobs(
+        [job_spec(name) for name in names], client, concurrency=2, base_delay=0.001))
+
+    assert sorted(started) == names
+    assert all(job['TranscriptionJobStatus'] == 'IN_PROGRESS' for job in started.values())
+    assert client.requests['job-0'] == tb._job_args('job-0', 's3://input/job-0.wav', 'wav', 'en-US')
+
+
+def test_start_jobs_returns_the_error_of_a_job_that_cannot_start():
+    client = FakeTranscribe()
+
+    async def start_twice():
+        await transcribe_async.start_jobs([job_spec('job-0')], client, base_delay=0.001)
+        return await transcribe_async.start_jobs([job_spec('job-0')], client, base_delay=0.001)
+
+    started = asyncio.run(start_twice())
+
+    assert isinstance(started['job-0'], ClientError)
+    assert started['job-0'].response['Error']['Code'] == 'ConflictException'
+
+
+def test_jobs_complete_waiter_yields_every_job_across_pages():
+    client = FakeTranscribe(page_size=2)
+    names = ['job-0', 'job-1', 'job-bad', 'job-3', 'job-4']
+
+    async def start_and_wait():
+        await transcribe_async.start_jobs([job_spec(name) for name in names], client, base_delay=0.001)
+        waiter = transcribe_async.TranscribeJobsCompleteWaiter(client, delay=0, max_tries=10)
+        return [summary async for summary in waiter.as_completed(names)]
+
+    finished = asyncio.run(start_and_wait())
+
+    assert sorted(job['TranscriptionJobName'] for job in finished) == sorted(names)
+    assert {job['TranscriptionJobName'] for job in finished
+            if job['TranscriptionJobStatus'] == 'FAILED'} == {'job-bad'}
+
+
+def test_complete_waiter_polls_until_the_job_completes():
+    client = FakeTranscribe(sweeps_to_finish=3)
+
+    async def start_and_wait():
+        await transcribe_async.start_jobs([job_spec('job-0')], client, base_delay=0.001)
+        return await transcribe_async.TranscribeCompleteWaiter(client, delay=0, max_tries=5).wait('job-0')
+
+    job = asyncio.run(start_and_wait())
+
+    assert job['TranscriptionJobStatus'] == 'COMPLETED'
+    assert client.jobs['job-0']['Looks'] == 4
+
+
+def test_create_client_against_a_local_endpoint():
+    pytest.importorskip('aiobotocore')
+
+    async def create():
+        async with transcribe_async.create_client(endpoint_url='http://127.0.0.1:5000') as client:
+            return client.meta.endpoint_url
+
+    assert asyncio.run(create()) == 'http://127.0.0.1:5000'
@@ -0,0 +1,404 @@
+"""
+Purpose
+
+asyncio counterpart of transcribe_basics. The functions take an aiobotocore Transcribe
+client instead of a Boto3 client, so a single event loop can keep thousands of
+StartTranscriptionJob, GetTranscriptionJob and ListTranscriptionJobs calls in flight
+without an OS thread per call. Call arguments are built by the same helpers as the
+synchronous functions, so both send identical requests.
+
+aiobotocore is an optional dependency, only needed by create_client. Any client with
+awaitable Transcribe methods can be passed to the other functions, and create_client
+takes an endpoint_url, so everything can run against a local stubbed endpoint such as
+moto_server:
+
+    async with transcribe_async.create_client(endpoint_url='http://127.0.0.1:5000') as client:
+        jobs = await transcribe_async.start_jobs(job_specs, client)
+"""
+
+import asyncio
+import logging
+import os
+import random
+from botocore.exceptions import ClientError, WaiterError
+import transcribe_basics as tb
+import aws_clients
+from parameters import config
+
+logger = logging.getLogger(__name__)
+
+
+def create_client(endpoint_url=None, max_pool_connections=None):
+    """
+    Creates an aiobotocore Transcribe client from the configured credentials, to be used
+    as an async context manager.
+
+    :param endpoint_url: An optional endpoint, for example a local stubbed endpoint.
+    :param max_pool_connections: The size of the connection pool of the client. Defaults
+                                 to the size aws_clients gives the Transcribe client.
+    :return: The client context manager.
+    """
+    try:
+        from aiobotocore.config import AioConfig
+        from aiobotocore.session import get_session
+    except ImportError:
+        raise ImportError("The asyncio engine needs aiobotocore, install it with 'pip install aiobotocore'.") from None
+    return get_session().create_client(
+        'transcribe',
+        aws_access_key_id=config['aws_auth_cred']['aws_access_key_id'],
+        aws_secret_access_key=config['aws_auth_cred']['aws_secret_access_key'],
+        region_name=config['aws_auth_cred']['region'],
+        endpoint_url=endpoint_url,
+        config=AioConfig(
+            max_pool_connections=max_pool_connections or aws_clients.pool_size('transcribe'),
+            retries={'mode': config['client_config']['retry_mode'],
+                     'max_attempts': config['client_config']['max_attempts']}))
+
+
+class TranscribeCompleteWaiter:
+    """
+    Waits for a transcription job to complete by polling GetTranscriptionJob, sleeping on
+    the event loop between attempts.
+    """
+    def __init__(self, client, delay=10, max_tries=60):
+        self.name = 'TranscribeComplete'
+        self.client = client
+        self.delay = delay
+        self.max_tries = max_tries
+
+    async def wait(self, job_name):
+        """
+        Waits until the job is COMPLETED.
+
+        :param job_name: The name of the job.
+        :return: The completed job.
+        """
+        for attempt in range(self.max_tries):
+            job = await get_job(job_name, self.client)
+            status = job['TranscriptionJobStatus']
+            logger.info("Waiter %s got %s for %s.", self.name, status, job_name)
+            if status == 'COMPLETED':
+                return job
+            if status == 'FAILED':
+                raise WaiterError(
+                    name=self.name, reason='Waiter encountered a terminal failure state',
+                    last_response={'TranscriptionJob': job})
+            await asyncio.sleep(self.delay)
+        raise WaiterError(
+            name=self.name, reason='Max attempts exceeded', last_response={'TranscriptionJobName': job_name})
+
+
+class TranscribeJobsCompleteWaiter:
+    """
+    Waits for many transcription jobs together with ListTranscriptionJobs sweeps, like
+    transcribe_basics.TranscribeJobsCompleteWaiter, yielding jobs as they finish.
+    """
+    def __init__(self, client, delay=10, max_tries=60):
+        self.name = 'TranscribeJobsComplete'
+        self.client = client
+        self.delay = delay
+        self.max_tries = max_tries
+
+    async def poll(self, pending, job_filter=None, since=None):
+        """
+        Runs a single status sweep. Finished jobs are removed from the pending set.
+
+        :return: The list of summaries of the jobs that finished.
+        """
+        finished = []
+        for status in ('COMPLETED', 'FAILED'):
+            if not pending:
+                break
+            async for summary in iter_jobs(job_filter, self.client, status=status, since=since, page_size=100):
+                if summary['TranscriptionJobName'] in pending:
+                    pending.discard(summary['TranscriptionJobName'])
+                    finished.append(summary)
+                    if not pending:
+                        break
+        return finished
+
+    async def as_completed(self, job_names, job_filter=None, since=None):
+        """
+        Yields the summary of each job as it reaches COMPLETED or FAILED.
+
+        :param job_names: The names of the jobs to wait for.
+        :param job_filter: Limits each sweep to jobs whose names contain this string.
+                           Defaults to the common prefix of the job names.
+        :param since: Limits each sweep to jobs created at or after this time.
+        :return: An async generator of transcription job summaries.
+        """
+        pending = set(job_names)
+        if job_filter is None:
+            job_filter = os.path.commonprefix(list(pending))
+        for attempt in range(self.max_tries):
+            for summary in await self.poll(pending, job_filter, since):
+                yield summary
+            if not pending:
+                return
+            logger.info(
+                "Waiter %s has %s jobs pending after attempt %s.", self.name, len(pending), attempt + 1)
+            await asyncio.sleep(self.delay)
+        raise WaiterError(
+            name=self.name, reason='Max attempts exceeded',
+            last_response={'PendingJobNames': sorted(pending)})
+
+
+async def start_job(
+        job_name, media_uri, media_format, language_code, transcribe_client,
+        vocabulary_name=None):
+    """
+    Starts a transcription job, see transcribe_basics.start_job.
+
+    :return: Data about the job.
+    """
+    try:
+        response = await transcribe_client.start_transcription_job(
+            **tb._job_args(job_name, media_uri, media_format, language_code, vocabulary_name))
+        job = response['TranscriptionJob']
+        logger.info("Started transcription job %s.", job_name)
+    except ClientError:
+        logger.exception("Couldn't start transcription job %s.", job_name)
+        raise
+    else:
+        return job
+
+
+async def iter_jobs(job_filter, transcribe_client, status=None, since=None, page_size=None):
+    """
+    Lists summaries of the transcription jobs one page at a time, newest first, see
+    transcribe_basics.iter_jobs.
+
+    :return: An async generator of transcription job summaries.
+    """
+    list_args = {}
+    if job_filter:
+        list_args['JobNameContains'] = job_filter
+    if status is not None:
+        list_args['Status'] = status
+    if page_size is not None:
+        list_args['MaxResults'] = page_size
+    try:
+        while True:
+            response = await transcribe_client.list_transcription_jobs(**list_args)
+            for job in response['TranscriptionJobSummaries']:
+                if since is not None and job['CreationTime'] < since:
+                    return
+                yield job
+            next_token = response.get('NextToken')
+            if next_token is None:
+                return
+            list_args['NextToken'] = next_token
+    except ClientError:
+        logger.exception("Couldn't get jobs with filter %s.", job_filter)
+        raise
+
+
+async def list_jobs(job_filter, transcribe_client, status=None, since=None):
+    """
+    Lists summaries of the transcription jobs for the current AWS account.
+
+    :return: The list of retrieved transcription job summaries.
+    """
+    jobs = [job async for job in iter_jobs(job_filter, transcribe_client, status=status, since=since)]
+    logger.info("Got %s jobs with filter %s.", len(jobs), job_filter)
+    return jobs
+
+
+async def get_job(job_name, transcribe_client):
+    """
+    Gets details about a transcription job.
+
+    :return: The retrieved transcription job.
+    """
+    try:
+        response = await transcribe_client.get_transcription_job(TranscriptionJobName=job_name)
+        job = response['TranscriptionJob']
+        logger.info("Got job %s.", job['TranscriptionJobName'])
+    except ClientError:
+        logger.exception("Couldn't get job %s.", job_name)
+        raise
+    else:
+        return job
+
+
+async def delete_job(job_name, transcribe_client):
+    """
+    Deletes a transcription job and its transcript.
+    """
+    try:
+        await transcribe_client.delete_transcription_job(TranscriptionJobName=job_name)
+        logger.info("Deleted job %s.", job_name)
+    except ClientError:
+        logger.exception("Couldn't delete job %s.", job_name)
+        raise
+
+
+async def create_vocabulary(
+        vocabulary_name, language_code, transcribe_client, phrases=None, table_uri=None):
+    """
+    Creates a custom vocabulary, see transcribe_basics.create_vocabulary.
+
+    :return: Information about the newly created vocabulary.
+    """
+    try:
+        response = await transcribe_client.create_vocabulary(
+            **tb._vocabulary_args(vocabulary_name, language_code, phrases, table_uri))
+        logger.info("Created custom vocabulary %s.", response['VocabularyName'])
+    except ClientError:
+        logger.exception("Couldn't create custom vocabulary %s.", vocabulary_name)
+        raise
+    else:
+        return response
+
+
+async def list_vocabularies(vocabulary_filter, transcribe_client):
+    """
+    Lists the custom vocabularies created for this AWS account.
+
+    :return: The list of retrieved vocabularies.
+    """
+    try:
+        list_args = {'NameContains': vocabulary_filter}
+        vocabs = []
+        while True:
+            response = await transcribe_client.list_vocabularies(**list_args)
+            vocabs += response['Vocabularies']
+            if response.get('NextToken') is None:
+                break
+            list_args['NextToken'] = response['NextToken']
+        logger.info("Got %s vocabularies with filter %s.", len(vocabs), vocabulary_filter)
+    except ClientError:
+        logger.exception("Couldn't list vocabularies with filter %s.", vocabulary_filter)
+        raise
+    else:
+        return vocabs
+
+
+async def get_vocabulary(vocabulary_name, transcribe_client):
+    """
+    Gets information about a custom vocabulary.
+
+    :return: Information about the vocabulary.
+    """
+    try:
+        response = await transcribe_client.get_vocabulary(VocabularyName=vocabulary_name)
+        logger.info("Got vocabulary %s.", response['VocabularyName'])
+    except ClientError:
+        logger.exception("Couldn't get vocabulary %s.", vocabulary_name)
+        raise
+    else:
+        return response
+
+
+async def update_vocabulary(
+        vocabulary_name, language_code, transcribe_client, phrases=None, table_uri=None):
+    """
+    Replaces the contents of an existing custom vocabulary.
+    """
+    try:
+        response = await transcribe_client.update_vocabulary(
+            **tb._vocabulary_args(vocabulary_name, language_code, phrases, table_uri))
+        logger.info("Updated custom vocabulary %s.", response['VocabularyName'])
+    except ClientError:
+        logger.exception("Couldn't update custom vocabulary %s.", vocabulary_name)
+        raise
+
+
+async def delete_vocabulary(vocabulary_name, transcribe_client):
+    """
+    Deletes a custom vocabulary.
+    """
+    try:
+        await transcribe_client.delete_vocabulary(VocabularyName=vocabulary_name)
+        logger.info("Deleted vocabulary %s.", vocabulary_name)
+    except ClientError:
+        logger.exception("Couldn't delete vocabulary %s.", vocabulary_name)
+        raise
+
+
+async def _call_with_backoff(func, args, semaphore, max_retries, base_delay):
+    """
+    Awaits a call while holding the semaphore, retrying with exponential backoff and
+    jitter while the call is throttled. The semaphore is released while backing off.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            async with semaphore:
+                return await func(*args)
+        except ClientError as err:
+            if (err.response['Error']['Code'] not in tb.THROTTLING_ERROR_CODES
+                    or attempt == max_retries):
+                raise
+            delay = base_delay * (2 ** attempt) * random.uniform(0.5, 1.0)
+            logger.info("Throttled on %s, retrying in %.2f seconds.", args[0], delay)
+            await asyncio.sleep(delay)
+
+
+async def _run_bulk(func, calls, concurrency, max_retries, base_delay):
+    """
+    Awaits a call for each (key, arguments) pair, with at most concurrency calls in flight.
+
+    :return: A dict of key to the result of the call, or to the ClientError it raised.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    keys = [key for key, args in calls]
+    outcomes = await asyncio.gather(
+        *(_call_with_backoff(func, args, semaphore, max_retries, base_delay) for key, args in calls),
+        return_exceptions=True)
+    results = {}
+    for key, outcome in zip(keys, outcomes):
+        if isinstance(outcome, BaseException) and not isinstance(outcome, ClientError):
+            raise outcome
+        results[key] = outcome
+    failed = sum(1 for result in results.values() if isinstance(result, ClientError))
+    logger.info("Ran %s for %s names, %s failed.", func.__name__, len(keys), failed)
+    return results
+
+
+async def start_jobs(job_specs, transcribe_client, concurrency=50, max_retries=5, base_delay=0.5):
+    """
+    Starts many transcription jobs concurrently on the event loop. Throttled calls are
+    retried with exponential backoff.
+
+    :param job_specs: An iterable of dicts with the job_name, media_uri, media_format,
+                      language_code and optional vocabulary_name of each job.
+    :param transcribe_client: The aiobotocore Transcribe client.
+    :param concurrency: The maximum number of calls in flight.
+    :return: A dict of job name to the started job, or to the ClientError raised for it.
+    """
+    calls = [(spec['job_name'], (spec['job_name'], spec['media_uri'], spec['media_format'],
+                                 spec['language_code'], transcribe_client, spec.get('vocabulary_name')))
+             for spec in job_specs]
+    return await _run_bulk(start_job, calls, concurrency, max_retries, base_delay)
+
+
+async def get_jobs(job_names, transcribe_client, concurrency=50, max_retries=5, base_delay=0.5):
+    """
+    Gets details about many transcription jobs concurrently.
+
+    :return: A dict of job name to the retrieved job, or to the ClientError raised for it.
+    """
+    calls = [(name, (name, transcribe_client)) for name in dict.fromkeys(job_names)]
+    return await _run_bulk(get_job, calls, concurrency, max_retries, base_delay)
+
+
+async def delete_jobs(job_names, transcribe_client, concurrency=50, max_retries=5, base_delay=0.5):
+    """
+    Deletes many transcription jobs concurrently.
+
+    :return: A dict of job name to None when the job was deleted, or to the ClientError
+             raised for it.
+    """
+    calls = [(name, (name, transcribe_client)) for name in dict.fromkeys(job_names)]
+    return await _run_bulk(delete_job, calls, concurrency, max_retries, base_delay)
+
+
+async def get_vocabularies(vocabulary_names, transcribe_client, concurrency=50, max_retries=5, base_delay=0.5):
+    """
+    Gets information about many custom vocabularies concurrently.
+
+    :return: A dict of vocabulary name to information about the vocabulary, or to the
+             ClientError raised for it.
+    """
+    calls = [(name, (name, transcribe_client)) for name in dict.fromkeys(vocabulary_names)]
+    return await _run_bulk(get_vocabulary, calls, concurrency, max_retries, base_delay)
@@ -14,13 +14,16 @@ Lewis Carroll. The original audio source file can be found here:
     https://en.wikisource.org/wiki/File:Jabberwocky.ogg
 """
 
+from concurrent.futures import ThreadPoolExecutor
 import logging
+import os
+import random
 import sys
 import time
-import boto3
-from botocore.exceptions import ClientError
-import requests
+import aws_clients
+from botocore.exceptions import ClientError, WaiterError
 from parameters import config
+from rate_limiter import THROTTLING_ERROR_CODES
 
 sys.path.append('')
 from custom_waiter import CustomWaiter, WaitState
@@ -56,6 +59,134 @@ class VocabularyReadyWaiter(CustomWaiter):
         self._wait(VocabularyName=vocabulary_name)
 
 
+class TranscribeJobsCompleteWaiter(CustomWaiter):
+    """
+    Waits for many transcription jobs together. Instead of one GetTranscriptionJob
+    call per job, each polling attempt sweeps ListTranscriptionJobs for COMPLETED and
+    FAILED jobs, and jobs are yielded as soon as they finish, in the style of
+    concurrent.futures.as_completed.
+    """
+    def __init__(self, client, delay=10, max_tries=60):
+        super().__init__(
+            'TranscribeJobsComplete', 'ListTranscriptionJobs', 'Status',
+            {'COMPLETED': WaitState.SUCCESS, 'FAILED': WaitState.FAILURE},
+            client, delay, max_tries)
+
+    def _build_waiter(self):
+        """
+        Skips the botocore waiter model, the sweeps below poll on their own.
+        """
+
+    def __call__(self, parsed, **kwargs):
+        model = kwargs.get('model')
+        if model is not None and model.name != self.operation:
+            return
+        logger.info(
+            "Waiter %s called %s, got %s %s jobs.", self.name, self.operation,
+            len(parsed.get('TranscriptionJobSummaries', [])), parsed.get('Status'))
+
+    def _sweep(self, status, job_filter, pending, since):
+        """
+        Lists jobs in the given status and yields the summaries of pending jobs.
+        Paging stops as soon as every pending job has been seen.
+        """
+        if not pending:
+            return
+        for summary in iter_jobs(
+                job_filter, self.client, status=status, since=since, page_size=100):
+            if summary['TranscriptionJobName'] in pending:
+                pending.discard(summary['TranscriptionJobName'])
+                yield summary
+                if not pending:
+                    return
+
+    def poll(self, pending, job_filter=None, since=None):
+        """
+        Runs a single status sweep without waiting. Jobs that reached COMPLETED or FAILED
+        are removed from the pending set and their summaries are returned. This lets
+        callers that add jobs while waiting, such as a streaming pipeline, drive the
+        polling loop themselves.
+
+        :param pending: A set of the names of the jobs to check. Finished jobs are removed.
+        :param job_filter: Limits the sweep to jobs whose names contain this string.
+        :param since: Limits the sweep to jobs created at or after this time, so jobs of
+                      earlier runs are not paged through.
+        :return: The list of summaries of the jobs that finished.
+        """
+        finished = []
+        for status in ('COMPLETED', 'FAILED'):
+            finished.extend(self._sweep(status, job_filter, pending, since))
+        return finished
+
+    def as_completed(self, job_names, job_filter=None, since=None):
+        """
+        Yields the summary of each job as it reaches COMPLETED or FAILED.
+
+        :param job_names: The names of the jobs to wait for.
+        :param job_filter: Limits each sweep to jobs whose names contain this string.
+                           Defaults to the common prefix of the job names.
+        :param since: Limits each sweep to jobs created at or after this time.
+        :return: A generator of transcription job summaries.
+        """
+        pending = set(job_names)
+        if job_filter is None:
+            job_filter = os.path.commonprefix(list(pending))
+        event_name = f'after-call.{self.client.meta.service_model.service_name}'
+        self.client.meta.events.register(event_name, self)
+        try:
+            for attempt in range(self.max_tries):
+                yield from self.poll(pending, job_filter, since)
+                if not pending:
+                    return
+                logger.info(
+                    "Waiter %s has %s jobs pending after attempt %s.",
+                    self.name, len(pending), attempt + 1)
+                time.sleep(self.delay)
+            raise WaiterError(
+                name=self.name, reason='Max attempts exceeded',
+                last_response={'PendingJobNames': sorted(pending)})
+        finally:
+            self.client.meta.events.unregister(event_name, self)
+
+
+def _job_args(job_name, media_uri, media_format, language_code, vocabulary_name=None):
+    """
+    Builds the arguments of a StartTranscriptionJob call from the configuration.
+    """
+    job_args = {
+        'TranscriptionJobName': job_name,
+        'Media': {'MediaFileUri': media_uri},
+        'LanguageCode': language_code,
+        }
+
+    if not media_format == "":
+        job_args['MediaFormat'] = media_format
+
+    if config['aws_s3_config']['out_bucket_name'] is not None:
+        job_args['OutputBucketName'] = config['aws_s3_config']['out_bucket_name']
+
+    # Copied, so concurrent callers never share (and mutate) the configured settings.
+    job_args['Settings'] = dict(config['aws_transcribe_config']['Settings'])
+
+    if vocabulary_name is not None:
+        job_args['Settings']['VocabularyName'] = vocabulary_name
+
+    job_args['JobExecutionSettings'] = config['aws_transcribe_config']['JobExecutionSettings']
+    return job_args
+
+
+def _vocabulary_args(vocabulary_name, language_code, phrases=None, table_uri=None):
+    """
+    Builds the arguments of a CreateVocabulary or UpdateVocabulary call.
+    """
+    vocab_args = {'VocabularyName': vocabulary_name, 'LanguageCode': language_code}
+    if phrases is not None:
+        vocab_args['Phrases'] = phrases
+    elif table_uri is not None:
+        vocab_args['VocabularyFileUri'] = table_uri
+    return vocab_args
+
+
 def start_job(
         job_name, media_uri, media_format, language_code, transcribe_client,
         vocabulary_name=None):
@@ -77,25 +208,7 @@ def start_job(
     :return: Data about the job.
     """
     try:
-        job_args = {
-            'TranscriptionJobName': job_name,
-            'Media': {'MediaFileUri': media_uri},
-            'LanguageCode': language_code,            
-            }
-        
-        if not media_format == "":
-            job_args['MediaFormat'] = media_format
-
-        if config['aws_s3_config']['out_bucket_name'] is not None:
-            job_args['OutputBucketName'] = config['aws_s3_config']['out_bucket_name']
-
-        job_args['Settings'] = config['aws_transcribe_config']['Settings']
-
-        if vocabulary_name is not None:
-            job_args['Settings']['VocabularyName'] = vocabulary_name
-
-        job_args['JobExecutionSettings'] = config['aws_transcribe_config']['JobExecutionSettings']        
-
+        job_args = _job_args(job_name, media_uri, media_format, language_code, vocabulary_name)
         response = transcribe_client.start_transcription_job(**job_args)
         job = response['TranscriptionJob']
         logger.info("Started transcription job %s.", job_name)
@@ -106,31 +219,57 @@ def start_job(
         return job
 
 
-def list_jobs(job_filter, transcribe_client):
+def iter_jobs(job_filter, transcribe_client, status=None, since=None, page_size=None):
     """
-    Lists summaries of the transcription jobs for the current AWS account.
+    Lists summaries of the transcription jobs for the current AWS account, one page at
+    a time. Jobs are listed newest first, so when a start time is given, paging stops at
+    the first job created before it and older history is never fetched.
 
-    :param job_filter: The list of returned jobs must contain this string in their
-                       names.
+    :param job_filter: The returned jobs must contain this string in their names.
     :param transcribe_client: The Boto3 Transcribe client.
-    :return: The list of retrieved transcription job summaries.
+    :param status: When given, only jobs in this status are returned. For example,
+                   COMPLETED or FAILED.
+    :param since: When given, only jobs created at or after this time are returned.
+    :param page_size: The maximum number of jobs requested per page.
+    :return: A generator of transcription job summaries.
     """
+    list_args = {}
+    if job_filter:
+        list_args['JobNameContains'] = job_filter
+    if status is not None:
+        list_args['Status'] = status
+    if page_size is not None:
+        list_args['MaxResults'] = page_size
     try:
-        response = transcribe_client.list_transcription_jobs(
-            JobNameContains=job_filter)
-        jobs = response['TranscriptionJobSummaries']
-        next_token = response.get('NextToken')
-        while next_token is not None:
-            response = transcribe_client.list_transcription_jobs(
-                JobNameContains=job_filter, NextToken=next_token)
-            jobs += response['TranscriptionJobSummaries']
+        while True:
+            response = transcribe_client.list_transcription_jobs(**list_args)
+            for job in response['TranscriptionJobSummaries']:
+                if since is not None and job['CreationTime'] < since:
+                    return
+                yield job
             next_token = response.get('NextToken')
-        logger.info("Got %s jobs with filter %s.", len(jobs), job_filter)
+            if next_token is None:
+                return
+            list_args['NextToken'] = next_token
     except ClientError:
         logger.exception("Couldn't get jobs with filter %s.", job_filter)
         raise
-    else:
-        return jobs
+
+
+def list_jobs(job_filter, transcribe_client, status=None, since=None):
+    """
+    Lists summaries of the transcription jobs for the current AWS account.
+
+    :param job_filter: The list of returned jobs must contain this string in their
+                       names.
+    :param transcribe_client: The Boto3 Transcribe client.
+    :param status: When given, only jobs in this status are returned.
+    :param since: When given, only jobs created at or after this time are returned.
+    :return: The list of retrieved transcription job summaries.
+    """
+    jobs = list(iter_jobs(job_filter, transcribe_client, status=status, since=since))
+    logger.info("Got %s jobs with filter %s.", len(jobs), job_filter)
+    return jobs
 
 
 def get_job(job_name, transcribe_client):
@@ -189,11 +328,7 @@ def create_vocabulary(
     :return: Information about the newly created vocabulary.
     """
     try:
-        vocab_args = {'VocabularyName': vocabulary_name, 'LanguageCode': language_code}
-        if phrases is not None:
-            vocab_args['Phrases'] = phrases
-        elif table_uri is not None:
-            vocab_args['VocabularyFileUri'] = table_uri
+        vocab_args = _vocabulary_args(vocabulary_name, language_code, phrases, table_uri)
         response = transcribe_client.create_vocabulary(**vocab_args)
         logger.info("Created custom vocabulary %s.", response['VocabularyName'])
     except ClientError:
@@ -265,11 +400,7 @@ def update_vocabulary(
                       vocabulary.
     """
     try:
-        vocab_args = {'VocabularyName': vocabulary_name, 'LanguageCode': language_code}
-        if phrases is not None:
-            vocab_args['Phrases'] = phrases
-        elif table_uri is not None:
-            vocab_args['VocabularyFileUri'] = table_uri
+        vocab_args = _vocabulary_args(vocabulary_name, language_code, phrases, table_uri)
         response = transcribe_client.update_vocabulary(**vocab_args)
         logger.info(
             "Updated custom vocabulary %s.", response['VocabularyName'])
@@ -293,12 +424,108 @@ def delete_vocabulary(vocabulary_name, transcribe_client):
         raise
 
 
+def _call_with_backoff(func, name, transcribe_client, max_retries, base_delay):
+    """
+    Calls a single-item function, retrying with exponential backoff and jitter while the
+    call is throttled.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return func(name, transcribe_client)
+        except ClientError as err:
+            if (err.response['Error']['Code'] not in THROTTLING_ERROR_CODES
+                    or attempt == max_retries):
+                raise
+            delay = base_delay * (2 ** attempt) * random.uniform(0.5, 1.0)
+            logger.info("Throttled on %s, retrying in %.2f seconds.", name, delay)
+            time.sleep(delay)
+
+
+def _run_bulk(func, names, transcribe_client, max_workers, max_retries, base_delay):
+    """
+    Runs a single-item function for each name with bounded concurrency.
+
+    :return: A dict of name to the result of the function, or to the ClientError it raised.
+    """
+    names = list(dict.fromkeys(names))
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            name: executor.submit(
+                _call_with_backoff, func, name, transcribe_client, max_retries, base_delay)
+            for name in names}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except ClientError as err:
+                results[name] = err
+    failed = sum(1 for result in results.values() if isinstance(result, ClientError))
+    logger.info(
+        "Ran %s for %s names, %s failed.", func.__name__, len(names), failed)
+    return results
+
+
+def get_jobs(job_names, transcribe_client, max_workers=10, max_retries=5, base_delay=0.5):
+    """
+    Gets details about many transcription jobs concurrently. Throttled calls are retried
+    with exponential backoff.
+
+    :param job_names: An iterable of the names of the jobs to retrieve.
+    :param transcribe_client: The Boto3 Transcribe client.
+    :param max_workers: The maximum number of calls in flight.
+    :param max_retries: The number of times a throttled call is retried.
+    :param base_delay: The delay in seconds before the first retry.
+    :return: A dict of job name to the retrieved job, or to the ClientError raised for it.
+    """
+    return _run_bulk(
+        get_job, job_names, transcribe_client, max_workers, max_retries, base_delay)
+
+
+def delete_jobs(job_names, transcribe_client, max_workers=10, max_retries=5, base_delay=0.5):
+    """
+    Deletes many transcription jobs concurrently. Throttled calls are retried with
+    exponential backoff.
+
+    :param job_names: An iterable of the names of the jobs to delete.
+    :param transcribe_client: The Boto3 Transcribe client.
+    :param max_workers: The maximum number of calls in flight.
+    :param max_retries: The number of times a throttled call is retried.
+    :param base_delay: The delay in seconds before the first retry.
+    :return: A dict of job name to None when the job was deleted, or to the ClientError
+             raised for it.
+    """
+    return _run_bulk(
+        delete_job, job_names, transcribe_client, max_workers, max_retries, base_delay)
+
+
+def get_vocabularies(
+        vocabulary_names, transcribe_client, max_workers=10, max_retries=5, base_delay=0.5):
+    """
+    Gets information about many custom vocabularies concurrently. Throttled calls are
+    retried with exponential backoff.
+
+    :param vocabulary_names: An iterable of the names of the vocabularies to retrieve.
+    :param transcribe_client: The Boto3 Transcribe client.
+    :param max_workers: The maximum number of calls in flight.
+    :param max_retries: The number of times a throttled call is retried.
+    :param base_delay: The delay in seconds before the first retry.
+    :return: A dict of vocabulary name to information about the vocabulary, or to the
+             ClientError raised for it.
+    """
+    return _run_bulk(
+        get_vocabulary, vocabulary_names, transcribe_client, max_workers, max_retries,
+        base_delay)
+
+
 def usage_demo():
     """Shows how to use the Amazon Transcribe service."""
+    # Only the demo downloads transcripts over HTTP, so only the demo pays for importing requests.
+    import requests
+
     logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 
-    s3_resource = boto3.resource('s3')
-    transcribe_client = boto3.client('transcribe')
+    s3_resource = aws_clients.get_resource('s3')
+    transcribe_client = aws_clients.get_client('transcribe')
 
     print('-'*88)
     print("Welcome to the Amazon Transcribe demo!")
@@ -381,23 +608,29 @@ def usage_demo():
     print("Getting data for jobs and vocabularies.")
     jabber_jobs = list_jobs('Jabber', transcribe_client)
     print(f"Found {len(jabber_jobs)} jobs:")
-    for job_sum in jabber_jobs:
-        job = get_job(job_sum['TranscriptionJobName'], transcribe_client)
+    jobs = get_jobs(
+        [job_sum['TranscriptionJobName'] for job_sum in jabber_jobs], transcribe_client)
+    for job in jobs.values():
+        if isinstance(job, ClientError):
+            continue
         print(f"\t{job['TranscriptionJobName']}, {job['Media']['MediaFileUri']}, "
               f"{job['Settings'].get('VocabularyName')}")
 
     jabber_vocabs = list_vocabularies('Jabber', transcribe_client)
     print(f"Found {len(jabber_vocabs)} vocabularies:")
-    for vocab_sum in jabber_vocabs:
-        vocab = get_vocabulary(vocab_sum['VocabularyName'], transcribe_client)
+    vocabs = get_vocabularies(
+        [vocab_sum['VocabularyName'] for vocab_sum in jabber_vocabs], transcribe_client)
+    for vocab in vocabs.values():
+        if isinstance(vocab, ClientError):
+            continue
         vocab_content = requests.get(vocab['DownloadUri']).text
         print(f"\t{vocab['VocabularyName']} contents:")
         print(vocab_content)
 
     print('-'*88)
     print("Deleting demo jobs.")
-    for job_name in [job_name_simple, job_name_vocabulary_list, job_name_vocab_table]:
-        delete_job(job_name, transcribe_client)
+    delete_jobs(
+        [job_name_simple, job_name_vocabulary_list, job_name_vocab_table], transcribe_client)
     print("Deleting demo vocabulary.")
     delete_vocabulary(vocabulary_name, transcribe_client)
     print("Deleting demo bucket.")
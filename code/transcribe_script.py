@@ -3,7 +3,8 @@ Purpose
 
 Shows how to use the AWS SDK for Python (Boto3) with the Amazon Transcribe API to
 transcribe an audio file to a text file. Also to export the transription JSON results
-into a meaningful Word docx file using Tscribe module.
+into a meaningful Word docx file using Tscribe module, or the faster native renderer of transcript_render.py
+which can also write plain text, SRT and WebVTT subtitles.
 
 More about Tscribe can be found here: https://pypi.org/project/tscribe/
 
@@ -20,146 +21,538 @@ This example uses a main() function to execute all the following steps in order:
     5. Finally, the resulted JSON files are converted into a more meaningful Word docx file using Tscribe module 
        and both JSON & Docx are exported into the output folder. The successfully completed audio files & resulted 
        JSON are archived into 'Archive' folder. Jobs are deleted as a cleanup process on completion of the whole activity.
+
+Setting config['pipeline_config']['mode'] to 'streaming' runs steps 2, 3 and 5 as a pipeline instead, so each file
+is uploaded, transcribed, exported and archived as soon as its previous step finishes (see pipeline.py).
+
+Running with --watch keeps the script running as a daemon, which runs these steps on micro-batches of the files arriving
+in the input path (see watch() and watcher.py), and drains the files already detected on SIGTERM.
 """
 
 # Importing the all required modules.
+import argparse
 import logging
+import signal
 import sys
 import time
 import datetime
 import os
-import boto3
-from botocore.exceptions import ClientError
-import requests
+from botocore.exceptions import BotoCoreError, ClientError, WaiterError
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import transcribe_basics as tb
+import aws_clients
+from rate_limiter import TokenBucket
+from pipeline import StreamingPipeline
+from transcript_fetch import TranscriptFetcher
+from run_state import RunState
+from transcript_cache import TranscriptCache, hash_files
+from archive import ArchiveError, BulkArchiver
+from scheduler import SlotScheduler
+import chunking
+import media_probe
+import transcript_stream
+from instrumentation import Instrumentation
+import profiling
 from parameters import config
-import tscribe
 import csv
 import json
 import re
+import threading
+import wave
 
 sys.path.append('')
 from custom_waiter import CustomWaiter, WaitState
 
 logger = logging.getLogger(__name__)
 
+
+def render_transcript(json_file_path, save_as_path):
+    """
+    Renders a transcript JSON file as Word docx, and in the other formats of 'export_config', using the renderer
+    selected in 'export_config'. When enabled, the columnar arrays for analytics are written next to the docx.
+    This is a module level function so that it can run in a worker process. Returns the list of paths written.
+    """
+    export_config = config['export_config']
+    save_as_base = os.path.splitext(save_as_path)[0]
+    if export_config['renderer'] == 'native':
+        import transcript_render
+        formats = ['docx'] + [f for f in export_config['formats'] if f != 'docx']
+        paths = transcript_render.render(json_file_path, save_as_base, formats)
+    else:
+        # Tscribe pulls in pandas and matplotlib, so it is only imported by the runs that export with it.
+        import tscribe
+        tscribe.write(json_file_path, format="docx", save_as= save_as_path)
+        paths = [save_as_path]
+    if export_config['columnar']:
+        import columnar_store
+        paths.append(columnar_store.write_columns(json_file_path, save_as_base + columnar_store.COLUMNS_EXTENSION))
+    return paths
+
+
+def timed_render_transcript(json_file_path, save_as_path, profile_path=None):
+    """
+    Runs render_transcript and returns its paths along with the seconds it took, so the render time of worker
+    processes can be reported by the instrumentation. With a profile path, the render is profiled in the worker
+    and the profile result is returned as well, otherwise None.
+    """
+    if profile_path is not None:
+        paths, result = profiling.profile_call(profile_path, render_transcript, json_file_path, save_as_path)
+        return paths, result['seconds'], result
+    start = time.perf_counter()
+    paths = render_transcript(json_file_path, save_as_path)
+    return paths, time.perf_counter() - start, None
+
+
 class TranscribeAndExport():
     """
     This class contains all the requied methods and functionalities for the execution. 
     """
-    def __init__(self):
-        self.s3_resource = boto3.resource('s3', 
-                                    aws_access_key_id = config['aws_auth_cred']['aws_access_key_id'], 
-                                    aws_secret_access_key = config['aws_auth_cred']['aws_secret_access_key'],
-                                    region_name = config['aws_auth_cred']['region'])
-
-        self.transcribe_client = boto3.client('transcribe', 
-                                    aws_access_key_id = config['aws_auth_cred']['aws_access_key_id'], 
-                                    aws_secret_access_key = config['aws_auth_cred']['aws_secret_access_key'],
-                                    region_name = config['aws_auth_cred']['region'])
+    def __init__(self, profile=False):
+        """
+        :param profile: When True, the stages of the run are profiled, see profiling.py. Profiling is also turned on
+                        by 'profiling_config'.
+        """
+        # Shared with every other module, with connection pools sized to the configured workers (see aws_clients.py)
+        self.s3_resource = aws_clients.get_resource('s3')
+        self.transcribe_client = aws_clients.get_client('transcribe')
 
         self.bucket_name = config['aws_s3_config']['bucket_name']
         self.output_bucket_name = config['aws_s3_config']['out_bucket_name']
         self.input_path = config['file_paths']['input_path']
         self.output_path = config['file_paths']['output_path']
+        self.transcript_fetcher = TranscriptFetcher(self.s3_resource.meta.client, self.output_bucket_name, self.output_path)
+        self.run_state = RunState(config['run_state_config']['db_path'] if config['run_state_config']['enabled'] else None)
+        self.transcript_cache = TranscriptCache(self.s3_resource.meta.client, self.output_bucket_name, config['cache_config']['prefix'],
+                                                config['run_state_config']['db_path'] if config['run_state_config']['enabled'] else None)
+        self.content_hashes = {}
+        self.batch_hashes = {}
+        self.duplicates = {}
+        self.cache_hits = []
+        self.cache_lock = threading.Lock()
+        self.media_info = {}
+        self.rejected = {}
+        self.failed_files = {}
+        self.exported = []
+        self.archiver = BulkArchiver(self.s3_resource.meta.client, config['archive_config']['copy_workers'])
+        self.profiler = None
+        if profile or config['profiling_config']['enabled']:
+            self.profiler = profiling.StageProfiler(config['profiling_config']['profiles_path'])
+        self.instrumentation = Instrumentation(config['instrumentation_config']['enabled'], self.profiler)
+        self.instrumentation.attach(self.transcribe_client)
+        self.instrumentation.attach(self.s3_resource.meta.client)
+
+
+    def start_batch(self):
+        """
+        Clears the results of the previous run, so each micro-batch of the watch mode is reported on its own.
+        """
+        self.content_hashes = {}
+        self.batch_hashes = {}
+        self.duplicates = {}
+        self.cache_hits = []
+        self.media_info = {}
+        self.rejected = {}
+        self.failed_files = {}
+        self.exported = []
 
 
-    def rename_files(self, folder_path):
+    def rename_files(self, folder_path, files=None):
         """
-        Renames all the special character's into '-' for each file in a folder. 
+        Renames all the special character's into '-' for each file in a folder, or only for the given files.
+        Returns the new names of the files.
         """
+        renamed = []
         try:
-            for file in os.listdir(folder_path):
+            for file in (os.listdir(folder_path) if files is None else files):
                 file_name, file_extn = os.path.splitext(file)
                 src = folder_path + file
                 converted_file_name = re.sub('[^a-zA-Z0-9\n\.]', '-', file_name)
                 dst = folder_path + converted_file_name + file_extn
                 os.rename(src,dst)
+                renamed.append(converted_file_name + file_extn)
         except Exception:
             logger.exception('Something went wrong in "rename_files"')
+        return renamed
+
+
+    def create_buckets(self):
+        """
+        Create input & output bucket(s) if already not available.
+        """
+        print(f"Creating bucket {self.bucket_name}.")
+        if self.transcribe_client.meta.region_name == 'us-east-1':
+            self.s3_resource.create_bucket(
+            Bucket=self.bucket_name)
+            self.s3_resource.create_bucket(
+            Bucket=self.output_bucket_name)
+        else:    
+            self.s3_resource.create_bucket(
+                Bucket=self.bucket_name,
+                CreateBucketConfiguration={
+                    'LocationConstraint': self.transcribe_client.meta.region_name})
+            self.s3_resource.create_bucket(
+                Bucket=self.output_bucket_name,
+                CreateBucketConfiguration={
+                    'LocationConstraint': self.transcribe_client.meta.region_name})
 
 
-    def upload_files(self):
+    def upload_files(self, files=None):
         """
         Create input & output bucket(s) if already not available and upload the audio files into input bucket. 
+        Only the given files of the input path are uploaded, when given. A file that fails to upload is kept in
+        'self.failed_files' with the reason, and the rest of the batch carries on.
         """
+        # boto3 is already loaded by the clients at this point.
+        from boto3.exceptions import S3UploadFailedError
         try:
             """ Shows how to use the Amazon Transcribe service. """
             logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')        
 
-            bucket = self.s3_resource.Bucket(self.bucket_name)
-            
-            print(f"Creating bucket {self.bucket_name}.")
-            if self.transcribe_client.meta.region_name == 'us-east-1':
-                bucket = self.s3_resource.create_bucket(
-                Bucket=self.bucket_name)
-                self.s3_resource.create_bucket(
-                Bucket=self.output_bucket_name)
-            else:    
-                bucket = self.s3_resource.create_bucket(
-                    Bucket=self.bucket_name,
-                    CreateBucketConfiguration={
-                        'LocationConstraint': self.transcribe_client.meta.region_name})
-                self.s3_resource.create_bucket(
-                    Bucket=self.output_bucket_name,
-                    CreateBucketConfiguration={
-                        'LocationConstraint': self.transcribe_client.meta.region_name})
-
-            files = [f for f in os.listdir(self.input_path)]
-
-            for file in files:
-                media_file_name = self.input_path + file
-                media_object_key = file
-                print(f"Uploading media file {media_file_name}.")
-                bucket.upload_file(media_file_name, media_object_key)
+            self.create_buckets()
+
+            files = [f for f in (os.listdir(self.input_path) if files is None else files)
+                     if os.path.isfile(self.input_path + f) and f not in self.rejected and not self.is_uploaded(f)]
+            transfer_config = self.get_transfer_config()
+            max_workers = config['upload_config']['max_workers']
+
+            total_bytes = 0
+            uploaded = 0
+            upload_start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(self.upload_file, file, transfer_config): file for file in files}
+                for future in as_completed(futures):
+                    try:
+                        file, file_bytes, elapsed = future.result()
+                    except (ClientError, S3UploadFailedError, BotoCoreError, OSError) as err:
+                        logger.exception("Failed to upload %s.", futures[future])
+                        self.failed_files[futures[future]] = f'Upload failed: {err}'
+                        continue
+                    uploaded += 1
+                    total_bytes += file_bytes
+                    print(f"Uploaded {file}: {file_bytes} bytes in {elapsed:.2f}s "
+                          f"({self.throughput(file_bytes, elapsed):.2f} MB/s).")
+            upload_elapsed = time.perf_counter() - upload_start
+            print(f"Uploaded {uploaded} of {len(files)} file(s): {total_bytes} bytes in {upload_elapsed:.2f}s "
+                  f"({self.throughput(total_bytes, upload_elapsed):.2f} MB/s).")
 
         except ClientError:
             logger.exception("Failed to upload files.")
             raise
 
 
+    def get_transfer_config(self):
+        """
+        Builds the multipart transfer configuration used for each uploaded file from 'upload_config'.
+        """
+        from boto3.s3.transfer import TransferConfig
+        mb = 1024 * 1024
+        return TransferConfig(multipart_threshold = config['upload_config']['multipart_threshold_mb'] * mb,
+                              multipart_chunksize = config['upload_config']['multipart_chunksize_mb'] * mb,
+                              max_concurrency = config['upload_config']['max_concurrency'])
+
+
+    def preflight_file(self, file):
+        """
+        Reads the container header of an input file to detect its format, duration, sample rate and channel count,
+        and checks them against the limits in 'preflight_config'. Returns True when the file can be transcribed.
+        Rejected files are kept in 'self.rejected' with the reason, and are not uploaded.
+        """
+        preflight_config = config['preflight_config']
+        try:
+            media_info = media_probe.probe(self.input_path + file)
+            reason = media_probe.validate(media_info,
+                                          max_duration = preflight_config['max_duration_seconds'],
+                                          max_size = preflight_config['max_size_bytes'],
+                                          min_sample_rate = preflight_config['min_sample_rate'])
+        except (media_probe.MediaProbeError, OSError) as err:
+            reason = str(err)
+        if reason is not None:
+            print(f"Rejecting media file {file}: {reason}.")
+            self.rejected[file] = reason
+            return False
+        self.media_info[file] = media_info
+        return True
+
+
+    def preflight_files(self, files=None):
+        """
+        Runs the pre-flight checks on every file of the input path, or on the given files, so unsupported or corrupt
+        files are rejected before any upload bandwidth or job slot is spent on them.
+        """
+        for file in (os.listdir(self.input_path) if files is None else files):
+            if os.path.isfile(self.input_path + file):
+                self.preflight_file(file)
+        print(f"Pre-flight accepted {len(self.media_info)} file(s) and rejected {len(self.rejected)}.")
+
+
+    def is_uploaded(self, file):
+        """
+        Checks the run state for a previous upload of the same version of a file in the input path.
+        """
+        file_stat = os.stat(self.input_path + file)
+        if self.run_state.is_uploaded(file, file_stat.st_size, file_stat.st_mtime):
+            print(f"Skipping media file {file}, already uploaded.")
+            return True
+        return False
+
+
+    def upload_file(self, file, transfer_config):
+        """
+        Uploads a single audio file from the input path into the input bucket and returns
+        the file name, the number of bytes uploaded and the elapsed seconds.
+        """
+        media_file_name = self.input_path + file
+        media_object_key = file
+        print(f"Uploading media file {media_file_name}.")
+        start = time.perf_counter()
+        # The low-level client is thread safe, unlike the Bucket resource.
+        self.s3_resource.meta.client.upload_file(media_file_name, self.bucket_name, media_object_key,
+                                                 Config=transfer_config)
+        elapsed = time.perf_counter() - start
+        file_stat = os.stat(media_file_name)
+        etag = self.s3_resource.meta.client.head_object(Bucket=self.bucket_name, Key=media_object_key)['ETag']
+        self.run_state.record_upload(file, file_stat.st_size, file_stat.st_mtime, etag)
+        return file, file_stat.st_size, elapsed
+
+
+    @staticmethod
+    def throughput(num_bytes, seconds):
+        """
+        Returns the throughput in MB/s for the given number of bytes and elapsed seconds.
+        """
+        if seconds <= 0:
+            return 0.0
+        return num_bytes / (1024 * 1024) / seconds
+
+
+    def get_vocabulary_name(self):
+        """
+        Returns the prefixed custom vocabulary name, creating the vocabulary and waiting for
+        it to be ready if it does not exist yet. Returns None when no vocabulary is configured.
+        """
+        if config['aws_transcribe_config']['vocabulary_name'] is None:
+            return None
+
+        vocabulary_name = config['aws_transcribe_config']['job_prefix'] + '-' + config['aws_transcribe_config']['vocabulary_name']
+        try:
+            self.transcribe_client.get_vocabulary(VocabularyName=vocabulary_name)
+        except ClientError:
+            print('-'*88)
+            print("Creating a custom vocabulary that lists the nonsense words to try to "
+                "improve the transcription.")
+            logger.info("Couldn't find vocabulary %s. Therefore, creating a new one.", vocabulary_name)
+            tb.create_vocabulary(
+                vocabulary_name, 'en-US', self.transcribe_client,
+                phrases = config['aws_transcribe_config']['phrases'],
+                )
+            vocabulary_ready_waiter = tb.VocabularyReadyWaiter(self.transcribe_client)
+            vocabulary_ready_waiter.wait(vocabulary_name)
+        return vocabulary_name
+
+
+    def get_job_name(self, object_key):
+        """
+        Returns the transcription job name for an object of the input bucket.
+        """
+        return config['aws_transcribe_config']['job_prefix'] + '-' + f'{object_key}'
+
+
+    def start_file_job(self, object_key, vocabulary_name, rate_limiter):
+        """
+        Starts the transcription job for a single object of the input bucket, once the rate
+        limiter allows another StartTranscriptionJob call.
+        """
+        job_name = self.get_job_name(object_key)
+        rate_limiter.acquire()
+        print(f"Starting transcription job {job_name}.")
+        media_format = config['aws_transcribe_config']['media_format']
+        if object_key in self.media_info:
+            media_format = self.media_info[object_key].format
+        job = tb.start_job(
+            job_name, f's3://{self.bucket_name}/{object_key}', media_format, 'en-US',
+            self.transcribe_client, vocabulary_name)
+        self.run_state.record_job(object_key, job_name, job.get('TranscriptionJobStatus', 'SUBMITTED'))
+        return job
+
+
+    def get_object_key(self, job_name):
+        """
+        Returns the input bucket object key a transcription job was started for.
+        """
+        prefix = config['aws_transcribe_config']['job_prefix'] + '-'
+        return job_name[len(prefix):] if job_name.startswith(prefix) else job_name
+
+
+    def get_job_listing_cursor(self):
+        """
+        Returns the CreationTime that job listings of this run start from, so jobs of earlier runs are not paged
+        through. This is the newest job seen by the last run that finished all its jobs, or None to list everything.
+        """
+        cursor = self.run_state.get_cursor('job_creation_time')
+        return datetime.datetime.fromisoformat(cursor) if cursor else None
+
+
+    def advance_job_listing_cursor(self, jobs):
+        """
+        Persists the newest CreationTime of the given finished jobs as the job listing cursor. The cursor only moves
+        once no job is in flight, so the jobs an interrupted run was waiting for are always listed again.
+        """
+        if self.run_state.in_flight_jobs():
+            return
+        creation_times = [job['CreationTime'] for job in jobs if job.get('CreationTime')]
+        cursor = self.get_job_listing_cursor()
+        if cursor is not None:
+            creation_times.append(cursor)
+        if len(creation_times) > 0:
+            self.run_state.set_cursor('job_creation_time', max(creation_times).isoformat())
+
+
+    def hash_input_files(self, object_keys):
+        """
+        Hashes the local copies of the given input objects in parallel for the transcript cache.
+        """
+        if not config['cache_config']['enabled']:
+            return
+        file_paths = {key: self.input_path + key for key in object_keys
+                      if key not in self.content_hashes and os.path.isfile(self.input_path + key)}
+        self.content_hashes.update(hash_files(file_paths, config['cache_config']['hash_workers']))
+
+
+    def submit_file(self, object_key, vocabulary_name, rate_limiter):
+        """
+        Starts the transcription job for an input object unless its audio was transcribed before.
+        A cached transcript is reused, and a copy of audio already being transcribed in this run
+        waits for that job instead. Returns the started job, or None when no job was started.
+        """
+        content_hash = self.content_hashes.get(object_key)
+        if content_hash is not None:
+            if self.reuse_cached_transcript(object_key, content_hash):
+                return None
+            with self.cache_lock:
+                if content_hash in self.batch_hashes:
+                    print(f"Waiting for {self.batch_hashes[content_hash]} to transcribe the duplicate {object_key}.")
+                    self.duplicates.setdefault(content_hash, []).append(object_key)
+                    return None
+                self.batch_hashes[content_hash] = object_key
+        return self.start_file_job(object_key, vocabulary_name, rate_limiter)
+
+
+    def reuse_cached_transcript(self, object_key, content_hash, cached_key=None):
+        """
+        Copies the cached transcript of the same audio to the key the job for this object would have
+        written, and records the cache hit. Returns True on a cache hit.
+        """
+        if cached_key is None:
+            cached_key = self.transcript_cache.lookup(content_hash)
+        if cached_key is None:
+            return False
+        job_name = self.get_job_name(object_key)
+        self.transcript_cache.restore(cached_key, job_name + '.json')
+        self.run_state.record_job(object_key, job_name, 'CACHED')
+        with self.cache_lock:
+            self.cache_hits.append({'TranscriptionJobName': job_name,
+                                    'SourceFile': object_key,
+                                    'ContentHash': content_hash,
+                                    'CachedTranscript': cached_key})
+        print(f"Reusing cached transcript {cached_key} for {object_key}.")
+        return True
+
+
+    def cache_transcript(self, job):
+        """
+        Stores the transcript of a COMPLETED job in the transcript cache and hands it to the
+        duplicates of its audio that were waiting for it. Returns the job names of those duplicates.
+        """
+        content_hash = self.content_hashes.get(self.get_object_key(job['TranscriptionJobName']))
+        if content_hash is None:
+            return []
+        self.transcript_cache.store(content_hash, job['TranscriptionJobName'] + '.json')
+        with self.cache_lock:
+            duplicates = self.duplicates.pop(content_hash, [])
+        for object_key in duplicates:
+            self.reuse_cached_transcript(object_key, content_hash, self.transcript_cache.cache_key(content_hash))
+        return [self.get_job_name(object_key) for object_key in duplicates]
+
+
+    def fail_duplicates(self, job):
+        """
+        Reports the duplicates of the audio of a FAILED job, that were waiting for it, as failed input files. Later
+        copies of the same audio in this run start their own job.
+        """
+        content_hash = self.content_hashes.get(self.get_object_key(job['TranscriptionJobName']))
+        if content_hash is None:
+            return
+        with self.cache_lock:
+            duplicates = self.duplicates.pop(content_hash, [])
+            self.batch_hashes.pop(content_hash, None)
+        for object_key in duplicates:
+            print(f"Duplicate {object_key} failed along with {job['TranscriptionJobName']}.")
+            self.failed_files[object_key] = (f"Duplicate of {job['TranscriptionJobName']}, which FAILED: "
+                                             f"{job.get('FailureReason')}")
+
+
+    def record_finished_job(self, job):
+        """
+        Records a job that reached COMPLETED or FAILED in the run state and, when it completed, stores its
+        transcript in the transcript cache. Returns the job names of the duplicates that reuse the transcript.
+        The duplicates of a FAILED job are reported as failed.
+        """
+        print(f"Job {job['TranscriptionJobName']} is {job['TranscriptionJobStatus']}.")
+        self.instrumentation.record_job(job)
+        self.run_state.update_job_status(job['TranscriptionJobName'], job['TranscriptionJobStatus'])
+        if job['TranscriptionJobStatus'] != 'COMPLETED':
+            self.fail_duplicates(job)
+            return []
+        try:
+            return self.cache_transcript(job)
+        except ClientError:
+            logger.exception(f"Couldn't cache the transcript of {job['TranscriptionJobName']}.")
+            return []
+
+
     def transcribe_files(self):
         """
         Transcribe all the audio files from the input bucket concurrently and save the 
         resulted JSON into the output bucket. A custom vocabulary is also created to
         improve the transcrition result.
+
+        Jobs are started on a bounded thread pool and rate limited with a token bucket
+        matched to the StartTranscriptionJob quota, configured in 'submit_config'.
+        Returns a dict of job name to a Future that resolves to the started job, or to None
+        when the transcript is reused from the transcript cache instead.
         """
         try:
             """ Shows how to use the Amazon Transcribe service. """
             logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 
             bucket = self.s3_resource.Bucket(self.bucket_name) 
+            vocabulary_name = self.get_vocabulary_name()
+            rate_limiter = TokenBucket(config['submit_config']['rate_per_second'],
+                                       config['submit_config']['burst'])
 
+            object_keys = []
             for file in bucket.objects.filter(Delimiter='/'):
-                try:
-                    print('-'*88)
-                    print("Creating a custom vocabulary that lists the nonsense words to try to "
-                        "improve the transcription.")
-                    if config['aws_transcribe_config']['vocabulary_name'] is not None:
-                        vocabulary_name = config['aws_transcribe_config']['job_prefix'] + '-' + config['aws_transcribe_config']['vocabulary_name']
-
-                        try:
-                            self.transcribe_client.get_vocabulary(VocabularyName=vocabulary_name)
-                        except ClientError:
-                            logger.info("Couldn't find vocabulary %s. Therefore, creating a new one.", vocabulary_name)                
-                            tb.create_vocabulary(
-                                vocabulary_name, 'en-US', self.transcribe_client,
-                                phrases = config['aws_transcribe_config']['phrases'],
-                                )
-                            vocabulary_ready_waiter = tb.VocabularyReadyWaiter(self.transcribe_client)
-                            vocabulary_ready_waiter.wait(vocabulary_name)
-                    else:
-                        vocabulary_name = None
-
-                    job_name = config['aws_transcribe_config']['job_prefix'] + '-' + f'{file.key}'
-                    print(f"Starting transcription job {job_name}.")
-                    media_format = config['aws_transcribe_config']['media_format']
-                    tb.start_job(
-                        job_name, f's3://{self.bucket_name}/{file.key}', media_format, 'en-US',
-                        self.transcribe_client, vocabulary_name)
-                except:
-                    logger.info(f'Something went wrong with job: {job_name}', exc_info=True)
+                job_name = self.get_job_name(file.key)
+                if self.run_state.get_job_status(job_name) is not None:
+                    print(f"Skipping transcription job {job_name}, already started.")
                     continue
+                object_keys.append(file.key)
+            self.hash_input_files(object_keys)
+
+            handles = {}
+            submit_start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=config['submit_config']['max_workers']) as executor:
+                for object_key in object_keys:
+                    handles[self.get_job_name(object_key)] = executor.submit(self.submit_file, object_key, vocabulary_name, rate_limiter)
+
+            failed = 0
+            for job_name, future in handles.items():
+                if future.exception() is not None:
+                    failed += 1
+                    logger.info(f'Something went wrong with job: {job_name}', exc_info=future.exception())
+            print(f"Submitted {len(handles) - failed} of {len(handles)} job(s) in "
+                  f"{time.perf_counter() - submit_start:.2f}s.")
+            return handles
         except ClientError:
             logger.exception("Failed to transcribe jobs.")
             raise
@@ -167,51 +560,283 @@ class TranscribeAndExport():
 
     def export_files(self):
         """
-        Export all the resulted JSON file(s) as Word docx using Tscribe and archive the source files in 'Archive' folder. 
+        Export all the resulted JSON file(s) as Word docx using the configured renderer and archive the source files in 'Archive' folder. 
+
+        Transcripts are downloaded and archived on a thread pool, while the CPU bound docx rendering runs on a
+        process pool, both sized from 'export_config'. Returns a dict of object key to its result: 'exported',
+        'empty', or the exception raised for that object, so one bad transcript does not stop the batch.
         """
         try:
             logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 
             bucket = self.s3_resource.Bucket(self.output_bucket_name)
             archive_path = config['file_paths']['archive_path']
+            object_keys = [obj.key for obj in bucket.objects.filter(Delimiter='/') if os.path.splitext(obj.key)[1] == '.json']
 
-            for obj in bucket.objects.filter(Delimiter='/'):
-                obj_name, obj_extn = os.path.splitext(obj.key)
-                if obj_extn == '.json':
-                    self.s3_resource.meta.client.download_file(self.output_bucket_name, obj.key, os.path.join(self.output_path, obj.key))
-                    file_content = obj.get()['Body'].read().decode('utf-8')
-                    json_content = json.loads(file_content)
-                    if json_content['results']['transcripts'][0]['transcript'] != "" :
-                        json_file_path = os.path.join(self.output_path, obj.key)
-                        save_as_path = os.path.join(self.output_path, obj_name +'.docx')
-                        tscribe.write(json_file_path, format="docx", save_as= save_as_path)
-                        self.archive_object(archive_path, '', '', obj.key)
+            # Process pools pull in multiprocessing, which only the batch export needs.
+            from concurrent.futures import ProcessPoolExecutor
+            results = {}
+            with ThreadPoolExecutor(max_workers=config['export_config']['download_workers']) as io_pool, \
+                    ProcessPoolExecutor(max_workers=config['export_config']['render_workers']) as render_pool:
+                downloads = {io_pool.submit(self.download_transcript, key): key for key in object_keys}
+                renders = {}
+                for future in as_completed(downloads):
+                    key = downloads[future]
+                    try:
+                        json_file_path = future.result()
+                    except Exception as err:
+                        logger.info(f'Something went wrong downloading: {key}', exc_info=True)
+                        results[key] = err
+                        continue
+                    if json_file_path is None:
+                        results[key] = 'empty'
+                        self.run_state.record_export(os.path.splitext(key)[0], 'empty')
+                        continue
+                    renders[render_pool.submit(timed_render_transcript, json_file_path, self.get_docx_path(key),
+                                               self.get_render_profile_path(key))] = key
+
+                rendered = []
+                for future in as_completed(renders):
+                    key = renders[future]
+                    try:
+                        paths, seconds, profile_result = future.result()
+                    except Exception as err:
+                        logger.info(f'Something went wrong exporting: {key}', exc_info=True)
+                        results[key] = err
+                        continue
+                    self.run_state.record_export(os.path.splitext(key)[0], 'exported')
+                    self.exported.append(key)
+                    self.instrumentation.observe('render', seconds)
+                    if profile_result is not None:
+                        self.profiler.record('render', profile_result)
+                    rendered.append(key)
+
+            with self.instrumentation.stage('archive'):
+                archive_failures = self.archive_objects(archive_path, rendered)
+            for key in rendered:
+                if key in archive_failures:
+                    results[key] = ArchiveError('; '.join(archive_failures[key]))
+                else:
+                    results[key] = 'exported'
+                    self.run_state.record_archive(os.path.splitext(key)[0])
+
+            exported = sum(1 for result in results.values() if result == 'exported')
+            print(f"Exported {exported} of {len(object_keys)} transcript(s), "
+                  f"{len(object_keys) - exported - list(results.values()).count('empty')} failed.")
+            return results
                         
         except ClientError:
             logger.exception("Failed to export files.")
             raise
 
 
+    def get_docx_path(self, object_key):
+        """
+        Returns the local path of the Word docx exported for a resulted JSON object.
+        """
+        obj_name, obj_extn = os.path.splitext(object_key)
+        return os.path.join(self.output_path, obj_name +'.docx')
+
+
+    def get_render_profile_path(self, object_key):
+        """
+        Returns the path of the profile of the render of a resulted JSON object, or None when profiling is off.
+        """
+        if self.profiler is None:
+            return None
+        return os.path.join(self.profiler.profiles_path, 'render-' + os.path.splitext(object_key)[0] + '.prof')
+
+
+    def download_transcript(self, object_key):
+        """
+        Fetches a resulted JSON object into the output path, once and only when the local copy is stale. Returns the local file path,
+        or None when the transcript is empty. The transcript is streamed, so only its first word is read to tell whether it is empty.
+        """
+        start = time.perf_counter()
+        transcript = self.transcript_fetcher.fetch(object_key)
+        self.instrumentation.observe('download', time.perf_counter() - start)
+        if transcript_stream.is_empty(transcript.path):
+            return None
+        return transcript.path
+
+
+    def export_object(self, object_key, archive_path):
+        """
+        Export a single resulted JSON object as Word docx using the configured renderer and archive it along with its source audio.
+        Returns True when the transcript was exported, or False when the transcript is empty. Raises ArchiveError
+        when the exported transcript could not be archived.
+        """
+        job_name = os.path.splitext(object_key)[0]
+        json_file_path = self.download_transcript(object_key)
+        if json_file_path is None:
+            self.run_state.record_export(job_name, 'empty')
+            return False
+        # Renders of the streaming pipeline share the process with other threads, so they are profiled as part of the pipeline stage.
+        paths, seconds, profile_result = timed_render_transcript(json_file_path, self.get_docx_path(object_key))
+        self.instrumentation.observe('render', seconds)
+        self.run_state.record_export(job_name, 'exported')
+        self.exported.append(object_key)
+        with self.instrumentation.stage('archive'):
+            archive_failures = self.archive_object(archive_path, '', '', object_key)
+        if archive_failures:
+            raise ArchiveError('; '.join(archive_failures))
+        self.run_state.record_archive(job_name)
+        return True
+
+
+    def get_split_manifest_path(self, file_name):
+        """
+        Returns the path of the manifest written when a long recording is split into segments.
+        """
+        return os.path.join(config['chunking_config']['originals_path'], file_name + '.segments.json')
+
+
+    def split_long_recordings(self, files=None):
+        """
+        Splits the WAV/PCM recordings of the input path, or the given files, that are longer than 'chunking_config'
+        into overlapping segments, so each segment is transcribed by its own job in parallel. The original recording
+        is moved into the originals path along with a manifest of its segments.
+        Returns the names of the files to transcribe, with each split recording replaced by its segments.
+        """
+        chunking_config = config['chunking_config']
+        os.makedirs(chunking_config['originals_path'], exist_ok=True)
+        remaining = []
+        for file in (os.listdir(self.input_path) if files is None else files):
+            file_path = self.input_path + file
+            remaining.append(file)
+            if os.path.splitext(file)[1].lower() != '.wav' or not os.path.isfile(file_path):
+                continue
+            try:
+                duration = chunking.get_wav_duration(file_path)
+            except (wave.Error, EOFError):
+                logger.info(f'Not splitting {file}, it is not a WAV/PCM file.', exc_info=True)
+                continue
+            if duration < chunking_config['min_duration_seconds']:
+                continue
+
+            segments = chunking.split_wav(file_path, self.input_path, chunking_config['segment_seconds'],
+                                          chunking_config['overlap_seconds'])
+            with open(self.get_split_manifest_path(file), 'w') as manifest_file:
+                json.dump({'file_name': file,
+                           'duration': duration,
+                           'overlap_seconds': chunking_config['overlap_seconds'],
+                           'segments': [{'file_name': name, 'offset': offset} for name, offset in segments],
+                           'stitched': False}, manifest_file)
+            os.replace(file_path, os.path.join(chunking_config['originals_path'], file))
+            remaining[-1:] = [name for name, offset in segments]
+            print(f"Split {file} ({duration:.0f}s) into {len(segments)} segment(s).")
+        return remaining
+
+
+    def stitch_segments(self):
+        """
+        Merges the segment transcripts of each split recording into one transcript, once every segment transcript
+        is in the output bucket. The merged transcript is written where a job for the whole recording would have
+        written it, so it is exported like any other transcript, the segments are archived, and the local segment
+        files written by split_long_recordings are deleted.
+        """
+        originals_path = config['chunking_config']['originals_path']
+        if not os.path.isdir(originals_path):
+            return
+        for manifest_name in os.listdir(originals_path):
+            if not manifest_name.endswith('.segments.json'):
+                continue
+            manifest_path = os.path.join(originals_path, manifest_name)
+            with open(manifest_path, 'r') as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest['stitched']:
+                continue
+
+            segment_keys = [self.get_job_name(segment['file_name']) + '.json' for segment in manifest['segments']]
+            try:
+                transcripts = [self.transcript_fetcher.fetch(key, parse=True).content for key in segment_keys]
+            except ClientError:
+                logger.info(f"Not stitching {manifest['file_name']} yet, some segment transcripts are missing.")
+                continue
+
+            merged_key = self.get_job_name(manifest['file_name']) + '.json'
+            merged = chunking.merge_transcripts(
+                os.path.splitext(merged_key)[0],
+                [(segment['offset'], transcript) for segment, transcript in zip(manifest['segments'], transcripts)],
+                manifest['overlap_seconds'])
+            self.s3_resource.meta.client.put_object(Bucket=self.output_bucket_name, Key=merged_key,
+                                                    Body=json.dumps(merged).encode('utf-8'))
+            archive_failures = self.archive_objects(config['file_paths']['archive_path'], segment_keys)
+            if archive_failures:
+                logger.warning(f"Couldn't archive the segments of {manifest['file_name']}: {archive_failures}")
+
+            manifest['stitched'] = True
+            with open(manifest_path, 'w') as manifest_file:
+                json.dump(manifest, manifest_file)
+            for segment in manifest['segments']:
+                try:
+                    os.remove(os.path.join(self.input_path, segment['file_name']))
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    logger.warning(f"Couldn't delete the segment {segment['file_name']}.", exc_info=True)
+            print(f"Stitched {len(segment_keys)} segment transcript(s) into {merged_key}.")
+
+
     def archive_object(self, archive_path = '', input_obj_path = '', output_obj_path = '', object_name = ''):
         """
         Archive the source audio & resulted JSON object into the provided archive path. 
+        Returns the list of failures, empty when both objects were archived.
         """
-        obj_name, obj_extn = os.path.splitext(object_name)
-        if obj_extn == '.json':
-            try:
-                input_obj_name = obj_name.lstrip(config['aws_transcribe_config']['job_prefix'] + '-')
-                self.s3_resource.Object(self.bucket_name, archive_path +'/'+ input_obj_name).copy_from(CopySource=self.bucket_name +'/' + input_obj_path + input_obj_name)
-                self.s3_resource.Object(self.bucket_name, input_obj_path + input_obj_name).delete()
-            except ClientError as e:
-                if(e.response['Error']['Code']) == 'NoSuchKey':                
-                    print(f'Object {input_obj_path + input_obj_name} not found.')                        
+        return self.archive_objects(archive_path, [object_name], input_obj_path, output_obj_path).get(object_name, [])
+
+
+    def archive_objects(self, archive_path = '', object_names = (), input_obj_path = '', output_obj_path = ''):
+        """
+        Archive the source audio & resulted JSON objects of many transcripts into the provided archive path, with
+        concurrent server-side copies and batched deletes. Returns a dict of JSON object name to its list of failures,
+        for the transcripts that were not fully archived.
+        """
+        moves = {}
+        for object_name in object_names:
+            obj_name, obj_extn = os.path.splitext(object_name)
+            if obj_extn == '.json':
+                input_obj_name = self.get_object_key(obj_name)
+                # The audio of a split recording was uploaded as segments, archived when they were stitched.
+                if not os.path.exists(self.get_split_manifest_path(input_obj_name)):
+                    moves[(self.bucket_name, input_obj_path + input_obj_name)] = (object_name, archive_path +'/'+ input_obj_name)
+                moves[(self.output_bucket_name, output_obj_path + object_name)] = (object_name, archive_path +'/'+ object_name)
 
+        results = self.archiver.move((bucket_name, source_key, dest_key)
+                                     for (bucket_name, source_key), (object_name, dest_key) in moves.items())
+        failures = {}
+        for (bucket_name, source_key), error in results.items():
+            if error is not None:
+                failures.setdefault(moves[(bucket_name, source_key)][0], []).append(f'{bucket_name}/{source_key}: {error}')
+        return failures
+
+
+    def analytics_report(self, object_keys=None):
+        """
+        Computes per-speaker talk time, words per minute, confidence histograms and the silence ratio of every transcript
+        exported in this run, in one vectorized pass over their columnar arrays (see analytics.py). The table is written
+        into the output path as 'analytics_xxxxxx.csv' and as a columnar 'analytics_xxxxxx.npz'.
+        Transcripts exported without columnar arrays get them written from their local JSON first.
+        """
+        # NumPy is only imported by the runs that export and analyse transcripts.
+        import analytics
+        import columnar_store
+        transcripts = []
+        for object_key in (self.exported if object_keys is None else object_keys):
+            base = os.path.splitext(self.get_docx_path(object_key))[0]
+            columns_path = base + columnar_store.COLUMNS_EXTENSION
             try:
-                self.s3_resource.Object(self.output_bucket_name, archive_path +'/'+ object_name).copy_from(CopySource=self.output_bucket_name +'/' + output_obj_path + object_name)
-                self.s3_resource.Object(self.output_bucket_name, output_obj_path + object_name).delete()
-            except ClientError as e:
-                if(e.response['Error']['Code']) == 'NoSuchKey':                
-                    print(f'Object {output_obj_path + object_name} not found.')
+                if not os.path.isdir(columns_path):
+                    columnar_store.write_columns(os.path.join(self.output_path, object_key), columns_path)
+                transcripts.append(columnar_store.load_columns(columns_path))
+            except (OSError, ValueError):
+                logger.info(f'Skipping analytics of {object_key}, its transcript could not be read.', exc_info=True)
+        if not transcripts:
+            return None
+        metrics = analytics.corpus_metrics(transcripts, config['analytics_config']['confidence_bins'])
+        paths = analytics.write_report(metrics, os.path.join(self.output_path, f'analytics_{time.time_ns()}'))
+        print(f"Wrote analytics of {len(transcripts)} transcript(s) to {paths[0]}.")
+        return paths
 
 
     def validate_field(self, field):
@@ -230,7 +855,9 @@ class TranscribeAndExport():
 
     def job_summary(self, job_list, job_status):
         """
-        Creates a job summary report for all COMPLETED and FAILED jobs. 
+        Creates a job summary report for all COMPLETED and FAILED jobs, for the transcripts reused from the cache (CACHED),
+        for the input files rejected by the pre-flight checks (REJECTED) and for the input files that failed before their
+        job finished, for example on upload (FAILED_FILES).
         """
         ns = f'{time.time_ns()}'
         try:
@@ -255,6 +882,43 @@ class TranscribeAndExport():
                                 self.validate_field(job['OutputLocationType'])
                                 ])
 
+            elif job_status == "CACHED":
+                writer = csv.writer(open(os.path.join(self.output_path,'job_summary_cached_'+ ns +'.csv'), 'w', newline=''))
+                writer.writerow(['TranscriptionJobName',
+                                'SourceFile',
+                                'ContentHash',
+                                'CachedTranscript'
+                                ])
+
+                for job in job_list:
+                    writer.writerow([self.validate_field(job['TranscriptionJobName']),
+                                self.validate_field(job['SourceFile']),
+                                self.validate_field(job['ContentHash']),
+                                self.validate_field(job['CachedTranscript'])
+                                ])
+
+            elif job_status == "REJECTED":
+                writer = csv.writer(open(os.path.join(self.output_path,'job_summary_rejected_'+ ns +'.csv'), 'w', newline=''))
+                writer.writerow(['SourceFile',
+                                'Reason'
+                                ])
+
+                for job in job_list:
+                    writer.writerow([self.validate_field(job['SourceFile']),
+                                self.validate_field(job['Reason'])
+                                ])
+
+            elif job_status == "FAILED_FILES":
+                writer = csv.writer(open(os.path.join(self.output_path,'job_summary_failed_files_'+ ns +'.csv'), 'w', newline=''))
+                writer.writerow(['SourceFile',
+                                'Reason'
+                                ])
+
+                for job in job_list:
+                    writer.writerow([self.validate_field(job['SourceFile']),
+                                self.validate_field(job['Reason'])
+                                ])
+
             elif job_status == "FAILED":
                     writer = csv.writer(open(os.path.join(self.output_path,'job_summary_failed_'+ ns +'.csv'), 'w', newline=''))
                     writer.writerow(['TranscriptionJobName',
@@ -283,104 +947,173 @@ class TranscribeAndExport():
     def archive_processed_files(self, archive_path = '', input_obj_path = '', output_obj_path = ''):
         """
         Archive all the files by object name inside the input & output folder. 
+        Returns a dict of JSON object name to its list of failures, for the transcripts that were not fully archived.
         """
         output_bucket = self.s3_resource.Bucket(self.output_bucket_name)
+        object_names = [obj.key for obj in output_bucket.objects.filter(Delimiter='/') if os.path.splitext(obj.key)[1] == '.json']
+        return self.archive_objects(archive_path, object_names, input_obj_path, output_obj_path)
 
-        for obj in output_bucket.objects.filter(Delimiter='/'):
-            obj_name, obj_extn = os.path.splitext(obj.key)
-            if obj_extn == '.json':
-                try:
-                    input_obj_name = obj_name.lstrip(config['aws_transcribe_config']['job_prefix'] + '-')
-                    self.s3_resource.Object(self.bucket_name, archive_path +'/'+ input_obj_name).copy_from(CopySource=self.bucket_name +'/' + input_obj_path + input_obj_name)
-                    self.s3_resource.Object(self.bucket_name, input_obj_path + input_obj_name).delete()
-                except ClientError as e:
-                    if(e.response['Error']['Code']) == 'NoSuchKey':                
-                        print(f'Object {input_obj_path + input_obj_name} not found.')                        
 
-                try:
-                    self.s3_resource.Object(self.output_bucket_name, archive_path +'/'+ obj.key).copy_from(CopySource=self.output_bucket_name +'/' + output_obj_path + obj.key)
-                    self.s3_resource.Object(self.output_bucket_name, output_obj_path + obj.key).delete()
-                except ClientError as e:
-                    if(e.response['Error']['Code']) == 'NoSuchKey':                
-                        print(f'Object {output_obj_path + obj.key} not found.')
-
-
-def main():
+def run_batch(ts, files=None):
     """
-    This method executes all the steps in order to upload, transcribe and export the results. 
+    Runs the upload, transcribe and wait steps in order for the whole batch and returns
+    the lists of COMPLETED and FAILED job summaries. Only the given files of the input
+    path are split, checked and uploaded, when given.
     """
-    try:
-        ts = TranscribeAndExport()
-        print('-'*88)
-        print("Welcome to the Amazon Transcribe!")
-        print('-'*88)
+    # Splitting long recordings into segments transcribed in parallel
+    if config['chunking_config']['enabled']:
+        with ts.instrumentation.stage('split'):
+            remaining = ts.split_long_recordings(files)
+        if files is not None:
+            files = remaining
 
-        # Printing the start time
-        t = time.localtime()
-        start_time = time.strftime("%H:%M:%S", t)
-        print(f'Start time: {start_time}')
+    # Rejecting unsupported or corrupt media before it is uploaded
+    if config['preflight_config']['enabled']:
+        with ts.instrumentation.stage('preflight'):
+            ts.preflight_files(files)
 
-        # Renaming files in acceptable format
-        ts.rename_files(config['file_paths']['input_path'])
+    # Uploading audio files into input bucket
+    with ts.instrumentation.stage('upload'):
+        ts.upload_files(files)
 
-        # Uploading audio files into input bucket
-        ts.upload_files()
+    if config['scheduler_config']['enabled']:
+        # Keeping a fixed number of jobs in flight, submitted in the configured order
+        with ts.instrumentation.stage('transcribe'):
+            all_completed_jobs, all_failed_jobs = SlotScheduler(ts).run()
+        ts.advance_job_listing_cursor(all_completed_jobs + all_failed_jobs)
+        if config['chunking_config']['enabled']:
+            with ts.instrumentation.stage('stitch'):
+                ts.stitch_segments()
+        return all_completed_jobs, all_failed_jobs
 
-        # Running transcription on source input files
-        ts.transcribe_files()
+    # Running transcription on source input files
+    with ts.instrumentation.stage('submit'):
+        job_handles = ts.transcribe_files()
+        job_names = [job_name for job_name, handle in job_handles.items() if handle.exception() is None and handle.result() is not None]
 
+    # Resuming the jobs an interrupted run was still waiting for
+    job_names += [job_name for job_name in ts.run_state.in_flight_jobs() if job_name not in job_handles]
 
-        all_jobs = tb.list_jobs(config['aws_transcribe_config']['job_prefix'], ts.transcribe_client)
-        for job in all_jobs:
-            try:
-                print(f"job['TranscriptionJobName']: {job['TranscriptionJobName']}")
-                transcribe_waiter = tb.TranscribeCompleteWaiter(ts.transcribe_client)
-                transcribe_waiter.max_tries = 120
-                transcribe_waiter.wait(job['TranscriptionJobName'])
-            except:
-                logger.info(f'Something went wrong with job in all_jobs: {job["TranscriptionJobName"]}', exc_info=True)
-                continue
-        
-        # Need to instantiate the 'transcribe' client again to fetch latest job updates
-        trans_client = boto3.client('transcribe', 
-                                        aws_access_key_id = config['aws_auth_cred']['aws_access_key_id'], 
-                                        aws_secret_access_key = config['aws_auth_cred']['aws_secret_access_key'],
-                                        region_name = config['aws_auth_cred']['region'])                                        
-
-        all_processed_jobs = tb.list_jobs(config['aws_transcribe_config']['job_prefix'], trans_client)
-        print(f'all_jobs after: {all_processed_jobs}')
-        all_completed_jobs = []
-        all_failed_jobs = []
-
-        # Separating the COMPLETED & FAILED jobs, generating summary reports and deleting the processed jobs
-        for each_job in all_processed_jobs:  
-            try:          
+    all_completed_jobs = []
+    all_failed_jobs = []
+
+    # Separating the COMPLETED & FAILED jobs as each one finishes, generating summary reports and deleting the processed jobs
+    transcribe_waiter = tb.TranscribeJobsCompleteWaiter(ts.transcribe_client,
+                                                        delay = config['wait_config']['delay'],
+                                                        max_tries = config['wait_config']['max_tries'])
+    try:
+        with ts.instrumentation.stage('wait'):
+            for each_job in transcribe_waiter.as_completed(job_names, since=ts.get_job_listing_cursor()):
+                ts.record_finished_job(each_job)
                 if each_job['TranscriptionJobStatus'] == 'COMPLETED':
                     all_completed_jobs.append(each_job)
                 elif each_job['TranscriptionJobStatus'] == 'FAILED':
                     all_failed_jobs.append(each_job)
-            except ClientError:
-                logger.exception(f'Something went wrong with job in all_processed_jobs: {job["TranscriptionJobName"]}')
-                pass
-        
+    except (ClientError, WaiterError):
+        logger.exception('Something went wrong while waiting for the transcription jobs.')
+
+    ts.advance_job_listing_cursor(all_completed_jobs + all_failed_jobs)
+
+    # Merging the segment transcripts of long recordings
+    if config['chunking_config']['enabled']:
+        with ts.instrumentation.stage('stitch'):
+            ts.stitch_segments()
+
+    return all_completed_jobs, all_failed_jobs
+
+
+def process_files(ts, files=None):
+    """
+    Runs every step of a run, from renaming the input files to writing the run metrics, on the files of the input
+    path, or on the given files. Returns the names of the files after renaming.
+    """
+    # Renaming files in acceptable format
+    with ts.instrumentation.stage('rename'):
+        renamed = ts.rename_files(config['file_paths']['input_path'], files)
+    if files is not None:
+        files = renamed
+
+    streaming = config['pipeline_config']['mode'] == 'streaming'
+    if streaming:
+        # Uploading, transcribing and exporting each file as soon as its previous step finishes
+        with ts.instrumentation.stage('pipeline'):
+            all_completed_jobs, all_failed_jobs = StreamingPipeline(ts).run(files)
+    else:
+        all_completed_jobs, all_failed_jobs = run_batch(ts, files)
+
+    with ts.instrumentation.stage('job_summary'):
         # COMPLETED Jobs
         if len(all_completed_jobs) > 0:
             print(f'all_completed_jobs: {all_completed_jobs}')
             ts.job_summary(all_completed_jobs, 'COMPLETED')
 
-            for job in all_completed_jobs:
-                tb.delete_job(job['TranscriptionJobName'], trans_client)
+        # Input files rejected by the pre-flight checks
+        if len(ts.rejected) > 0:
+            print(f'Rejected {len(ts.rejected)} input file(s): {ts.rejected}')
+            ts.job_summary([{'SourceFile': file, 'Reason': reason} for file, reason in ts.rejected.items()], 'REJECTED')
+
+        # Input files that failed before their job finished
+        if len(ts.failed_files) > 0:
+            print(f'Failed {len(ts.failed_files)} input file(s): {ts.failed_files}')
+            ts.job_summary([{'SourceFile': file, 'Reason': reason} for file, reason in ts.failed_files.items()], 'FAILED_FILES')
+
+        # Transcripts reused from the cache
+        if len(ts.cache_hits) > 0:
+            print(f'Reused {len(ts.cache_hits)} cached transcript(s): {ts.cache_hits}')
+            ts.job_summary(ts.cache_hits, 'CACHED')
 
         # FAILED Jobs
         if len(all_failed_jobs) > 0:
             print(f'all_failed_jobs: {all_failed_jobs}')
             ts.job_summary(all_failed_jobs, 'FAILED')
 
-            for job in all_failed_jobs:
-                tb.delete_job(job['TranscriptionJobName'], trans_client)        
+    # Deleting the processed jobs
+    processed_job_names = [job['TranscriptionJobName'] for job in all_completed_jobs + all_failed_jobs]
+    if len(processed_job_names) > 0:
+        with ts.instrumentation.stage('delete_jobs'):
+            deleted = tb.delete_jobs(processed_job_names, ts.transcribe_client)
+        not_deleted = [job_name for job_name, result in deleted.items() if result is not None]
+        if len(not_deleted) > 0:
+            print(f'Could not delete job(s): {not_deleted}')
+
+    # Exporing the resulted JSON file to Word docx and archiving files
+    if not streaming:
+        with ts.instrumentation.stage('export'):
+            ts.export_files()
+
+    # Computing the corpus analytics of the exported transcripts
+    if config['analytics_config']['enabled'] and len(ts.exported) > 0:
+        with ts.instrumentation.stage('analytics'):
+            ts.analytics_report()
+
+    # Writing the API call, stage and job timings of the run
+    metrics_paths = ts.instrumentation.write(os.path.join(ts.output_path, f'run_metrics_{time.time_ns()}'))
+    if metrics_paths is not None:
+        print(f'Run metrics: {metrics_paths[0]}, report: {metrics_paths[1]}')
+    if ts.profiler is not None:
+        print(f'Stage profiles: {ts.profiler.write_summary()}')
 
-        # Exporing the resulted JSON file to Word docx and archiving files
-        ts.export_files()
+    return renamed
+
+
+def main(profile=False):
+    """
+    This method executes all the steps in order to upload, transcribe and export the results. 
+
+    :param profile: When True, each stage is profiled with cProfile and tracemalloc, see profiling.py.
+    """
+    try:
+        ts = TranscribeAndExport(profile)
+        print('-'*88)
+        print("Welcome to the Amazon Transcribe!")
+        print('-'*88)
+
+        # Printing the start time
+        t = time.localtime()
+        start_time = time.strftime("%H:%M:%S", t)
+        print(f'Start time: {start_time}')
+
+        process_files(ts)
 
         # Printing the end time
         t = time.localtime()
@@ -390,6 +1123,98 @@ def main():
     except Exception:
         logger.exception('Fatal error in main loop')
 
+
+def watch(profile=False):
+    """
+    Runs as a daemon that transcribes the files arriving in the input path. New files are detected with inotify on
+    Linux, or by polling the folder, and are collected into micro-batches of up to 'batch_size' files, or of the files
+    that arrived within 'batch_window_seconds' of the first one (see 'watch_config'). Each micro-batch runs through the
+    same steps as a one-shot run. The files already in the input path are processed first.
+
+    On SIGTERM or SIGINT, no more files are waited for: the running micro-batch finishes, the files already detected are
+    processed, and the daemon exits. A second signal stops it at once. Files written by the run itself, such as renamed
+    files and segments, are skipped because the run state records them as uploaded.
+
+    :param profile: When True, each stage is profiled with cProfile and tracemalloc, see profiling.py.
+    """
+    import watcher
+
+    ts = TranscribeAndExport(profile)
+    watch_config = config['watch_config']
+    input_path = config['file_paths']['input_path']
+    folder_watcher = watcher.create_watcher(input_path, watch_config['backend'], watch_config['poll_interval_seconds'])
+    print(f"Watching {input_path} with {type(folder_watcher).__name__}.")
+
+    stopping = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"Received signal {signum}, finishing the files already detected.")
+        stopping.set()
+        signal.signal(signum, signal.SIG_DFL)
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, request_stop)
+
+    batch = []
+    batch_started = None
+
+    def add_files(names):
+        nonlocal batch_started
+        for name in names:
+            if name in batch or not os.path.isfile(input_path + name):
+                continue
+            try:
+                if ts.is_uploaded(name):
+                    continue
+            except OSError:
+                # Deleted or renamed since it was detected.
+                logger.info(f'Skipping {name}, it is no longer in the input path.', exc_info=True)
+                continue
+            batch.append(name)
+            if batch_started is None:
+                batch_started = time.monotonic()
+
+    def run_micro_batch(files):
+        print(f"Processing a micro-batch of {len(files)} file(s).")
+        ts.start_batch()
+        try:
+            process_files(ts, files)
+        except Exception:
+            logger.exception('Failed to process the micro-batch %s.', files)
+
+    try:
+        add_files(sorted(os.listdir(input_path)))
+        while not stopping.is_set():
+            timeout = watch_config['poll_interval_seconds']
+            if batch_started is not None:
+                timeout = max(0, min(timeout, batch_started + watch_config['batch_window_seconds'] - time.monotonic()))
+            add_files(folder_watcher.wait(timeout))
+            if not batch:
+                continue
+            if (len(batch) >= watch_config['batch_size']
+                    or time.monotonic() - batch_started >= watch_config['batch_window_seconds']):
+                files, batch[:] = batch[:watch_config['batch_size']], batch[watch_config['batch_size']:]
+                batch_started = time.monotonic() if batch else None
+                run_micro_batch(files)
+
+        # Draining the files detected before the signal
+        add_files(folder_watcher.wait(0))
+        while batch:
+            files, batch[:] = batch[:watch_config['batch_size']], batch[watch_config['batch_size']:]
+            run_micro_batch(files)
+    finally:
+        folder_watcher.close()
+    print("Stopped watching.")
+
 if __name__ == '__main__':
-    # Calling the main() function to start execution.
-    main()
+    parser = argparse.ArgumentParser(description='Transcribes the audio files of the input path and exports the results.')
+    parser.add_argument('--profile', action='store_true',
+                        help="Profile each stage with cProfile and tracemalloc into config['profiling_config']['profiles_path'].")
+    parser.add_argument('--watch', action='store_true',
+                        help="Keep running and transcribe new files of the input path in micro-batches, see 'watch_config'.")
+    args = parser.parse_args()
+    if args.watch:
+        watch(profile=args.profile)
+    else:
+        # Calling the main() function to start execution.
+        main(profile=args.profile)
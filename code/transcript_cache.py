@@ -0,0 +1,151 @@
+"""
+Purpose
+
+Content-addressed transcript cache, so identical audio is never transcribed twice. Input
+files are hashed (in parallel and in fixed-size chunks, so whole files are never held in
+memory), and transcripts of completed jobs are kept in the output bucket under a
+hash-keyed archive prefix. A file whose hash is already known reuses that transcript
+instead of starting a new job.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import logging
+import sqlite3
+import threading
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path, chunk_size=HASH_CHUNK_SIZE):
+    """
+    Computes the SHA-256 digest of a file, reading it in chunks.
+
+    :param file_path: The path of the file to hash.
+    :param chunk_size: The number of bytes read at a time.
+    :return: The hex digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as media_file:
+        for chunk in iter(lambda: media_file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_files(file_paths, max_workers=4):
+    """
+    Hashes several files in parallel. hashlib releases the GIL while hashing large
+    chunks, so threads hash on several cores at once.
+
+    :param file_paths: A dict of name to the path of the file to hash.
+    :param max_workers: The number of files hashed at the same time.
+    :return: A dict of name to hex digest. Files that can't be read are left out.
+    """
+    hashes = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {name: executor.submit(hash_file, path) for name, path in file_paths.items()}
+        for name, future in futures.items():
+            try:
+                hashes[name] = future.result()
+            except OSError:
+                logger.exception("Couldn't hash %s.", file_paths[name])
+    return hashes
+
+
+class TranscriptCache:
+    """
+    Finds and stores transcripts by the hash of their source audio. Known hashes are kept
+    in a local SQLite index, and the transcripts themselves are kept in S3, so a cache
+    hit is found even when the local index was lost.
+    """
+    def __init__(self, s3_client, bucket_name, prefix, db_path=None):
+        """
+        :param s3_client: The Boto3 S3 client.
+        :param bucket_name: The bucket that holds the cached transcripts.
+        :param prefix: The key prefix the cached transcripts are stored under.
+        :param db_path: The path of the SQLite index. When None, the index is kept in
+                        memory and only S3 is checked across runs.
+        """
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.prefix = prefix.rstrip('/')
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path or ':memory:', check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS transcript_cache ('
+                ' content_hash TEXT PRIMARY KEY,'
+                ' transcript_key TEXT NOT NULL)')
+
+    def cache_key(self, content_hash):
+        """
+        Returns the key a transcript with the given source hash is stored under.
+        """
+        return f'{self.prefix}/{content_hash}.json'
+
+    def _index(self, content_hash, transcript_key):
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO transcript_cache (content_hash, transcript_key) '
+                'VALUES (?, ?)', (content_hash, transcript_key))
+
+    def lookup(self, content_hash):
+        """
+        Looks up a transcript by the hash of its source audio, first in the local index
+        and then in S3.
+
+        :param content_hash: The hex digest of the source audio.
+        :return: The key of the cached transcript, or None on a cache miss.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT transcript_key FROM transcript_cache WHERE content_hash = ?',
+                (content_hash,)).fetchone()
+        transcript_key = row[0] if row is not None else None
+        if transcript_key is None:
+            try:
+                self.s3_client.head_object(
+                    Bucket=self.bucket_name, Key=self.cache_key(content_hash))
+                transcript_key = self.cache_key(content_hash)
+                self._index(content_hash, transcript_key)
+            except ClientError as err:
+                if err.response['Error']['Code'] not in ('404', 'NoSuchKey', 'NotFound'):
+                    raise
+        with self._lock:
+            if transcript_key is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return transcript_key
+
+    def store(self, content_hash, transcript_key):
+        """
+        Copies a completed transcript into the cache.
+
+        :param content_hash: The hex digest of the source audio.
+        :param transcript_key: The key of the transcript in the bucket.
+        """
+        cache_key = self.cache_key(content_hash)
+        self.s3_client.copy_object(
+            Bucket=self.bucket_name, Key=cache_key,
+            CopySource={'Bucket': self.bucket_name, 'Key': transcript_key})
+        self._index(content_hash, cache_key)
+        logger.info("Cached transcript %s as %s.", transcript_key, cache_key)
+
+    def restore(self, cached_key, transcript_key):
+        """
+        Copies a cached transcript to the key a transcription job would have written, so
+        it is exported like any other transcript.
+
+        :param cached_key: The key of the cached transcript.
+        :param transcript_key: The key to copy the transcript to.
+        """
+        self.s3_client.copy_object(
+            Bucket=self.bucket_name, Key=transcript_key,
+            CopySource={'Bucket': self.bucket_name, 'Key': cached_key})
+        logger.info("Restored cached transcript %s as %s.", cached_key, transcript_key)
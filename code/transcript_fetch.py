@@ -0,0 +1,111 @@
+"""
+Purpose
+
+Downloads transcription result JSON objects from the output bucket. Each transcript is
+fetched once: it is streamed to disk in chunks, and the ETag of the object is kept next
+to the local copy, so later runs skip the download entirely when the local copy is still
+current.
+"""
+
+from collections import namedtuple
+import json
+import logging
+import os
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+# Size of the chunks a transcript is streamed to disk in.
+CHUNK_SIZE = 1024 * 1024
+
+FetchedTranscript = namedtuple('FetchedTranscript', ['path', 'content', 'etag', 'from_cache'])
+FetchedTranscript.__doc__ = """
+A fetched transcript.
+
+:param path: The local path of the transcript JSON file.
+:param content: The parsed transcript, or None when it was not requested.
+:param etag: The ETag of the transcript object.
+:param from_cache: True when the local copy was current and nothing was downloaded.
+"""
+
+
+class TranscriptFetcher:
+    """
+    Fetches transcript objects from a bucket into a local folder, using the ETag of each
+    object to avoid downloading a transcript that is already available locally.
+    """
+    def __init__(self, s3_client, bucket_name, local_path):
+        """
+        :param s3_client: The Boto3 S3 client. Clients are thread safe, so a single
+                          fetcher can be shared by several download threads.
+        :param bucket_name: The bucket that holds the transcripts.
+        :param local_path: The folder the transcripts are written into.
+        """
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.local_path = local_path
+
+    @staticmethod
+    def _etag_path(file_path):
+        return file_path + '.etag'
+
+    def _read_local_etag(self, file_path):
+        if not os.path.exists(file_path):
+            return None
+        try:
+            with open(self._etag_path(file_path), 'r') as etag_file:
+                return etag_file.read().strip() or None
+        except OSError:
+            return None
+
+    def _write_local(self, file_path, body, etag):
+        """
+        Streams the transcript to disk and writes its ETag. The transcript is written to a
+        temporary file and moved into place, so an interrupted write never leaves a partial
+        file that looks current. Returns the number of bytes written.
+        """
+        tmp_path = file_path + '.part'
+        size = 0
+        with open(tmp_path, 'wb') as tmp_file:
+            for chunk in body.iter_chunks(CHUNK_SIZE):
+                tmp_file.write(chunk)
+                size += len(chunk)
+        os.replace(tmp_path, file_path)
+        with open(self._etag_path(file_path), 'w') as etag_file:
+            etag_file.write(etag)
+        return size
+
+    @staticmethod
+    def _load(file_path):
+        with open(file_path, 'rb') as local_file:
+            return json.load(local_file)
+
+    def fetch(self, object_key, parse=False):
+        """
+        Fetches a transcript. When a local copy with a matching ETag exists, the object is
+        requested conditionally and S3 answers without a body.
+
+        :param object_key: The key of the transcript object.
+        :param parse: When True, the transcript is also loaded into memory. Large
+                      transcripts are better read with transcript_stream.
+        :return: A FetchedTranscript.
+        """
+        file_path = os.path.join(self.local_path, object_key)
+        local_etag = self._read_local_etag(file_path)
+        get_args = {'Bucket': self.bucket_name, 'Key': object_key}
+        if local_etag is not None:
+            get_args['IfNoneMatch'] = local_etag
+        try:
+            response = self.s3_client.get_object(**get_args)
+        except ClientError as err:
+            if local_etag is not None and err.response['Error']['Code'] in ('304', 'NotModified'):
+                logger.info("Local copy of %s is current, skipping download.", object_key)
+                content = self._load(file_path) if parse else None
+                return FetchedTranscript(file_path, content, local_etag, True)
+            logger.exception("Couldn't fetch transcript %s.", object_key)
+            raise
+
+        size = self._write_local(file_path, response['Body'], response['ETag'])
+        logger.info("Fetched transcript %s (%s bytes).", object_key, size)
+        content = self._load(file_path) if parse else None
+        return FetchedTranscript(file_path, content, response['ETag'], False)
@@ -0,0 +1,201 @@
+"""
+Purpose
+
+Native transcript renderer. Streams an Amazon Transcribe JSON result and writes it as a
+Word docx table of speaker turns, as plain text or CSV, or as SRT or WebVTT subtitles,
+without the pandas DataFrame that Tscribe builds for every file. The docx is written as
+raw WordprocessingML into a zip archive, so no document library is needed.
+
+Words and speaker turns are read with transcript_stream, so memory use does not grow with
+the length of the transcript.
+"""
+
+import csv
+import logging
+import os
+from xml.sax.saxutils import escape
+import zipfile
+import transcript_stream
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('docx', 'txt', 'csv', 'srt', 'vtt')
+
+# Subtitle cues are cut at the end of a sentence, or when they grow longer than this.
+MAX_CUE_SECONDS = 6.0
+MAX_CUE_WORDS = 14
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>')
+
+_RELATIONSHIPS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>')
+
+_DOCUMENT_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>')
+
+_DOCUMENT_END = (
+    '<w:sectPr><w:pgSz w:w="11906" w:h="16838"/>'
+    '<w:pgMar w:top="1134" w:right="1134" w:bottom="1134" w:left="1134" w:header="709" w:footer="709" w:gutter="0"/>'
+    '</w:sectPr></w:body></w:document>')
+
+_TABLE_START = (
+    '<w:tbl><w:tblPr><w:tblW w:w="5000" w:type="pct"/><w:tblBorders>'
+    + ''.join(f'<w:{side} w:val="single" w:sz="4" w:space="0" w:color="auto"/>'
+              for side in ('top', 'left', 'bottom', 'right', 'insideH', 'insideV'))
+    + '</w:tblBorders></w:tblPr>'
+    '<w:tblGrid><w:gridCol w:w="1400"/><w:gridCol w:w="1400"/><w:gridCol w:w="6838"/></w:tblGrid>')
+
+# Table column widths in twentieths of a point: Time, Speaker, Comment.
+_COLUMN_WIDTHS = (1400, 1400, 6838)
+
+
+def _cue_split(speaker, start, end, text, word):
+    return (word[0] != speaker or text[-1].endswith(transcript_stream.SENTENCE_ENDS)
+            or word[2] - start > MAX_CUE_SECONDS or len(text) >= MAX_CUE_WORDS)
+
+
+def iter_cues(words):
+    """
+    Groups words into subtitle cues, cut at speaker changes and sentence ends, and kept
+    shorter than MAX_CUE_SECONDS and MAX_CUE_WORDS.
+
+    :param words: An iterator of words, see transcript_stream.iter_words.
+    :return: An iterator of (speaker, start, end, text, confidence) tuples.
+    """
+    return transcript_stream.group_words(words, _cue_split)
+
+
+def format_clock(seconds, separator='.'):
+    """
+    Formats seconds as HH:MM:SS.mmm, with ',' as the separator for SRT.
+    """
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f'{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{milliseconds:03d}'
+
+
+def _format_time(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f'{hours}:{minutes:02d}:{seconds:02d}'
+
+
+def _paragraph(text, bold=False, size=None):
+    properties = ''
+    if bold or size:
+        properties = '<w:rPr>' + ('<w:b/>' if bold else '') + (f'<w:sz w:val="{size}"/>' if size else '') + '</w:rPr>'
+    return f'<w:p><w:r>{properties}<w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>'
+
+
+def _row(cells, bold=False):
+    return '<w:tr>' + ''.join(
+        f'<w:tc><w:tcPr><w:tcW w:w="{width}" w:type="dxa"/></w:tcPr>{_paragraph(cell, bold)}</w:tc>'
+        for cell, width in zip(cells, _COLUMN_WIDTHS)) + '</w:tr>'
+
+
+def write_docx(turns, save_as_path, title):
+    """
+    Writes speaker turns as a Word docx with a Time, Speaker and Comment table. The
+    document body is streamed into the archive row by row.
+    """
+    with zipfile.ZipFile(save_as_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _RELATIONSHIPS)
+        with archive.open('word/document.xml', 'w') as document:
+            document.write((_DOCUMENT_START + _paragraph(title, bold=True, size=32)
+                            + _TABLE_START + _row(('Time', 'Speaker', 'Comment'), bold=True)).encode('utf-8'))
+            for speaker, start, end, text, confidence in turns:
+                document.write(_row((_format_time(start), speaker, text)).encode('utf-8'))
+            document.write(('</w:tbl>' + _DOCUMENT_END).encode('utf-8'))
+
+
+def write_txt(turns, save_as_path):
+    """
+    Writes speaker turns as plain text, one turn per line.
+    """
+    with open(save_as_path, 'w', encoding='utf-8') as text_file:
+        for speaker, start, end, text, confidence in turns:
+            prefix = f'[{_format_time(start)}] ' + (f'{speaker}: ' if speaker else '')
+            text_file.write(prefix + text + '\n')
+
+
+def write_csv(turns, save_as_path):
+    """
+    Writes speaker turns as CSV, one turn per row.
+    """
+    with open(save_as_path, 'w', encoding='utf-8', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(['StartTime', 'EndTime', 'Speaker', 'Confidence', 'Text'])
+        for speaker, start, end, text, confidence in turns:
+            writer.writerow([f'{start:.3f}', f'{end:.3f}', speaker,
+                             f'{confidence:.4f}' if confidence is not None else '', text])
+
+
+def write_srt(cues, save_as_path):
+    """
+    Writes subtitle cues as SubRip (SRT).
+    """
+    with open(save_as_path, 'w', encoding='utf-8') as srt_file:
+        for index, (speaker, start, end, text, confidence) in enumerate(cues, 1):
+            srt_file.write(f'{index}\n{format_clock(start, ",")} --> {format_clock(end, ",")}\n{text}\n\n')
+
+
+def write_vtt(cues, save_as_path):
+    """
+    Writes subtitle cues as WebVTT, with the speaker as a voice span.
+    """
+    with open(save_as_path, 'w', encoding='utf-8') as vtt_file:
+        vtt_file.write('WEBVTT\n\n')
+        for speaker, start, end, text, confidence in cues:
+            text = escape(text)
+            if speaker:
+                text = f'<v {escape(speaker)}>{text}'
+            vtt_file.write(f'{format_clock(start)} --> {format_clock(end)}\n{text}\n\n')
+
+
+def render(json_file_path, save_as_base, formats=('docx',)):
+    """
+    Renders a transcript JSON file in the given formats. Each format is written from its own
+    streaming pass over the words.
+
+    :param json_file_path: The path of the transcript JSON written by Amazon Transcribe.
+    :param save_as_base: The output path without extension, the format extension is added.
+    :param formats: The formats to write, any of FORMATS.
+    :return: The list of paths written.
+    """
+    unknown = [output_format for output_format in formats if output_format not in FORMATS]
+    if unknown:
+        raise ValueError(f"Unknown transcript formats {unknown}, expected any of {FORMATS}.")
+    paths = []
+    for output_format in formats:
+        save_as_path = f'{save_as_base}.{output_format}'
+        if output_format == 'docx':
+            title = 'Transcript of ' + next(transcript_stream.iter_path(json_file_path, ('jobName',)),
+                                            os.path.basename(save_as_base))
+            write_docx(transcript_stream.iter_turns(json_file_path), save_as_path, title)
+        elif output_format == 'txt':
+            write_txt(transcript_stream.iter_turns(json_file_path), save_as_path)
+        elif output_format == 'csv':
+            write_csv(transcript_stream.iter_turns(json_file_path), save_as_path)
+        elif output_format == 'srt':
+            write_srt(iter_cues(transcript_stream.iter_words(json_file_path)), save_as_path)
+        else:
+            write_vtt(iter_cues(transcript_stream.iter_words(json_file_path)), save_as_path)
+        paths.append(save_as_path)
+    logger.info("Rendered %s as %s.", json_file_path, ', '.join(formats))
+    return paths
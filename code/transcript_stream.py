@@ -0,0 +1,325 @@
+"""
+Purpose
+
+Bounded-memory streaming parser for Amazon Transcribe JSON results. Instead of loading
+the whole transcript with json.load, which with speaker labels and alternatives turns a
+multi-hour transcript into hundreds of MB of Python objects, the file is read in chunks
+and only one element of results.items is decoded at a time.
+
+Speaker labels are joined to the words with a merge of two passes over the same file,
+one reading results.items and one reading speaker_labels.segments, which are both in
+time order, so no word-to-speaker map is held in memory. Channel labels are joined the
+same way, with one pass per channel. Values that are not needed are skipped one array
+element at a time, which for a channel-identified transcript means one whole channel.
+"""
+
+import heapq
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+SENTENCE_ENDS = ('.', '?', '!')
+
+# Two timestamps closer than this are the same word.
+_TIME_TOLERANCE = 0.0005
+
+_WHITESPACE = re.compile(r'[\s,:]*')
+_decoder = json.JSONDecoder()
+
+
+class TranscriptParseError(ValueError):
+    """
+    Raised when a transcript file is not valid JSON.
+    """
+
+
+class _JsonStream:
+    """
+    Reads JSON values from a file one at a time. Separators (',' and ':') are treated as
+    whitespace, which is enough to walk well-formed JSON.
+    """
+    def __init__(self, json_file, chunk_size=CHUNK_SIZE):
+        self._file = json_file
+        self._chunk_size = chunk_size
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _read_more(self):
+        if self._eof:
+            return False
+        chunk = self._file.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """
+        Skips whitespace and separators and returns the next character, or '' at the end.
+        """
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._read_more():
+                return ''
+
+    def _advance(self):
+        self._pos += 1
+
+    def read_value(self):
+        """
+        Decodes the next value.
+        """
+        if self.peek() == '':
+            raise TranscriptParseError("Unexpected end of transcript.")
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as err:
+                if self._read_more():
+                    continue
+                raise TranscriptParseError(str(err)) from err
+            # A number at the end of the buffer may continue in the next chunk.
+            if end == len(self._buffer) and self._read_more():
+                continue
+            self._pos = end
+            return value
+
+    def skip_value(self):
+        """
+        Skips the next value. Objects are skipped key by key and arrays element by element,
+        so only one element of a large array, like results.items, is decoded at a time.
+        """
+        char = self.peek()
+        if char == '{':
+            for _ in self.iter_object():
+                self.skip_value()
+        elif char == '[':
+            for _ in self.iter_array():
+                self.read_value()
+        else:
+            self.read_value()
+
+    def iter_object(self):
+        """
+        Yields the keys of the next object. The caller reads or skips each value before
+        asking for the next key. A value that is not an object is skipped.
+        """
+        if self.peek() != '{':
+            self.skip_value()
+            return
+        self._advance()
+        while True:
+            char = self.peek()
+            if char == '}':
+                self._advance()
+                return
+            if char == '':
+                raise TranscriptParseError("Unexpected end of transcript.")
+            yield self.read_value()
+
+    def iter_array(self):
+        """
+        Yields once per element of the next array, with the stream positioned at the element.
+        A value that is not an array is skipped.
+        """
+        if self.peek() != '[':
+            self.skip_value()
+            return
+        self._advance()
+        index = 0
+        while True:
+            char = self.peek()
+            if char == ']':
+                self._advance()
+                return
+            if char == '':
+                raise TranscriptParseError("Unexpected end of transcript.")
+            yield index
+            index += 1
+
+
+def _walk_to(stream, path, stop=True):
+    """
+    Yields once per value found at a path, with the stream positioned at the value. A path
+    element is an object key, an array index, or '*' for every element of an array. When
+    stop is True, nothing is read past the last value found.
+    """
+    if not path:
+        yield
+        return
+    head, rest = path[0], path[1:]
+    if head == '*' or isinstance(head, int):
+        for index in stream.iter_array():
+            if head == '*':
+                yield from _walk_to(stream, rest, stop=False)
+            elif index == head:
+                yield from _walk_to(stream, rest, stop)
+                if stop:
+                    return
+            else:
+                stream.skip_value()
+    else:
+        for key in stream.iter_object():
+            if key == head:
+                yield from _walk_to(stream, rest, stop)
+                # Keys are unique, so the rest of the object is not needed.
+                if stop:
+                    return
+            else:
+                stream.skip_value()
+
+
+def iter_path(json_file_path, path):
+    """
+    Yields the values found at a path of a JSON file, decoding one value at a time.
+
+    :param json_file_path: The path of the JSON file.
+    :param path: A sequence of object keys, array indexes, or '*' for every array element,
+                 for example ('results', 'items', '*').
+    :return: An iterator of the decoded values.
+    """
+    with open(json_file_path, encoding='utf-8') as json_file:
+        stream = _JsonStream(json_file)
+        for _ in _walk_to(stream, tuple(path)):
+            yield stream.read_value()
+
+
+def _iter_channel_labels(json_file_path, index):
+    """
+    Yields (start time, channel label) for the items of one channel.
+    """
+    with open(json_file_path, encoding='utf-8') as json_file:
+        stream = _JsonStream(json_file)
+        for _ in _walk_to(stream, ('results', 'channel_labels', 'channels', index)):
+            label = None
+            for key in stream.iter_object():
+                if key == 'channel_label':
+                    label = stream.read_value()
+                elif key == 'items':
+                    for _ in stream.iter_array():
+                        item = stream.read_value()
+                        if 'start_time' in item:
+                            yield float(item['start_time']), label
+                else:
+                    stream.skip_value()
+
+
+def _iter_labels(json_file_path):
+    """
+    Yields (start time, speaker) in time order from the speaker labels of a transcript, or
+    from its channel labels when it has no speaker labels.
+    """
+    speaker_items = iter_path(json_file_path, ('results', 'speaker_labels', 'segments', '*', 'items', '*'))
+    found = False
+    for item in speaker_items:
+        found = True
+        yield float(item['start_time']), item['speaker_label']
+    if found:
+        return
+    channels = next(iter_path(json_file_path, ('results', 'channel_labels', 'number_of_channels')), 0)
+    if channels:
+        yield from heapq.merge(*(_iter_channel_labels(json_file_path, index) for index in range(channels)),
+                               key=lambda label: label[0])
+
+
+def iter_words(json_file_path):
+    """
+    Yields the words and punctuation of a transcript in order, with their speaker, reading
+    one item at a time.
+
+    :param json_file_path: The path of the transcript JSON written by Amazon Transcribe.
+    :return: An iterator of (speaker, start, end, content, is_punctuation, confidence)
+             tuples. Punctuation has no timestamps, so its start and end are None. The
+             speaker is '' when the job identified neither speakers nor channels.
+    """
+    labels = _iter_labels(json_file_path)
+    label = next(labels, None)
+    speaker = ''
+    for item in iter_path(json_file_path, ('results', 'items', '*')):
+        alternative = item['alternatives'][0] if item.get('alternatives') else {}
+        content = alternative.get('content', '')
+        if item.get('type') == 'punctuation':
+            yield speaker, None, None, content, True, None
+            continue
+        start = float(item['start_time'])
+        while label is not None and label[0] < start - _TIME_TOLERANCE:
+            label = next(labels, None)
+        if label is not None and label[0] <= start + _TIME_TOLERANCE:
+            speaker = label[1]
+        speaker = item.get('speaker_label', item.get('channel_label', speaker))
+        confidence = alternative.get('confidence')
+        yield (speaker, start, float(item['end_time']), content, False,
+               float(confidence) if confidence not in (None, '') else None)
+
+
+def group_words(words, split):
+    """
+    Groups words into runs, calling split(speaker, start, end, text, word) with the current
+    run and the next word to decide where a new run starts. Punctuation is attached to the
+    word before it.
+
+    :return: An iterator of (speaker, start, end, text, confidence) tuples, where the
+             confidence is the mean confidence of the words of the run.
+    """
+    speaker = start = end = None
+    text = []
+    confidence_sum = 0.0
+    confidence_count = 0
+    for word in words:
+        word_speaker, word_start, word_end, content, is_punctuation, confidence = word
+        if is_punctuation:
+            if text:
+                text[-1] += content
+            continue
+        if text and split(speaker, start, end, text, word):
+            yield speaker, start, end, ' '.join(text), _mean(confidence_sum, confidence_count)
+            text = []
+            confidence_sum = 0.0
+            confidence_count = 0
+        if not text:
+            speaker, start = word_speaker, word_start
+        end = word_end
+        text.append(content)
+        if confidence is not None:
+            confidence_sum += confidence
+            confidence_count += 1
+    if text:
+        yield speaker, start, end, ' '.join(text), _mean(confidence_sum, confidence_count)
+
+
+def _mean(total, count):
+    return total / count if count else None
+
+
+def _turn_split(speaker, start, end, text, word):
+    # Without speaker or channel labels, a turn is one sentence.
+    return word[0] != speaker or (not speaker and text[-1].endswith(SENTENCE_ENDS))
+
+
+def iter_turns(json_file_path):
+    """
+    Yields the speaker turns of a transcript with constant memory.
+
+    :param json_file_path: The path of the transcript JSON written by Amazon Transcribe.
+    :return: An iterator of (speaker, start, end, text, confidence) tuples.
+    """
+    return group_words(iter_words(json_file_path), _turn_split)
+
+
+def is_empty(json_file_path):
+    """
+    Checks whether a transcript has no words, reading no further than its first word.
+    """
+    for item in iter_path(json_file_path, ('results', 'items', '*')):
+        if item.get('type') != 'punctuation':
+            return False
+    return True
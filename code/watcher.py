@@ -0,0 +1,165 @@
+"""
+Purpose
+
+Detects the files written into a folder, for the watch mode of transcribe_script.
+
+On Linux, the folder is watched with inotify through ctypes, so no extra dependency is
+needed, and a file is reported once it is closed after writing or moved into the folder.
+Elsewhere, or when inotify is not available, the folder is polled, and a file is reported
+once its size and modification time stayed the same for a whole poll interval, so files
+still being copied are not picked up half written.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# inotify constants, from <sys/inotify.h>.
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# struct inotify_event without its variable length name.
+_EVENT = struct.Struct('iIII')
+_READ_SIZE = 64 * 1024
+
+
+def _list_files(path):
+    return [entry.name for entry in os.scandir(path) if entry.is_file()]
+
+
+class InotifyWatcher:
+    """
+    Watches a folder with inotify.
+    """
+    def __init__(self, path):
+        """
+        :param path: The folder to watch.
+        """
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        if libc.inotify_add_watch(fd, os.fsencode(path), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            err = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(err, os.strerror(err), path)
+        self.path = path
+        self._fd = fd
+
+    def wait(self, timeout):
+        """
+        Waits for files to be written or moved into the folder.
+
+        :param timeout: The longest time to wait, in seconds.
+        :return: The names of the files, in the order they arrived. Empty on timeout.
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        names = []
+        while True:
+            try:
+                data = os.read(self._fd, _READ_SIZE)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    # Events were dropped, so every file of the folder is reported instead.
+                    logger.info("The inotify queue of %s overflowed, rescanning it.", self.path)
+                    names.extend(_list_files(self.path))
+                elif name:
+                    names.append(os.fsdecode(name))
+        return list(dict.fromkeys(names))
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """
+    Watches a folder by listing it every poll interval.
+    """
+    def __init__(self, path, interval=5.0):
+        """
+        :param path: The folder to watch. The files already in it are not reported.
+        :param interval: The seconds between two listings.
+        """
+        self.path = path
+        self.interval = interval
+        self._reported = {name: self._stat(name) for name in _list_files(path)}
+        self._last_seen = {}
+        self._next_poll = time.monotonic() + interval
+
+    def _stat(self, name):
+        try:
+            file_stat = os.stat(os.path.join(self.path, name))
+        except OSError:
+            return None
+        return file_stat.st_size, file_stat.st_mtime_ns
+
+    def wait(self, timeout):
+        """
+        Waits for files to be written into the folder, see InotifyWatcher.wait.
+        """
+        delay = self._next_poll - time.monotonic()
+        if delay > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(delay, 0))
+        self._next_poll = time.monotonic() + self.interval
+        names = []
+        current = set(_list_files(self.path))
+        for name in sorted(current):
+            stat = self._stat(name)
+            if stat is None or stat == self._reported.get(name):
+                continue
+            if stat == self._last_seen.get(name):
+                # Unchanged for a whole interval, so the file is complete.
+                self._reported[name] = stat
+                names.append(name)
+            else:
+                self._last_seen[name] = stat
+        for name in set(self._reported) - current:
+            del self._reported[name]
+        for name in set(self._last_seen) - current:
+            del self._last_seen[name]
+        return names
+
+    def close(self):
+        pass
+
+
+def create_watcher(path, backend='auto', poll_interval=5.0):
+    """
+    Creates the watcher of a folder.
+
+    :param path: The folder to watch.
+    :param backend: 'inotify', 'polling', or 'auto' to use inotify when it is available.
+    :param poll_interval: The seconds between two listings of the polling watcher.
+    :return: An InotifyWatcher or a PollingWatcher.
+    """
+    if backend in ('auto', 'inotify') and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(path)
+        except (OSError, AttributeError):
+            if backend == 'inotify':
+                raise
+            logger.info("inotify is not available, polling %s instead.", path, exc_info=True)
+    elif backend == 'inotify':
+        raise OSError(f"inotify is not available on {sys.platform}.")
+    return PollingWatcher(path, poll_interval)